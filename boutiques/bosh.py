@@ -62,15 +62,22 @@ def validate(*params):
     params = ("validate",) + params
     results = parser.parse_args(params)
 
-    from boutiques.validator import validate_descriptor
+    from boutiques.validator import getValidatedDescriptor, validate_descriptor
 
     descriptor = loadJson(results.descriptor, sandbox=results.sandbox)
-    descriptor = validate_descriptor(
-        descriptor,
-        descriptor_path=results.descriptor,
-        format_output=results.format,
-        sandbox=results.sandbox,
-    )
+    if results.format:
+        descriptor = validate_descriptor(
+            descriptor,
+            descriptor_path=results.descriptor,
+            format_output=results.format,
+            sandbox=results.sandbox,
+        )
+    else:
+        # Descriptors already validated by this process are not validated
+        # again
+        getValidatedDescriptor(
+            descriptor, descriptor_path=results.descriptor, sandbox=results.sandbox
+        )
     if results.bids:
         from boutiques.bids import validate_bids
 
@@ -96,24 +103,28 @@ def execute(*params):
         descriptor = results.descriptor
         inp = results.invocation
 
+        from boutiques.localExec import LocalExecutor, isBatchInvocation
+
+        # Invocations of a batch are validated by the executor
+        batch = isBatchInvocation(inp)
+
         # Validate invocation and descriptor
-        arguments = [descriptor, "-i", inp]
+        arguments = [descriptor] if batch else [descriptor, "-i", inp]
         if results.sandbox:
             arguments.append("--sandbox")
         valid = invocation(*arguments)
 
         # Generate object that will perform the commands
-        from boutiques.localExec import LocalExecutor
-
         executor = LocalExecutor(
             descriptor,
-            inp,
+            None if batch else inp,
             {
                 "forcePathType": True,
                 "debug": results.debug,
                 "changeUser": results.user,
                 "stream": results.stream,
                 "imagePath": results.imagepath,
+                "imageCacheDir": results.image_cache_dir,
                 "skipDataCollect": results.skip_data_collection,
                 "forceDocker": results.force_docker,
                 "forceSingularity": results.force_singularity,
@@ -123,10 +134,26 @@ def execute(*params):
                 "sandbox": results.sandbox,
                 "noPull": results.no_pull,
                 "noAutomounts": results.no_automounts,
+                "outputWait": results.output_wait,
+                "session": results.session,
+                "cacheResults": results.cache_results,
+                "hashAlgorithm": results.hash_algorithm,
+                "imageFreshness": results.image_freshness,
             },
         )
         # Execute it
-        return executor.execute(results.volumes, results.container_opts)
+        if batch:
+            return executor.executeBatch(
+                executor.readBatchInvocations(inp),
+                results.volumes,
+                results.container_opts,
+                results.workers,
+                results.fail_fast,
+                results.log_dir,
+            )
+        output = executor.execute(results.volumes, results.container_opts)
+        executor.closeSessions()
+        return output
 
     elif results.mode == "simulate":
         descriptor = results.descriptor
@@ -210,9 +237,11 @@ def execute(*params):
                 "debug": results.debug,
                 "stream": results.stream,
                 "imagePath": results.imagepath,
+                "imageCacheDir": results.image_cache_dir,
                 "skipDataCollect": True,
                 "sandbox": results.sandbox,
                 "noPull": results.no_pull,
+                "imageFreshness": results.image_freshness,
             },
         )
         container_location = executor.prepare()[1]
@@ -295,26 +324,31 @@ def invocation(*params):
     parser = parser_bosh()
     params = ("invocation",) + params
     results = parser.parse_args(params)
-    arguments = [results.descriptor]
-    if results.sandbox:
-        arguments.append("--sandbox")
-    validate(*arguments)
-    descriptor = loadJson(results.descriptor, sandbox=results.sandbox)
-    if descriptor.get("invocation-schema"):
-        invSchema = descriptor.get("invocation-schema")
-    else:
-        from boutiques.invocationSchemaHandler import generateInvocationSchema
 
-        invSchema = generateInvocationSchema(descriptor)
-        if results.write_schema:
-            descriptor["invocation-schema"] = invSchema
-            with open(results.descriptor, "w") as f:
-                f.write(json.dumps(descriptor, indent=4))
-    if results.invocation:
-        from boutiques.invocationSchemaHandler import validateSchema
+    from boutiques.localExec import isBatchInvocation, readBatchInvocations
+    from boutiques.validator import getValidatedDescriptor
 
+    # The descriptor and its invocation schema are validated once per
+    # process
+    descriptor = loadJson(results.descriptor, sandbox=results.sandbox)
+    validated = getValidatedDescriptor(
+        descriptor, descriptor_path=results.descriptor, sandbox=results.sandbox
+    )
+    if not descriptor.get("invocation-schema") and results.write_schema:
+        descriptor["invocation-schema"] = validated.invocationSchema
+        with open(results.descriptor, "w") as f:
+            f.write(json.dumps(descriptor, indent=4))
+    if results.invocation and isBatchInvocation(results.invocation):
+        # Batches are validated entirely and reported, see
+        # ValidatedDescriptor.validateInvocations
+        invocations = [
+            (name, addDefaultValues(descriptor, in_dict))
+            for (name, in_dict) in readBatchInvocations(results.invocation, descriptor)
+        ]
+        return validated.validateInvocations(invocations, results.workers)
+    if results.invocation:
         data = addDefaultValues(descriptor, loadJson(results.invocation))
-        validateSchema(invSchema, data)
+        validated.validateInvocation(data)
 
 
 def evaluate(*params):
@@ -463,7 +497,9 @@ def data(*params):
     # Validate mode is in params
     if not hasattr(results, "mode"):
         parser.parse_known_args(params + ("--help",))
-        raise_error(DataHandlerError, "Missing data mode {delete, inspect, publish}.")
+        raise_error(
+            DataHandlerError, "Missing data mode {delete, export, inspect, publish}."
+        )
     elif results.mode == "inspect":
         from boutiques.dataHandler import DataHandler
 
@@ -491,6 +527,11 @@ def data(*params):
 
         dataHandler = DataHandler()
         return dataHandler.delete(results.file, results.no_int)
+    elif results.mode == "export":
+        from boutiques.dataHandler import DataHandler
+
+        dataHandler = DataHandler()
+        return dataHandler.export(results.file, results.directory)
 
 
 def deprecate(*params):
@@ -559,7 +600,14 @@ def bosh(args=None):
             return bosh_return(out)
         elif func == "invocation":
             out = invocation(*params)
-            return bosh_return(out)
+            if out is None:
+                return bosh_return(out)
+            # Report of a batch of invocations, one JSON line each
+            return bosh_return(
+                out,
+                code=0 if all(entry["valid"] for entry in out) else 1,
+                formatted=os.linesep.join(json.dumps(entry) for entry in out),
+            )
         elif func == "evaluate":
             out = evaluate(*params)
             return bosh_return(out)
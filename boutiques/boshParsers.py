@@ -37,6 +37,8 @@ from argparse import ArgumentParser, RawTextHelpFormatter
 
 import simplejson as json
 
+from boutiques.fileHashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
+
 
 def add_subparser_create(subparsers):
     parser_create = subparsers.add_parser(
@@ -84,7 +86,8 @@ def add_subparser_data(subparsers):
         "Publish: publishes contents of cache to Zenodo as "
         "a public data set. Requires a Zenodo access token, "
         "see http://developers.zenodo.org/#authentication. "
-        "Delete: remove one or more records from the cache."
+        "Delete: remove one or more records from the cache. "
+        "Export: write records to a directory as JSON files."
     )
 
     parser_data_delete = data_subparsers.add_parser(
@@ -101,6 +104,20 @@ def add_subparser_data(subparsers):
         help="disable interactive input.",
     )
 
+    parser_data_export = data_subparsers.add_parser(
+        "export", description="Write data record(s) in cache to JSON files."
+    )
+    parser_data_export.set_defaults(mode="export")
+    parser_data_export.add_argument(
+        "directory", action="store", help="Directory where records are written."
+    )
+    parser_data_export.add_argument(
+        "-f",
+        "--file",
+        action="store",
+        help="Filename of record to export. Exports all records by default.",
+    )
+
     parser_data_inspect = data_subparsers.add_parser(
         "inspect", description="Displays contents of cache"
     )
@@ -326,7 +343,57 @@ def add_subparser_execute(subparsers):
     parser_exec_launch.add_argument(
         "invocation",
         action="store",
-        help="Input JSON complying to invocation.",
+        help="Input JSON complying to invocation. A directory of JSON "
+        "files, a glob pattern matching JSON files, a JSON-lines (.jsonl) "
+        "file or a CSV (.csv) file with one column per input id launches "
+        "a batch of invocations.",
+    )
+    parser_exec_launch.add_argument(
+        "--output-wait",
+        action="store",
+        type=float,
+        default=0.5,
+        help="Maximum number of seconds to wait after execution for "
+        "required output files to become visible (e.g. on network file "
+        "systems). Defaults to 0.5.",
+    )
+    parser_exec_launch.add_argument(
+        "--session",
+        action="store_true",
+        help="Start the container once and run the invocations of a batch "
+        "in it (with 'docker exec' or a Singularity instance), instead of "
+        "starting a container per invocation. Invocations share a "
+        "container when they have the same mounts.",
+    )
+    parser_exec_launch.add_argument(
+        "--cache-results",
+        action="store_true",
+        help="Reuse the outputs of a previous successful execution with "
+        "the same descriptor, invocation, input file contents and container "
+        "image instead of running the tool again. Results are stored in "
+        "~/.cache/boutiques/results. Restored executions are not recorded "
+        "by data collection.",
+    )
+    parser_exec_launch.add_argument(
+        "--workers",
+        action="store",
+        type=int,
+        help="Maximum number of invocations of a batch launched "
+        "concurrently. Concurrency is also bounded by the cores and "
+        "memory of the host with respect to the descriptor's "
+        "suggested-resources.",
+    )
+    parser_exec_launch.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stops launching the invocations of a batch after the first "
+        "failure.",
+    )
+    parser_exec_launch.add_argument(
+        "--log-dir",
+        action="store",
+        help="Directory where the stdout and stderr of each invocation of "
+        "a batch are written, instead of being kept in memory.",
     )
     parser_exec_launch.add_argument(
         "-v",
@@ -370,11 +437,26 @@ def add_subparser_execute(subparsers):
         help="Path to Singularity image. "
         "If not specified, will use current directory.",
     )
+    parser_exec_launch.add_argument(
+        "--image-cache-dir",
+        action="store",
+        help="Directory where Singularity images are pulled and shared "
+        "by all descriptors, when --imagepath is not specified. "
+        "If not specified, will use current directory.",
+    )
     parser_exec_launch.add_argument(
         "--skip-data-collection",
         action="store_true",
         help="Skips execution data collection and saving" "to cache.",
     )
+    parser_exec_launch.add_argument(
+        "--hash-algorithm",
+        action="store",
+        choices=HASH_ALGORITHMS,
+        default=DEFAULT_HASH_ALGORITHM,
+        help="Digest of the input and output files recorded by data "
+        "collection. Defaults to md5.",
+    )
     parser_exec_launch.add_argument(
         "--provenance",
         action="store",
@@ -398,6 +480,14 @@ def add_subparser_execute(subparsers):
         action="store_true",
         help="Do not automatically pull the container image.",
     )
+    parser_exec_launch.add_argument(
+        "--image-freshness",
+        action="store",
+        type=float,
+        default=86400,
+        help="Number of seconds during which a Docker image found locally "
+        "is used without pulling it again. Defaults to 86400 (one day).",
+    )
     parser_exec_launch.add_argument(
         "--no-automounts",
         action="store_true",
@@ -453,6 +543,13 @@ def add_subparser_execute(subparsers):
         help="Path to Singularity image. "
         "If not specified, will use current directory.",
     )
+    parser_exec_prepare.add_argument(
+        "--image-cache-dir",
+        action="store",
+        help="Directory where Singularity images are pulled and shared "
+        "by all descriptors, when --imagepath is not specified. "
+        "If not specified, will use current directory.",
+    )
     parser_exec_prepare.add_argument(
         "--sandbox",
         action="store_true",
@@ -463,6 +560,14 @@ def add_subparser_execute(subparsers):
         action="store_true",
         help="Do not automatically pull the container image.",
     )
+    parser_exec_prepare.add_argument(
+        "--image-freshness",
+        action="store",
+        type=float,
+        default=86400,
+        help="Number of seconds during which a Docker image found locally "
+        "is used without pulling it again. Defaults to 86400 (one day).",
+    )
 
     parser_exec_simulate = exec_subparsers.add_parser(
         "simulate", description="Simulates an invocation."
@@ -583,7 +688,17 @@ def add_subparser_invocation(subparsers):
         action="store",
         help="Input values in a JSON file or as a JSON "
         "object to be validated against "
-        "the invocation schema.",
+        "the invocation schema. A directory of JSON files, a "
+        "glob pattern matching JSON files, a JSON-lines (.jsonl) file "
+        "or a CSV (.csv) file validates a batch of invocations and "
+        "prints one JSON line per invocation with its errors.",
+    )
+    parser_invocation.add_argument(
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of processes validating a batch of invocations. "
+        "Defaults to validating them in the current process.",
     )
     parser_invocation.add_argument(
         "-w",
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+import os.path as op
+import re
+from collections import namedtuple
+from shlex import quote
+from types import MappingProxyType
+
+from boutiques.util.utils import conditionalExpFormat
+
+# Per-parameter attributes needed when building command lines.
+# Defaults from the schema (e.g. " " for separators) are already applied.
+CompiledParameter = namedtuple(
+    "CompiledParameter",
+    [
+        "id",
+        "type",
+        "value_key",
+        "flag",
+        "flag_separator",
+        "list_separator",
+        "is_output",
+        "escape",
+    ],
+)
+
+
+class CompiledTemplate:
+    """
+    A command-line, path or file template split once into literal
+    segments and value-key segments, so that substituting an invocation
+    is a single pass over the segments instead of one replacement pass
+    over the whole template per parameter.
+    """
+
+    def __init__(self, template, keys_regex, params_by_key):
+        self.template = template
+        # List of (text, params) tuples, params is None for literal text.
+        # Several parameters may share a value-key, in which case params
+        # holds all of them in descriptor order.
+        self.segments = []
+        # Offset of the first occurrence of each parameter in the template
+        self.first_offsets = {}
+        pos = 0
+        if keys_regex is not None:
+            for match in keys_regex.finditer(template):
+                start = match.start()
+                if start > pos:
+                    self.segments.append((template[pos:start], None))
+                params = params_by_key[match.group()]
+                self.segments.append((match.group(), params))
+                for param in params:
+                    self.first_offsets.setdefault(param.id, start)
+                pos = match.end()
+        if pos < len(template):
+            self.segments.append((template[pos:], None))
+        self.param_ids = frozenset(self.first_offsets)
+
+    # Substitutes values (a dict from parameter ids to values) in the
+    # template.
+    # * if use_flags is true, keys will be replaced by:
+    #      * flag+flag-separator+value if flag is not None
+    #      * value otherwise
+    # * if unfound_keys is "remove", unfound keys and the space preceding
+    #     them are removed; if it is "keep" they are left as is
+    # * if unfound_keys is "clear" then "" is returned if the template has
+    #     unfound keys (useful for configuration files)
+    # * before being substituted, the values will be:
+    #     * stripped from all the strings in stripped_extensions
+    #     * escaped for special characters if escape_special_chars is true,
+    #       values of ids in escaped_ids are always escaped
+    def render(
+        self,
+        values,
+        use_flags=False,
+        unfound_keys="remove",
+        stripped_extensions=(),
+        is_output=False,
+        escape_special_chars=True,
+        escaped_ids=(),
+    ):
+        if unfound_keys == "clear":
+            for param_id in self.param_ids:
+                if param_id not in values:
+                    return ""
+        parts, formatted = [], {}
+        for text, params in self.segments:
+            if params is None:
+                parts.append(text)
+                continue
+            # The first parameter sharing the key decides, unless unfound
+            # keys are kept, in which case the first one with a value does
+            param = params[0]
+            if unfound_keys == "keep":
+                param = next((p for p in params if p.id in values), param)
+            if param.id in values:
+                if param.id not in formatted:
+                    formatted[param.id] = self._formatValue(
+                        param,
+                        values[param.id],
+                        use_flags,
+                        stripped_extensions,
+                        is_output,
+                        escape_special_chars
+                        and param.escape
+                        or param.id in escaped_ids,
+                    )
+                if formatted[param.id] != "":
+                    parts.append(formatted[param.id])
+                    continue
+            elif unfound_keys == "keep":
+                parts.append(text)
+                continue
+            # Empty or removed keys take their leading space with them
+            if parts and parts[-1].endswith(" "):
+                parts[-1] = parts[-1][:-1]
+        return "".join(parts)
+
+    def _formatValue(
+        self, param, val, use_flags, stripped_extensions, is_output, escape
+    ):
+        if type(val) is list:
+            val = param.list_separator.join(
+                quote(str(x)) if escape else str(x) for x in val
+            )
+        elif escape:
+            val = quote(val)
+        # Add flags and separator if necessary
+        if use_flags and param.flag is not None:
+            # special case for flag-type inputs
+            if param.type == "Flag":
+                val = "" if val is False else param.flag
+            else:
+                val = param.flag + param.flag_separator + str(val)
+        # Remove file extensions from input value
+        if param.type == "File" or param.type == "String":
+            for extension in stripped_extensions:
+                val = val.replace(extension, "")
+            # Remove path if a) a file, b) not the first item in the
+            # template; for output files specifically
+            if param.type == "File" and is_output and self.first_offsets[param.id]:
+                val = op.basename(val)
+        # Here val can be a number so we need to cast it
+        return "" if val is None else str(val)
+
+
+class CompiledDescriptor:
+    """
+    Read-only index over the inputs, output-files and groups of a
+    descriptor dictionary. It is built once per descriptor so that the
+    lookups performed by the executor (parameter by id, group by id,
+    group of a member, requirements of a parameter) are dictionary
+    accesses instead of scans of the descriptor lists. It also holds
+    the compiled command-line, path and file templates, and the order
+    in which output file names must be generated.
+    """
+
+    def __init__(self, desc_dict):
+        self.inputs = tuple(desc_dict.get("inputs") or [])
+        self.outputs = tuple(desc_dict.get("output-files") or [])
+        self.groups = tuple(desc_dict.get("groups") or [])
+
+        # The first definition wins, as with a linear scan
+        params, compiled = {}, {}
+        for is_output, section in ((False, self.inputs), (True, self.outputs)):
+            for param in section:
+                if param["id"] not in params:
+                    params[param["id"]] = param
+                    compiled[param["id"]] = self._compile(param, is_output)
+        disablers = {}
+        for param in self.inputs:
+            for disabled in param.get("disables-inputs") or []:
+                disablers.setdefault(disabled, []).append(param["id"])
+        groups, member_groups = {}, {}
+        for group in self.groups:
+            groups.setdefault(group["id"], group)
+            for member in group.get("members") or []:
+                member_groups.setdefault(member, group)
+
+        self._params = MappingProxyType(params)
+        self._compiled = MappingProxyType(compiled)
+        self._groups = MappingProxyType(groups)
+        self._member_groups = MappingProxyType(member_groups)
+        self._disablers = MappingProxyType({k: tuple(v) for k, v in disablers.items()})
+        self.parameter_ids = tuple(params)
+        self.group_ids = frozenset(groups)
+        self.input_ids = frozenset(p["id"] for p in self.inputs)
+
+        # Templates are tokenized once for all invocations
+        params_by_key = {}
+        for param in compiled.values():
+            if param.value_key:
+                params_by_key.setdefault(param.value_key, []).append(param)
+        self._keys_regex = None
+        if params_by_key:
+            self._keys_regex = re.compile(
+                "|".join(
+                    re.escape(k) for k in sorted(params_by_key, key=len, reverse=True)
+                )
+            )
+        self._params_by_key = MappingProxyType(
+            {k: tuple(v) for k, v in params_by_key.items()}
+        )
+        self.commandLine = self.compileTemplate(desc_dict.get("command-line") or "")
+        path_templates, conditional_templates, file_templates = {}, {}, {}
+        for output in self.outputs:
+            output_id = output["id"]
+            if "path-template" in output:
+                path_templates[output_id] = self.compileTemplate(
+                    output["path-template"]
+                )
+            else:
+                conditional_templates[output_id] = tuple(
+                    (key, self.compileTemplate(obj[key]))
+                    for obj in output.get("conditional-path-template") or []
+                    for key in list(obj.keys())[:1]
+                )
+            if output.get("file-template") is not None:
+                file_templates[output_id] = tuple(
+                    self.compileTemplate(line) for line in output["file-template"]
+                )
+        self.pathTemplates = MappingProxyType(path_templates)
+        self.conditionalTemplates = MappingProxyType(conditional_templates)
+        self.fileTemplates = MappingProxyType(file_templates)
+        self.outputOrder = self._sortOutputs()
+
+    # Tokenizes a template against the value-keys of the descriptor
+    def compileTemplate(self, template):
+        return CompiledTemplate(template, self._keys_regex, self._params_by_key)
+
+    # Orders output ids so that outputs referenced in the path template
+    # (or conditions) of another output come before it. Outputs involved
+    # in a cycle are kept in descriptor order.
+    def _sortOutputs(self):
+        output_ids = [o["id"] for o in self.outputs]
+        known = set(output_ids)
+        deps = {}
+        for output_id in output_ids:
+            referenced = set()
+            if output_id in self.pathTemplates:
+                referenced |= self.pathTemplates[output_id].param_ids
+            for key, template in self.conditionalTemplates.get(output_id, ()):
+                referenced |= template.param_ids
+                referenced |= set(conditionalExpFormat(key).split())
+            deps[output_id] = (referenced & known) - {output_id}
+        order, resolved, pending = [], set(), list(dict.fromkeys(output_ids))
+        while pending:
+            ready = next((o for o in pending if deps[o] <= resolved), pending[0])
+            order.append(ready)
+            resolved.add(ready)
+            pending.remove(ready)
+        return tuple(order)
+
+    @staticmethod
+    def _compile(param, is_output):
+        param_type = param.get("type")
+        flag_separator = param.get("command-line-flag-separator")
+        list_separator = param.get("list-separator")
+        return CompiledParameter(
+            id=param["id"],
+            type=param_type,
+            value_key=param.get("value-key"),
+            flag=param.get("command-line-flag"),
+            flag_separator=" " if flag_separator is None else flag_separator,
+            list_separator=" " if list_separator is None else list_separator,
+            is_output=is_output,
+            escape=param_type in ("String", "File"),
+        )
+
+    # Retrieves the input or output definition corresponding to the given id
+    def param(self, param_id):
+        return self._params[param_id]
+
+    # Retrieves the compiled attributes of an input or output
+    def compiled(self, param_id):
+        return self._compiled[param_id]
+
+    # Retrieves the group definition corresponding to the given id
+    def group(self, group_id):
+        return self._groups[group_id]
+
+    # Retrieves the group a given parameter id belongs to, or None
+    def groupOf(self, param_id):
+        return self._member_groups.get(param_id)
+
+    def isGroup(self, group_id):
+        return group_id in self._groups
+
+    def isGroupMember(self, param_id):
+        return param_id in self._member_groups
+
+    # Returns the required inputs of a given input or group id
+    def requirementsOf(self, target_id):
+        if target_id in self._groups:
+            return self._groups[target_id].get("members") or []
+        return self._params[target_id].get("requires-inputs") or []
+
+    # Returns the ids of the inputs that disable the given input
+    def disablersOf(self, param_id):
+        return list(self._disablers.get(param_id, ()))
+
+    # Returns the compiled parameters, inputs first, in descriptor order
+    def compiledParameters(self):
+        return list(self._compiled.values())
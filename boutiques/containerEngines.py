@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import os
+import os.path as op
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from boutiques import jsonBackend
+
+# Name, absolute path and version (None unless probed) of an installed
+# container engine
+ContainerEngine = namedtuple("ContainerEngine", ["name", "path", "version"])
+
+# Time (in seconds) during which a version probe stored on disk is reused
+ENGINE_CACHE_TTL = 24 * 3600
+
+# Engines already looked up by this process, keyed by (command, PATH,
+# probeVersion)
+_engines = {}
+_enginesLock = threading.Lock()
+
+
+def getEngineCacheFile():
+    cache_dir = op.join(op.expanduser("~"), ".cache", "boutiques")
+    return op.join(cache_dir, "container-engines.json")
+
+
+# Forgets the engines looked up by this process and, if onDisk is true,
+# removes the on-disk cache of version probes
+def clearEngineCache(onDisk=False):
+    with _enginesLock:
+        _engines.clear()
+        if onDisk and op.exists(getEngineCacheFile()):
+            os.remove(getEngineCacheFile())
+
+
+# Looks up a container engine (e.g. "docker") in the PATH.
+# Returns a ContainerEngine, or None if the command is not installed.
+# If probeVersion is true, "<command> --version" is also run and the
+# engine is reported as missing if it fails. Probe results are stored
+# in ~/.cache/boutiques for ttl seconds, or until the binary changes.
+def findContainerEngine(command, probeVersion=False, ttl=ENGINE_CACHE_TTL):
+    key = (command, os.environ.get("PATH"), probeVersion)
+    with _enginesLock:
+        if key in _engines:
+            return _engines[key]
+        engine = _lookupEngine(command, probeVersion, ttl)
+        _engines[key] = engine
+        return engine
+
+
+def _lookupEngine(command, probeVersion, ttl):
+    path = shutil.which(command)
+    if path is None:
+        return None
+    path = op.realpath(path)
+    if not probeVersion:
+        return ContainerEngine(command, path, None)
+
+    mtime = op.getmtime(path)
+    cache = _readEngineCache()
+    entry = cache.get(path)
+    if (
+        entry is None
+        or entry.get("mtime") != mtime
+        or time.time() - entry.get("checked", 0) > ttl
+    ):
+        entry = _probeVersion(path)
+        entry["mtime"] = mtime
+        cache[path] = entry
+        _writeEngineCache(cache)
+    if not entry["installed"]:
+        return None
+    return ContainerEngine(command, path, entry["version"])
+
+
+# Runs "<path> --version" without printing anything to the terminal
+def _probeVersion(path):
+    try:
+        process = subprocess.run(
+            [path, "--version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+        installed = process.returncode == 0
+        version = process.stdout.decode("utf-8", "replace").strip()
+    except (OSError, subprocess.TimeoutExpired):
+        installed, version = False, ""
+    return {"installed": installed, "version": version, "checked": time.time()}
+
+
+def _readEngineCache():
+    try:
+        with open(getEngineCacheFile()) as fhandle:
+            cache = jsonBackend.load(fhandle)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+# The cache is only an optimization: it is written atomically so that
+# concurrent processes never read a partial file, and failures to write
+# it (e.g. read-only home directory) are ignored
+def _writeEngineCache(cache):
+    cache_file = getEngineCacheFile()
+    try:
+        os.makedirs(op.dirname(cache_file), exist_ok=True)
+        (fd, tmp) = tempfile.mkstemp(dir=op.dirname(cache_file), suffix=".tmp")
+        with os.fdopen(fd, "w") as fhandle:
+            jsonBackend.dump(cache, fhandle, compact=True)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+import errno
+import fcntl
+import os
+import os.path as op
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from boutiques import jsonBackend
+from boutiques.logger import print_info
+
+# Outcome of resolving a Docker image: its digest (None if the image is
+# not available locally), whether it was pulled, whether the local copy
+# was reused without contacting the registry, and the pull duration
+ImageResolution = namedtuple(
+    "ImageResolution", ["image", "digest", "pulled", "cache_hit", "pull_time"]
+)
+
+# Time (in seconds) during which a resolved tag is not pulled again
+DOCKER_IMAGE_FRESHNESS = 24 * 3600
+
+# Maximum time (in seconds) to wait for another process pulling an image
+IMAGE_LOCK_TIMEOUT = 180
+
+_imageCacheLock = threading.Lock()
+
+
+def getImageCacheFile():
+    cache_dir = op.join(op.expanduser("~"), ".cache", "boutiques")
+    return op.join(cache_dir, "docker-images.json")
+
+
+# Returns the digest of a Docker image from the local image store, or
+# None if the image is not present locally
+def inspectDockerImage(image, binName="docker"):
+    try:
+        process = subprocess.run(
+            [binName, "image", "inspect", image],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+    if process.returncode:
+        return None
+    try:
+        info = jsonBackend.loads(process.stdout)[0]
+    except (ValueError, IndexError):
+        return None
+    # Prefer the registry digest, locally built images only have an id
+    repo_digests = info.get("RepoDigests") or []
+    if repo_digests:
+        return repo_digests[0].split("@")[-1]
+    return info.get("Id")
+
+
+# Makes a Docker image available locally, pulling it only when the tag
+# is missing from the local image store or was last resolved more than
+# freshness seconds ago. pull is a function pulling the image and
+# returning True on success. Resolved digests are recorded in
+# ~/.cache/boutiques. If noPull is true, the image is never pulled.
+def resolveDockerImage(
+    image, pull, freshness=DOCKER_IMAGE_FRESHNESS, noPull=False, binName="docker"
+):
+    digest = inspectDockerImage(image, binName)
+    with _imageCacheLock:
+        entry = _readImageCache().get(image)
+    if digest is not None and (
+        noPull
+        or entry is None
+        or entry.get("digest") != digest
+        or time.time() - entry.get("resolved", 0) <= freshness
+    ):
+        # Tags found locally but unknown to the cache (e.g. pulled by
+        # hand) start their freshness window now
+        if entry is None or entry.get("digest") != digest:
+            _recordImage(image, digest)
+        return ImageResolution(image, digest, False, True, 0.0)
+    if noPull:
+        return ImageResolution(image, None, False, False, 0.0)
+
+    start = time.time()
+    pulled = pull()
+    pull_time = time.time() - start
+    if pulled:
+        digest = inspectDockerImage(image, binName) or digest
+        if digest is not None:
+            _recordImage(image, digest)
+    return ImageResolution(image, digest, pulled, False, pull_time)
+
+
+# Forgets all the resolved images
+def clearImageCache():
+    with _imageCacheLock:
+        if op.exists(getImageCacheFile()):
+            os.remove(getImageCacheFile())
+
+
+def _recordImage(image, digest):
+    with _imageCacheLock:
+        cache = _readImageCache()
+        cache[image] = {"digest": digest, "resolved": time.time()}
+        _writeImageCache(cache)
+
+
+def _readImageCache():
+    try:
+        with open(getImageCacheFile()) as fhandle:
+            cache = jsonBackend.load(fhandle)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+# Written atomically so that concurrent processes never read a partial
+# file. The cache is only an optimization, write failures are ignored.
+def _writeImageCache(cache):
+    cache_file = getImageCacheFile()
+    try:
+        os.makedirs(op.dirname(cache_file), exist_ok=True)
+        (fd, tmp) = tempfile.mkstemp(dir=op.dirname(cache_file), suffix=".tmp")
+        with os.fdopen(fd, "w") as fhandle:
+            jsonBackend.dump(cache, fhandle, compact=True)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+
+
+class ImageLock:
+    """
+    Exclusive lock taken by the process pulling a container image file,
+    so that processes sharing a file system pull each image only once.
+    The lock is an fcntl lock on <image>.lock, which also records the
+    hostname and PID of its holder. Waiters return as soon as the image
+    appears, and break locks left by dead processes of the same host.
+    On file systems without fcntl support, creating the lock file is
+    what takes the lock.
+    """
+
+    def __init__(self, imagePath, timeout=IMAGE_LOCK_TIMEOUT):
+        self.path = imagePath + ".lock"
+        self.timeout = timeout
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    # Waits until the lock is acquired (returns True), or until exists()
+    # is true or the timeout expires (returns False)
+    def acquire(self, exists=lambda: False):
+        start = time.time()
+        delay = 0.01
+        waiting = False
+        while not exists():
+            if self._tryLock():
+                return True
+            if time.time() - start > self.timeout:
+                return False
+            if not waiting:
+                waiting = True
+                print_info(
+                    "Another process ({}) seems to be pulling the image "
+                    "({} exists), waiting".format(self.owner() or "unknown", self.path)
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+        return False
+
+    def release(self):
+        if self._fd is None:
+            return
+        # The lock file is removed before unlocking it, so that waiters
+        # locking the removed file notice it and try again
+        if self._isCurrent(self._fd):
+            os.remove(self.path)
+        os.close(self._fd)
+        self._fd = None
+
+    # Returns "hostname:pid" of the lock holder, or None
+    def owner(self):
+        try:
+            with open(self.path) as fhandle:
+                return fhandle.read().strip() or None
+        except OSError:
+            return None
+
+    def _tryLock(self):
+        created = self._createLockFile()
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            return False  # Removed by its holder in the meantime
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            if created and e.errno in (errno.ENOLCK, errno.EOPNOTSUPP, errno.EINVAL):
+                # No fcntl support: creating the file is what locks it
+                self._fd = fd
+                return True
+            os.close(fd)
+            self._breakIfStale()
+            return False
+        # The file may have been removed by its previous holder between
+        # open() and flock()
+        if not self._isCurrent(fd):
+            os.close(fd)
+            return False
+        if not created:
+            os.ftruncate(fd, 0)
+            os.write(fd, self._identity().encode())
+        self._fd = fd
+        return True
+
+    # Atomically creates the lock file with the identity of this process.
+    # Returns False if the file already exists. The temporary file is
+    # unique to each call, as threads of a process share its identity.
+    def _createLockFile(self):
+        (fd, tmp) = tempfile.mkstemp(
+            dir=op.dirname(self.path) or ".", prefix=op.basename(self.path) + "."
+        )
+        with os.fdopen(fd, "w") as fhandle:
+            fhandle.write(self._identity())
+        try:
+            os.link(tmp, self.path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    # Removes the lock file if its holder is a dead process of this host.
+    # Holders on other hosts cannot be checked and are waited for.
+    def _breakIfStale(self):
+        owner = self.owner()
+        if owner is None or ":" not in owner:
+            return
+        hostname, pid = owner.rsplit(":", 1)
+        if hostname != socket.gethostname() or not pid.isdigit():
+            return
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            print_info(f"Removing stale lock {self.path} of dead process {pid}")
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        except PermissionError:
+            pass  # The process exists but belongs to another user
+
+    def _isCurrent(self, fd):
+        try:
+            return os.path.samestat(os.fstat(fd), os.stat(self.path))
+        except FileNotFoundError:
+            return False
+
+    def _identity(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
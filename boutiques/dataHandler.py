@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 import hashlib
 import os
+import sqlite3
+import tempfile
 import time
 
+from boutiques import jsonBackend
 from boutiques.logger import print_info, raise_error
 from boutiques.nexusHelper import NexusHelper
 from boutiques.util.utils import extractFileName, importCatcher, loadJson
@@ -13,7 +16,10 @@ class DataHandler:
     # Constructor
     def __init__(self):
         self.cache_dir = getDataCacheDir()
-        self.cache_files = os.listdir(self.cache_dir)
+        self.store = DataStore()
+        # Records are listed from the data store and from the files
+        # written by previous versions of Boutiques
+        self.cache_files = os.listdir(self.cache_dir) + self.store.names()
         self.descriptor_files = [
             fl for fl in self.cache_files if fl.split("_")[0] == "descriptor"
         ]
@@ -32,20 +38,12 @@ class DataHandler:
         if self.example:
             # Display the first file in cache
             if len(self.record_files) > 0:
-                filename = self.record_files[0]
-                file_path = os.path.join(self.cache_dir, filename)
-                self._display_file(file_path)
+                self._display_file(self.record_files[0])
             else:
                 print("No records in the cache at the moment.")
         elif self.latest:
             if len(self.record_files) > 0:
-                self.record_files.sort(
-                    key=lambda x: os.path.getmtime(os.path.join(self.cache_dir, x)),
-                    reverse=True,
-                )
-                filename = self.record_files[0]
-                file_path = os.path.join(self.cache_dir, filename)
-                self._display_file(file_path)
+                self._display_file(self._latest_record())
             else:
                 print("No records in the cache at the moment.")
         # Print information about files in cache
@@ -61,11 +59,54 @@ class DataHandler:
             for i in range(len(self.cache_files)):
                 print(self.cache_files[i])
 
-    # Private function to print a file to console
-    def _display_file(self, file_path):
-        with open(file_path) as file_in:
-            print(file_in.read())
-            file_in.close()
+    # Private function to print a record to console, indented as records
+    # are written compact
+    def _display_file(self, filename):
+        print(jsonBackend.dumps(self._load_record(filename)))
+
+    # Private function returning the name of the most recent record. The
+    # files of previous versions are compared by modification time.
+    def _latest_record(self):
+        latest = self.store.latest()
+        for fl in os.listdir(self.cache_dir):
+            if fl not in self.descriptor_files:
+                created = os.path.getmtime(os.path.join(self.cache_dir, fl))
+                if latest is None or created > latest[1]:
+                    latest = (fl, created)
+        return latest[0]
+
+    # Private function to load a record from the data store, or from the
+    # data cache directory
+    def _load_record(self, filename):
+        file_path = os.path.join(self.cache_dir, filename)
+        if os.path.isfile(file_path):
+            return loadJson(file_path)
+        return self.store.get(filename)
+
+    # Private function returning the path of a record file, exporting it
+    # from the data store to directory if needed
+    def _record_path(self, filename, directory):
+        file_path = os.path.join(self.cache_dir, filename)
+        if os.path.isfile(file_path):
+            return file_path
+        return self.store.export(filename, directory)
+
+    # Function to write records of the data store to a directory, as
+    # individual JSON files named after the records. Exports all the
+    # records if file is None.
+    def export(self, file, directory):
+        self.filename = extractFileName(file)
+        os.makedirs(directory, exist_ok=True)
+        if self.filename is not None:
+            self._file_exists_in_cache(self.filename)
+            filenames = [self.filename]
+        else:
+            filenames = self.record_files
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            with open(path, "w") as fhandle:
+                jsonBackend.dump(self._load_record(filename), fhandle, compact=True)
+        print_info(f"{len(filenames)} record(s) exported to {directory}")
 
     # Function to publish a data set to Zenodo or Nexus
     # Options allow to only publish a single file, publish files individually as
@@ -146,32 +187,53 @@ class DataHandler:
         if len(records_dict) == 0:
             return
 
+        # Records of the data store are exported to files to be uploaded
+        with tempfile.TemporaryDirectory() as export_dir:
+            self._upload(files_list, records_dict, export_dir)
+
+    def _upload(self, files_list, records_dict, export_dir):
         # Publish to Nexus
         if self.to_nexus:
             for file in files_list:
                 self.nexus_helper.publish(
                     self.nexus_org,
                     self.nexus_project,
-                    os.path.join(self.cache_dir, file),
+                    self._record_path(file, export_dir),
                 )
 
         # Publish to Zenodo
         else:
-            # Create deposition
-            deposition_id = self.zenodo_helper.zenodo_deposit(
-                self._create_metadata(records_dict), self.zenodo_access_token
-            )
-
-            # Upload all files in files_list to deposition
-            for fil in records_dict.keys():
-                file_path = os.path.join(self.cache_dir, fil)
-                self.zenodo_helper.zenodo_upload_file(
-                    deposition_id,
-                    file_path,
-                    zenodo_access_token=self.zenodo_access_token,
-                    error_msg="Cannot upload record to Zenodo",
-                    verbose_msg="Record uploaded to Zenodo",
+            # Resume an interrupted publication of the same records
+            checkpoint = PublishCheckpoint(self.zenodo_endpoint, records_dict.keys())
+            deposition_id = checkpoint.deposition_id
+            if deposition_id is None:
+                # Create deposition
+                deposition_id = self.zenodo_helper.zenodo_deposit(
+                    self._create_metadata(records_dict), self.zenodo_access_token
+                )
+                checkpoint.start(
+                    deposition_id, self.zenodo_helper.buckets.get(deposition_id)
                 )
+            else:
+                self.zenodo_helper.buckets[deposition_id] = checkpoint.bucket
+                print_info(
+                    "Resuming publication to deposition {}, {} record(s) "
+                    "already uploaded".format(deposition_id, len(checkpoint.uploaded))
+                )
+
+            # Upload the files in files_list not uploaded yet to deposition
+            self.zenodo_helper.zenodo_upload_files(
+                deposition_id,
+                [
+                    self._record_path(fil, export_dir)
+                    for fil in records_dict.keys()
+                    if fil not in checkpoint.uploaded
+                ],
+                self.zenodo_access_token,
+                on_upload=checkpoint.add,
+                error_msg="Cannot upload record to Zenodo",
+                verbose_msg="Record uploaded to Zenodo",
+            )
 
             # Publish deposition
             msg_obj = "Records" if self.bulk_publish else "Record"
@@ -180,6 +242,7 @@ class DataHandler:
             )
             # Clear cache of published records
             if doi:
+                checkpoint.remove()
                 self._clean_cache(records_dict)
 
     # Private function to filter out records that can not be published
@@ -189,8 +252,7 @@ class DataHandler:
         desc_to_publish = set()
         publishable_dict = {}
         for fl in files_list:
-            fl_path = os.path.join(self.cache_dir, fl)
-            fl_dict = loadJson(fl_path)
+            fl_dict = self._load_record(fl)
             doi = fl_dict.get("summary").get("descriptor-doi")
             # Descriptor is not publish, record contains link to file
             if doi.split("_")[0] == "descriptor":
@@ -281,7 +343,8 @@ class DataHandler:
     def _clean_cache(self, records_dict):
         for record in records_dict.keys():
             self.delete(record, True)
-        # List remaining records and collect descriptor-doi values
+        # List remaining records and collect descriptor-doi values, which
+        # are indexed in the data store
         self.record_files = [
             fl for fl in os.listdir(self.cache_dir) if fl not in self.descriptor_files
         ]
@@ -290,7 +353,8 @@ class DataHandler:
             .get("summary")
             .get("descriptor-doi")
             for fl in self.record_files
-        ]
+        ] + self.store.descriptors()
+        self.record_files += self.store.names()
 
         # Check each descriptor in remaining records
         for descriptor in self.descriptor_files:
@@ -323,17 +387,24 @@ class DataHandler:
             self._file_exists_in_cache(file)
             # Remove file from cache
             file_path = os.path.join(self.cache_dir, file)
-            os.remove(file_path)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+            # Removes the record, or the index entry of a descriptor
+            self.store.delete(self.filename)
             print_info(f"File {file} has been removed from the data cache")
         # Remove all files in the data cache
         else:
-            [os.remove(os.path.join(self.cache_dir, f)) for f in self.cache_files]
+            for f in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, f))
+            self.store.clear()
             print_info("All files have been removed from the data cache")
 
     def _file_exists_in_cache(self, filename):
         file_path = os.path.join(self.cache_dir, filename)
         # Incorrect filename input
-        if not os.path.isfile(file_path):
+        if not os.path.isfile(file_path) and not self.store.contains(
+            extractFileName(filename)
+        ):
             msg = f"File {filename} does not exist in the data cache"
             raise_error(ValueError, msg)
 
@@ -359,5 +430,194 @@ def getDataCacheDir():
     return data_cache_dir
 
 
+# Returns the path of the database holding the data-capture records,
+# next to the data cache directory
+def getDataStoreFile():
+    return getDataCacheDir().rstrip(os.sep) + ".sqlite"
+
+
+# Data-capture records of executions, stored in a SQLite database rather
+# than in one JSON file per execution. Records keep the names of the
+# files they were written to by previous versions of Boutiques
+# (<tool name>_<date-time>.json) and are indexed by tool name, date and
+# descriptor DOI, which tells whether they can be published (see
+# DataHandler._checkPublishable). They are exported to JSON files to be
+# published.
+class DataStore:
+    def __init__(self, path=None):
+        self.path = path or getDataStoreFile()
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "name TEXT PRIMARY KEY, tool TEXT, date TEXT, created REAL, "
+                "descriptor TEXT, content TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS descriptor_files ("
+                "hash TEXT PRIMARY KEY, name TEXT)"
+            )
+            for column in ("tool", "created", "descriptor"):
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS records_{column} "
+                    f"ON records ({column})"
+                )
+
+    def close(self):
+        self.connection.close()
+
+    # Adds a record. Raises sqlite3.IntegrityError if a record with the
+    # same name exists, rather than losing one of them.
+    def add(self, name, record):
+        summary = record.get("summary", {})
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    summary.get("name"),
+                    summary.get("date-time"),
+                    time.time(),
+                    summary.get("descriptor-doi"),
+                    jsonBackend.dumps(record, compact=True),
+                ),
+            )
+
+    # Returns the names of the records, optionally of a given tool, from
+    # the oldest to the most recent
+    def names(self, tool=None):
+        if tool is None:
+            rows = self.connection.execute("SELECT name FROM records ORDER BY created")
+        else:
+            rows = self.connection.execute(
+                "SELECT name FROM records WHERE tool = ? ORDER BY created", (tool,)
+            )
+        return [name for (name,) in rows]
+
+    def contains(self, name):
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM records WHERE name = ?", (name,)
+            ).fetchone()
+            is not None
+        )
+
+    # Returns the content of a record, or None if it does not exist
+    def get(self, name):
+        row = self.connection.execute(
+            "SELECT content FROM records WHERE name = ?", (name,)
+        ).fetchone()
+        return None if row is None else jsonBackend.loads(row[0])
+
+    # Returns the name and creation time of the most recent record, or
+    # None if there is no record
+    def latest(self):
+        return self.connection.execute(
+            "SELECT name, created FROM records ORDER BY created DESC LIMIT 1"
+        ).fetchone()
+
+    # Returns the distinct descriptor DOIs (or descriptor file names, for
+    # unpublished descriptors) of the records
+    def descriptors(self):
+        rows = self.connection.execute("SELECT DISTINCT descriptor FROM records")
+        return [descriptor for (descriptor,) in rows]
+
+    # Writes a record to directory as a JSON file named after it, as
+    # written by previous versions of Boutiques, and returns its path
+    def export(self, name, directory):
+        path = os.path.join(directory, name)
+        with open(path, "w") as fhandle:
+            jsonBackend.dump(self.get(name), fhandle, compact=True)
+        return path
+
+    # Returns the name of the file of the data cache holding the
+    # unpublished descriptor with the given content hash (see
+    # validator.descriptorHash), or None
+    def descriptorFile(self, digest):
+        row = self.connection.execute(
+            "SELECT name FROM descriptor_files WHERE hash = ?", (digest,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def addDescriptorFile(self, digest, name):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO descriptor_files VALUES (?, ?)",
+                (digest, name),
+            )
+
+    def delete(self, name):
+        with self.connection:
+            self.connection.execute("DELETE FROM records WHERE name = ?", (name,))
+            self.connection.execute(
+                "DELETE FROM descriptor_files WHERE name = ?", (name,)
+            )
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM records")
+            self.connection.execute("DELETE FROM descriptor_files")
+
+
+# Returns the path of the file recording the progress of the current
+# publication of records to Zenodo
+def getPublishCheckpointFile():
+    return getDataCacheDir().rstrip(os.sep) + "-publish.jsonl"
+
+
+# Progress of the publication of a set of records to a Zenodo endpoint,
+# so that an interrupted publication is resumed with the same deposition
+# and without uploading the records again. The checkpoint file holds a
+# JSON header, identifying the endpoint, records and deposition, followed
+# by the names of the uploaded records, one per line.
+class PublishCheckpoint:
+    def __init__(self, endpoint, filenames, path=None):
+        self.path = path or getPublishCheckpointFile()
+        content = "\n".join(sorted(filenames)).encode("utf-8")
+        self.header = {
+            "endpoint": endpoint,
+            "records": hashlib.sha256(content).hexdigest(),
+        }
+        self.deposition_id = None
+        self.bucket = None
+        self.uploaded = set()
+        try:
+            with open(self.path) as fhandle:
+                lines = fhandle.read().splitlines()
+            header = jsonBackend.loads(lines[0])
+        except (OSError, ValueError, IndexError):
+            return
+        if {k: header.get(k) for k in self.header} != self.header:
+            return
+        self.deposition_id = header.get("deposition")
+        self.bucket = header.get("bucket")
+        for line in lines[1:]:
+            try:
+                self.uploaded.add(jsonBackend.loads(line))
+            except ValueError:
+                pass  # Line partly written when interrupted
+
+    # Starts recording the publication of the records to a deposition
+    def start(self, deposition_id, bucket):
+        self.header["deposition"] = deposition_id
+        self.header["bucket"] = bucket
+        with open(self.path, "w") as fhandle:
+            fhandle.write(jsonBackend.dumps(self.header, compact=True) + "\n")
+
+    # Records that the record file at file_path was uploaded
+    def add(self, file_path):
+        filename = os.path.basename(file_path)
+        with open(self.path, "a") as fhandle:
+            fhandle.write(jsonBackend.dumps(filename, compact=True) + "\n")
+        self.uploaded.add(filename)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
 class DataHandlerError(Exception):
     pass
@@ -3,8 +3,7 @@
 import os
 import uuid
 
-import simplejson as json
-
+from boutiques import jsonBackend
 from boutiques.logger import raise_error
 from boutiques.util.utils import loadJson
 
@@ -88,4 +87,4 @@ class Exporter:
             carmin_desc["errorCodesAndMessages"].append(obj)
 
         with open(output_file, "w") as fhandle:
-            fhandle.write(json.dumps(carmin_desc, indent=4, sort_keys=True))
+            jsonBackend.dump(carmin_desc, fhandle, sort_keys=True)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+import hashlib
+import os
+import os.path as op
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Digest algorithms available to hash files. MD5 is the default, for
+# compatibility with existing data-capture records.
+HASH_ALGORITHMS = ("md5", "sha256", "blake2b")
+DEFAULT_HASH_ALGORITHM = "md5"
+
+# Size of the reads used to hash files (4 MiB). Large reads keep the
+# number of system calls and hash updates low on large images.
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Maximum number of digests kept in the hash cache. The least recently
+# used digests are evicted first.
+HASH_CACHE_SIZE = 100000
+
+# Files modified less than this many seconds before being hashed are not
+# cached: they could be modified again without changing their size or
+# modification time, given the resolution of file system timestamps
+HASH_CACHE_MIN_AGE = 2
+
+
+def getHashCacheFile():
+    cache_dir = op.join(op.expanduser("~"), ".cache", "boutiques")
+    return op.join(cache_dir, "hashes.sqlite")
+
+
+# Returns the hexadecimal digest of the content of a file. Digests are
+# cached by (device, inode, size, modification time) unless cached is
+# false, see HashCache.
+def computeDigest(filepath, algorithm=DEFAULT_HASH_ALGORITHM, cached=True):
+    if not cached:
+        return _computeDigest(filepath, algorithm)
+    return hashFiles([filepath], algorithm, workers=1)[filepath]
+
+
+# Returns the digests of a list of files as a dict {path: digest},
+# hashing them in a pool of worker threads (by default, one per CPU up
+# to 8, as hashing is mostly bound by disk throughput). Digests of files
+# that were not modified since they were last hashed are read from the
+# hash cache.
+def hashFiles(filepaths, algorithm=DEFAULT_HASH_ALGORITHM, workers=None, cached=True):
+    filepaths = list(dict.fromkeys(filepaths))
+    if not cached:
+        return _hashFiles(filepaths, algorithm, workers)
+    keys = {path: _fileKey(path) for path in filepaths}
+    with HashCache() as cache:
+        digests = cache.lookup(keys.values(), algorithm)
+        missing = [path for path in filepaths if keys[path] not in digests]
+        hashed = _hashFiles(missing, algorithm, workers)
+        settled = time.time_ns() - HASH_CACHE_MIN_AGE * 10**9
+        cache.store(
+            {
+                keys[path]: digest
+                for path, digest in hashed.items()
+                if keys[path][3] < settled
+            },
+            algorithm,
+        )
+    return {path: hashed.get(path) or digests[keys[path]] for path in filepaths}
+
+
+# Removes all the cached digests
+def clearHashCache():
+    try:
+        os.remove(getHashCacheFile())
+    except OSError:
+        pass
+
+
+# SQLite database of the digests of files, identified by device, inode,
+# size and modification time, so that unchanged files are not hashed
+# again. Errors of the database (e.g. read-only home directory, locked
+# database) only disable the cache.
+class HashCache:
+    def __init__(self, path=None):
+        self.path = path or getHashCacheFile()
+        self.connection = None
+
+    def __enter__(self):
+        try:
+            os.makedirs(op.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=5)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "device INTEGER, inode INTEGER, size INTEGER, "
+                "mtime INTEGER, algorithm TEXT, digest TEXT, used REAL, "
+                "PRIMARY KEY (device, inode, size, mtime, algorithm))"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used)"
+            )
+        except (OSError, sqlite3.Error):
+            self.close()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # Returns the cached digests of the given file keys, as a dict
+    # {key: digest}, and marks them as used
+    def lookup(self, keys, algorithm):
+        digests = {}
+        if self.connection is None:
+            return digests
+        try:
+            with self.connection:
+                for key in keys:
+                    row = self.connection.execute(
+                        "SELECT digest FROM hashes WHERE device = ? AND "
+                        "inode = ? AND size = ? AND mtime = ? AND algorithm = ?",
+                        (*key, algorithm),
+                    ).fetchone()
+                    if row is not None:
+                        digests[key] = row[0]
+                self.connection.executemany(
+                    "UPDATE hashes SET used = ? WHERE device = ? AND "
+                    "inode = ? AND size = ? AND mtime = ? AND algorithm = ?",
+                    [(time.time(), *key, algorithm) for key in digests],
+                )
+        except sqlite3.Error:
+            pass
+        return digests
+
+    # Stores digests given as a dict {key: digest}, evicting the least
+    # recently used digests beyond HASH_CACHE_SIZE
+    def store(self, digests, algorithm):
+        if self.connection is None or not digests:
+            return
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (*key, algorithm, digest, time.time())
+                        for key, digest in digests.items()
+                    ],
+                )
+                self.connection.execute(
+                    "DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM "
+                    "hashes ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                    (HASH_CACHE_SIZE,),
+                )
+        except sqlite3.Error:
+            pass
+
+
+def _fileKey(path):
+    stat = os.stat(path)
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _hashFiles(filepaths, algorithm, workers):
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    if workers <= 1 or len(filepaths) <= 1:
+        return {path: _computeDigest(path, algorithm) for path in filepaths}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = pool.map(lambda path: _computeDigest(path, algorithm), filepaths)
+        return dict(zip(filepaths, digests))
+
+
+def _computeDigest(filepath, algorithm):
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unknown hash algorithm: {algorithm}")
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(filepath, "rb", buffering=0) as fhandle:
+        while True:
+            size = fhandle.readinto(buffer)
+            if not size:
+                break
+            # hashlib releases the GIL on large updates, so files
+            # hashed in different threads are hashed in parallel
+            digest.update(view[:size])
+    return digest.hexdigest()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from boutiques.__version__ import VERSION
+
+# HTTP client shared by the Zenodo helpers (search, pull, publish,
+# deprecate and data publishing). Requests go through a single
+# requests.Session, so that connections are kept alive and reused, with
+# a timeout and retries of the responses with a transient error status.
+# requests is an optional dependency, imported on first use.
+
+# Timeout of requests in seconds, to connect and to read the response,
+# overridden by the BOUTIQUES_HTTP_TIMEOUT environment variable or by
+# configure
+HTTP_TIMEOUT = (10, 60)
+HTTP_TIMEOUT_VARIABLE = "BOUTIQUES_HTTP_TIMEOUT"
+
+# Responses with these statuses are retried up to HTTP_RETRIES times,
+# after a delay of HTTP_BACKOFF seconds doubled at each retry, or the
+# delay given by their Retry-After header. Only requests with these
+# methods are retried by default, as retrying others (e.g. the POST
+# creating a deposition) could apply them twice.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+HTTP_RETRIES = 5
+HTTP_BACKOFF = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+HTTP_MAX_RETRY_DELAY = 60
+
+# Maximum number of connections kept alive per host
+HTTP_POOL_SIZE = 16
+
+# Number of requests whose latency is kept for httpStats
+HTTP_STATS_SIZE = 1000
+
+_settings = {}
+_session = None
+_lock = threading.Lock()
+_latencies = deque(maxlen=HTTP_STATS_SIZE)
+_counts = {"requests": 0, "retries": 0, "errors": 0}
+
+
+# Changes the timeout (in seconds, or a (connect, read) tuple), number of
+# retries or backoff delay of the requests. Settings given as None are
+# reset to their default.
+def configure(timeout=None, retries=None, backoff=None):
+    _settings.update(timeout=timeout, retries=retries, backoff=backoff)
+
+
+def getTimeout():
+    if _settings.get("timeout") is not None:
+        return _settings["timeout"]
+    if os.environ.get(HTTP_TIMEOUT_VARIABLE):
+        return float(os.environ[HTTP_TIMEOUT_VARIABLE])
+    return HTTP_TIMEOUT
+
+
+# Returns the session shared by all requests, created on first use
+def getSession():
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = f"bosh-{VERSION}"
+            _session = session
+        return _session
+
+
+# Closes the connections of the shared session
+def closeSession():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+# Sends a request with the shared session and returns the response, as
+# requests.request. The request is retried if retry is true, by default
+# if its method is idempotent. Open files given as data or files are
+# sent again from their initial position when the request is retried.
+def request(method, url, retry=None, **kwargs):
+    kwargs.setdefault("timeout", getTimeout())
+    if retry is None:
+        retry = method.upper() in IDEMPOTENT_METHODS
+    retries = _settings.get("retries")
+    retries = HTTP_RETRIES if retries is None else retries
+    retries = retries if retry else 0
+    backoff = _settings.get("backoff")
+    backoff = HTTP_BACKOFF if backoff is None else backoff
+    bodies = [(body, body.tell()) for body in _fileBodies(kwargs)]
+    start = time.time()
+    attempt = 0
+    try:
+        while True:
+            r = getSession().request(method, url, **kwargs)
+            if r.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                break
+            time.sleep(_retryDelay(r, backoff * 2**attempt))
+            attempt += 1
+            for body, position in bodies:
+                body.seek(position)
+    except Exception:
+        _record(url, None, start, attempt)
+        raise
+    _record(url, r.status_code, start, attempt)
+    return r
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+# Returns the number of requests, retries and errors (requests that
+# raised an exception) since the last reset, and the mean and maximum
+# latency (in seconds, including retries) of the last HTTP_STATS_SIZE
+# requests by host
+def httpStats():
+    with _lock:
+        stats = dict(_counts)
+        latencies = list(_latencies)
+    stats["hosts"] = {}
+    for host in {host for host, _ in latencies}:
+        times = [latency for h, latency in latencies if h == host]
+        stats["hosts"][host] = {
+            "requests": len(times),
+            "mean-latency": sum(times) / len(times),
+            "max-latency": max(times),
+        }
+    return stats
+
+
+def resetHttpStats():
+    with _lock:
+        _latencies.clear()
+        _counts.update(requests=0, retries=0, errors=0)
+
+
+def _record(url, status, start, retries):
+    with _lock:
+        _counts["requests"] += 1
+        _counts["retries"] += retries
+        if status is None:
+            _counts["errors"] += 1
+        _latencies.append((urlsplit(url).netloc, time.time() - start))
+
+
+# Returns the open files of the body of a request, given as data or in
+# files, either directly or in (filename, file, ...) tuples
+def _fileBodies(kwargs):
+    files = kwargs.get("files") or {}
+    values = files.values() if isinstance(files, dict) else [v for _, v in files]
+    bodies = [kwargs.get("data")]
+    for value in values:
+        bodies.append(value[1] if isinstance(value, (tuple, list)) else value)
+    return [body for body in bodies if hasattr(body, "seek")]
+
+
+# Returns the delay before retrying a response: its Retry-After header
+# if given in seconds (up to HTTP_MAX_RETRY_DELAY), otherwise the
+# backoff delay
+def _retryDelay(r, delay):
+    try:
+        delay = float(r.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        pass
+    return min(max(0.0, delay), HTTP_MAX_RETRY_DELAY)
@@ -6,14 +6,30 @@
 
 import argparse
 import os
+import os.path as op
 import sys
+import tempfile
+import threading
+from collections import OrderedDict
 from functools import reduce
 
 import jsonschema
+import simplejson as json
 from jsonschema import ValidationError
 
+from boutiques import jsonBackend
+from boutiques.__version__ import VERSION
 from boutiques.logger import print_info, raise_error
 
+# Number of compiled invocation schema validators kept in memory
+INVOCATION_VALIDATORS = 64
+
+_invocationValidators = OrderedDict()
+_invocationValidatorsLock = threading.Lock()
+
+# Maximum number of generated invocation schemas kept on disk
+SCHEMA_CACHE_SIZE = 256
+
 
 # An exception class specific to invocations
 class InvocationValidationError(ValidationError):
@@ -182,19 +198,86 @@ def generateInvocationSchema(toolDesc, oname=None, validateWrtMetaSchema=True):
     return schema
 
 
+def getSchemaCacheDir():
+    cache_dir = op.join(op.expanduser("~"), ".cache", "boutiques")
+    return op.join(cache_dir, "invocation-schemas")
+
+
+# Returns the invocation schema generated (and checked wrt the
+# meta-schema) for the descriptor with the given content hash, from the
+# on-disk cache, or None if it is not cached.
+# Schemas generated by other versions of Boutiques are ignored.
+def getCachedInvocationSchema(descriptor_hash):
+    schema_file = op.join(getSchemaCacheDir(), descriptor_hash + ".json")
+    try:
+        with open(schema_file) as fhandle:
+            entry = jsonBackend.load(fhandle)
+        # Used schemas are the last ones evicted
+        os.utime(schema_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("boutiques-version") != VERSION:
+        return None
+    return entry.get("invocation-schema")
+
+
+# Stores a generated invocation schema in the on-disk cache, removing the
+# least recently used schemas beyond SCHEMA_CACHE_SIZE. The cache is only
+# an optimization: failures to write it are ignored.
+def cacheInvocationSchema(descriptor_hash, schema):
+    cache_dir = getSchemaCacheDir()
+    entry = {"boutiques-version": VERSION, "invocation-schema": schema}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written atomically, concurrent processes may read it
+        (fd, tmp) = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as fhandle:
+            jsonBackend.dump(entry, fhandle, compact=True)
+        os.replace(tmp, op.join(cache_dir, descriptor_hash + ".json"))
+        schema_files = [
+            op.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".json")
+        ]
+        if len(schema_files) > SCHEMA_CACHE_SIZE:
+            schema_files.sort(key=op.getmtime)
+            for schema_file in schema_files[: len(schema_files) - SCHEMA_CACHE_SIZE]:
+                os.remove(schema_file)
+    except OSError:
+        pass
+
+
+# Returns a validator for the given invocation schema, checking the
+# schema wrt the meta-schema. Validators of the last INVOCATION_VALIDATORS
+# schemas are kept, so that validating many invocations against the same
+# schema only costs the instance checks. Schemas known to be valid
+# (checked is true) are not checked again.
+def getInvocationValidator(s, checked=False):
+    key = json.dumps(s, sort_keys=True)
+    with _invocationValidatorsLock:
+        if key in _invocationValidators:
+            _invocationValidators.move_to_end(key)
+            return _invocationValidators[key]
+    if not checked:
+        jsonschema.Draft4Validator.check_schema(s)
+    validator = jsonschema.Draft4Validator(s)
+    with _invocationValidatorsLock:
+        _invocationValidators[key] = validator
+        while len(_invocationValidators) > INVOCATION_VALIDATORS:
+            _invocationValidators.popitem(last=False)
+    return validator
+
+
 # Validate data with respect to the invocation schema
 def validateSchema(s, d=None, **kwargs):
     # Check schema wrt meta-schema
     try:
-        jsonschema.Draft4Validator.check_schema(s)
+        validator = getInvocationValidator(s)
     except jsonschema.SchemaError as se:
         errExit("Invocation schema is invalid.\n" + str(se.message), False)
     # Check data instance against schema
     if d:
-        try:
-            jsonschema.validate(d, s)
-        except ValidationError as e:
-            raise_error(InvocationValidationError, e)
+        error = jsonschema.exceptions.best_match(validator.iter_errors(d))
+        if error is not None:
+            raise_error(InvocationValidationError, error)
         if kwargs.get("verbose"):
             print_info("Invocation Schema validation OK")
 
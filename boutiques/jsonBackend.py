@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import os
+
+import simplejson
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Environment variable selecting the JSON backend ("orjson" or
+# "simplejson"). Defaults to orjson when it is installed.
+JSON_BACKEND_VARIABLE = "BOUTIQUES_JSON_BACKEND"
+
+_backend = None
+
+
+# Returns the name of the JSON backend in use
+def getBackend():
+    if _backend is not None:
+        return _backend
+    name = os.environ.get(JSON_BACKEND_VARIABLE)
+    if name == "simplejson" or orjson is None:
+        return "simplejson"
+    return "orjson"
+
+
+# Selects the JSON backend ("orjson" or "simplejson"), or resets it to
+# the default if name is None
+def setBackend(name=None):
+    global _backend
+    if name == "orjson" and orjson is None:
+        raise ImportError("orjson is not installed")
+    if name not in (None, "orjson", "simplejson"):
+        raise ValueError(f"Unknown JSON backend: {name}")
+    _backend = name
+
+
+# Parses a JSON document. Objects are returned as dicts, which keep the
+# order of their keys. Note that orjson parses integers over 64 bits as
+# floats.
+def loads(text):
+    if getBackend() == "orjson":
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # Documents that orjson rejects (e.g. unpaired surrogates in
+            # strings) are parsed, or reported, by simplejson
+            pass
+    return simplejson.loads(text)
+
+
+def load(fhandle):
+    return loads(fhandle.read())
+
+
+# Serializes an object to JSON. Documents meant to be read by people
+# are indented with 4 spaces, as done by simplejson. Compact documents
+# (e.g. machine-written cache records) have no whitespace and are
+# serialized by the fast backend.
+def dumps(obj, compact=False, sort_keys=False):
+    if not compact:
+        return simplejson.dumps(obj, indent=4, sort_keys=sort_keys)
+    if getBackend() == "orjson":
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            pass  # Types that orjson does not support
+    return simplejson.dumps(obj, sort_keys=sort_keys, separators=(",", ":"))
+
+
+def dump(obj, fhandle, compact=False, sort_keys=False):
+    fhandle.write(dumps(obj, compact, sort_keys))
@@ -1,28 +1,48 @@
 #!/usr/bin/env python
 
+import asyncio
+import atexit
+import copy
+import csv
 import datetime
-import hashlib
 import math
 import os
 import os.path as op
 import random
 import random as rnd
 import re
+import signal
 import string
 import subprocess
 import sys
+import threading
 import time
-from glob import glob
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob, has_magic
 from pathlib import Path
 
+import jsonschema
 import simplejson as json
 from termcolor import colored
 
-import boutiques
-from boutiques.dataHandler import getDataCacheDir
+from boutiques import jsonBackend
+from boutiques.compiledDescriptor import CompiledDescriptor
+from boutiques.containerEngines import findContainerEngine
+from boutiques.containerImages import (
+    DOCKER_IMAGE_FRESHNESS,
+    ImageLock,
+    ImageResolution,
+    resolveDockerImage,
+)
+from boutiques.dataHandler import DataStore, getDataCacheDir
 from boutiques.evaluate import evaluateEngine
+from boutiques.fileHashing import DEFAULT_HASH_ALGORITHM, hashFiles
 from boutiques.logger import print_info, print_warning, raise_error
+from boutiques.resultCache import pathDigest, restoreResult, resultKey, storeResult
 from boutiques.util.utils import conditionalExpFormat, extractFileName, loadJson
+from boutiques.validator import descriptorHash, getValidatedDescriptor
 
 
 class ExecutorOutput:
@@ -37,6 +57,8 @@ class ExecutorOutput:
         shell_command,
         container_command,
         container_location,
+        stdout_file=None,
+        stderr_file=None,
     ):
         try:
             self.stdout = stdout.decode("utf=8", "backslashreplace")
@@ -53,6 +75,11 @@ class ExecutorOutput:
         self.shell_command = shell_command
         self.container_command = container_command
         self.container_location = container_location
+        # Files holding stdout and stderr when they were not kept in memory
+        self.stdout_file = stdout_file
+        self.stderr_file = stderr_file
+        # True if the outputs were restored from the result cache
+        self.cached = False
 
     def __str__(self):
         formatted_output_files = ""
@@ -89,6 +116,15 @@ class ExecutorOutput:
                 if self.stderr
                 else ""
             )
+            + (
+                title("Std out and std err files")
+                + "{9}"
+                + os.linesep
+                + "{10}"
+                + os.linesep
+                if self.stdout_file
+                else ""
+            )
             + title("Error message")
             + colored("{6}", "red")
             + os.linesep
@@ -108,10 +144,226 @@ class ExecutorOutput:
             self.error_message,
             formatted_output_files,
             formatted_missing_files,
+            self.stdout_file,
+            self.stderr_file,
         )
         return out
 
 
+class BatchExecutorOutput:
+    """
+    Result of a batch launch: one ExecutorOutput per invocation (in the
+    order of the batch), the errors raised by invocations that could not
+    be executed, and an aggregate summary.
+    """
+
+    def __init__(self, outputs, errors, container_location, duration, status=None):
+        self.outputs = outputs  # OrderedDict: invocation name -> ExecutorOutput
+        self.errors = errors  # OrderedDict: invocation name -> error message
+        self.container_location = container_location
+        self.duration = duration
+        self.status = status or {}  # Final BatchScheduler status
+        self.succeeded = [name for name, out in outputs.items() if out.exit_code == 0]
+        self.failed = [
+            name for name, out in outputs.items() if out.exit_code != 0
+        ] + list(errors.keys())
+        # Exit code of the first failed invocation, if any
+        self.exit_code = 0
+        for name in self.failed:
+            out = outputs.get(name)
+            self.exit_code = out.exit_code if out and out.exit_code else 1
+            break
+
+    def summary(self):
+        summary = {
+            "invocations": len(self.outputs) + len(self.errors),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "duration": round(self.duration, 3),
+        }
+        summary.update(self.status)
+        return summary
+
+    def __str__(self):
+        out = ""
+        for name, output in self.outputs.items():
+            out += colored("Invocation " + name + os.linesep, "blue")
+            out += str(output)
+        for name, error in self.errors.items():
+            out += colored("Invocation " + name + os.linesep, "blue")
+            out += colored(error, "red") + os.linesep
+        summary = self.summary()
+        out += colored("Batch summary" + os.linesep, "green")
+        out += (
+            "{invocations} invocations, {succeeded} succeeded, "
+            "{failed} failed in {duration}s".format(**summary)
+        ) + os.linesep
+        if self.status:
+            out += (
+                "{skipped} skipped, at most {slots} concurrent invocations, "
+                "{throughput} invocations/s".format(**summary)
+            ) + os.linesep
+            if summary.get("image-pulls") or summary.get("image-cache-hits"):
+                out += (
+                    "{image-pulls} image pull(s) in {image-pull-time}s, "
+                    "{image-cache-hits} image cache hit(s)".format(**summary)
+                ) + os.linesep
+        return out
+
+
+class BatchScheduler:
+    """
+    Runs the invocations of a batch concurrently on the local host.
+    Each invocation runs in its own process (the tool or container),
+    supervised by a thread of the scheduler. The number of concurrent
+    invocations is bounded by the requested number of workers and by
+    the descriptor's suggested resources (cpu-cores and ram) with respect
+    to the cores and available memory of the host.
+
+    With failFast, no new invocation is started after one has failed
+    (the remaining ones are reported as skipped); otherwise all the
+    invocations are run. If logDir is set, the stdout and stderr of each
+    invocation are written to files in this directory instead of being
+    kept in memory.
+    """
+
+    def __init__(self, executor, workers=None, failFast=False, logDir=None):
+        self.executor = executor
+        self.failFast = failFast
+        self.logDir = logDir
+        self.slots = self.computeSlots(executor.desc_dict, workers)
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        self.queued = self.running = self.completed = self.skipped = 0
+        self.start = None
+
+    # Number of invocations that can run concurrently on this host
+    @staticmethod
+    def computeSlots(desc_dict, workers=None):
+        resources = desc_dict.get("suggested-resources") or {}
+        cores, ram = hostResources()
+        slots = max(1, cores // max(1, resources.get("cpu-cores") or 1))
+        if resources.get("ram") and ram is not None:
+            slots = min(slots, max(1, int(ram // resources["ram"])))
+        if workers:
+            slots = min(slots, workers)
+        return slots
+
+    def status(self):
+        with self._lock:
+            elapsed = time.time() - self.start if self.start else 0
+            return {
+                "slots": self.slots,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "throughput": round(self.completed / elapsed, 3) if elapsed else 0,
+            }
+
+    def run(self, invocations, mount_strings, conOpts=None):
+        if self.logDir and not op.isdir(self.logDir):
+            os.makedirs(self.logDir)
+        self.start = time.time()
+        self.queued = len(invocations)
+        outputs, errors = OrderedDict(), OrderedDict()
+        with ThreadPoolExecutor(max_workers=self.slots) as pool:
+            futures = [
+                (name, pool.submit(self._runOne, name, in_dict, mount_strings, conOpts))
+                for name, in_dict in invocations
+            ]
+            for name, future in futures:
+                try:
+                    output = future.result()
+                except Exception as e:  # Avoid BaseExceptions like SystemExit
+                    errors[name] = str(e)
+                else:
+                    if output is not None:
+                        outputs[name] = output
+        return outputs, errors
+
+    def _runOne(self, name, in_dict, mount_strings, conOpts):
+        with self._lock:
+            self.queued -= 1
+            if self.failFast and self._failed.is_set():
+                self.skipped += 1
+                return None
+            self.running += 1
+        output = None
+        try:
+            executor = self.executor._forInvocation(in_dict)
+            if self.logDir:
+                logName = op.join(self.logDir, re.sub(r"[^\w.-]", "_", name))
+                executor.logFiles = (logName + ".stdout", logName + ".stderr")
+            output = executor.execute(list(mount_strings or []), conOpts)
+            return output
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+            if output is None or output.exit_code != 0:
+                self._failed.set()
+            if self.executor.debug:
+                print_info(f"Batch status after {name}: {self.status()}")
+
+
+class ContainerSession:
+    """
+    Long-lived container into which successive executions are dispatched
+    (with "docker exec", or "singularity exec instance://"), so that the
+    container start-up is paid once instead of once per execution.
+    startCommand starts the container in the background: for Docker it
+    must print the container id, for Singularity the instance name is
+    appended to it.
+    """
+
+    _count = 0
+
+    def __init__(self, conTypeToUse, conBinName, startCommand):
+        self.conTypeToUse = conTypeToUse
+        self.conBinName = conBinName
+        self.startCommand = startCommand
+        self.name = None
+
+    def start(self):
+        command = self.startCommand
+        if self.conTypeToUse == "singularity":
+            ContainerSession._count += 1
+            self.name = f"boutiques-{os.getpid()}-{ContainerSession._count}"
+            command += " " + self.name
+        process = subprocess.run(
+            command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if process.returncode:
+            raise_error(
+                ExecutorError,
+                "Could not start container session: "
+                + os.linesep
+                + " * Command: "
+                + command
+                + os.linesep
+                + " * Error: "
+                + process.stderr.decode("utf-8", "backslashreplace"),
+            )
+        if self.conTypeToUse == "docker":
+            self.name = process.stdout.decode().strip().splitlines()[-1]
+        # Containers are not left behind if the session is not closed
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.name is None:
+            return
+        if self.conTypeToUse == "docker":
+            command = f"{self.conBinName} rm -f {self.name}"
+        else:
+            command = f"{self.conBinName} instance stop {self.name}"
+        subprocess.run(
+            command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        atexit.unregister(self.stop)
+        self.name = None
+
+
 class FileDescription:
     def __init__(self, boutiques_name, file_name, optional):
         self.boutiques_name = boutiques_name
@@ -153,8 +405,6 @@ class LocalExecutor:
 
     # Constructor
     def __init__(self, desc, invocation, options={}):
-        self._rkit = self._replaceKeysInTemplate  # Abbrev. for readability
-
         # Initial parameters
         self.desc_path = desc  # Save descriptor path
         self.errs = []  # Empty errors holder
@@ -163,6 +413,30 @@ class LocalExecutor:
         # Extra Options
         # Include: forcePathType and debug
         self.debug = False
+        self.logFiles = None
+        # Maximum time (in seconds) to wait for required output files
+        self.outputWait = 0.5
+        # Run "<engine> --version" when looking for container engines
+        self.probeEngines = False
+        # Time (in seconds) during which a pulled Docker image is reused
+        self.imageFreshness = DOCKER_IMAGE_FRESHNESS
+        # Directory where Singularity images are pulled, if no image
+        # path is given (defaults to the current directory)
+        self.imageCacheDir = None
+        # Run executions in long-lived containers, see ContainerSession
+        self.session = False
+        # Reuse the results of identical executions, see resultCache
+        self.cacheResults = False
+        # Digest of the files recorded by data collection, and number of
+        # threads hashing them (see fileHashing)
+        self.hashAlgorithm = DEFAULT_HASH_ALGORITHM
+        self.hashWorkers = None
+        # Container image pulls and cache hits of this executor
+        self.imageStats = {
+            "image-pulls": 0,
+            "image-pull-time": 0.0,
+            "image-cache-hits": 0,
+        }
         for option in list(options.keys()):
             setattr(self, option, options.get(option))
 
@@ -185,9 +459,18 @@ class LocalExecutor:
         self.outputs = self.desc_dict.get("output-files") or []
         # The set of parameter groups, according to the json descriptor
         self.groups = self.desc_dict.get("groups") or []
+        # Index of the above, used for all id-based lookups
+        self.compiledDesc = CompiledDescriptor(self.desc_dict)
 
         # Container-image Options
         self.con = self.desc_dict.get("container-image")
+        # Container engine and image resolved by the first execution
+        self._container = None
+        self._imageDigest = None
+        # Container sessions by (image, mounts and options), shared with
+        # the executors of batch invocations
+        self._sessions = {}
+        self._sessionsLock = threading.Lock()
         self.launchDir = None
         if self.con is not None:
             self.con.get("working-directory")
@@ -198,36 +481,30 @@ class LocalExecutor:
 
     # Retrieves the parameter corresponding to the given id
     def byId(self, n):
-        return [v for v in self.inputs + self.outputs if v["id"] == n][0]
+        return self.compiledDesc.param(n)
 
     # Retrieves the group corresponding to the given id
     def byGid(self, g):
-        return [v for v in self.groups if v["id"] == g][0]
+        return self.compiledDesc.group(g)
 
     # Retrieves the value of a field of an input
     # from the descriptor. Returns None if not present.
     def safeGet(self, i, k):
-        if k not in list(self.byId(i).keys()):
-            return None
-        return self.byId(i)[k]
+        return self.compiledDesc.param(i).get(k)
 
     # Retrieves the value of a field of a group from
     # the descriptor. Returns None if not present.
     def safeGrpGet(self, g, k):
-        if k not in list(self.byGid(g).keys()):
-            return None
-        return self.byGid(g)[k]
+        return self.compiledDesc.group(g).get(k)
 
     # Retrieves the group a given parameter id belongs to;
     # otherwise, returns None
     def assocGrp(self, i):
-        return ([g for g in self.groups if i in g["members"]] or [None])[0]
+        return self.compiledDesc.groupOf(i)
 
     # Returns the required inputs of a given input id, or the empty string
     def reqsOf(self, t):
-        if t in [g["id"] for g in self.groups]:
-            return self.safeGrpGet(t, "members") or []
-        return self.safeGet(t, "requires-inputs") or []
+        return self.compiledDesc.requirementsOf(t)
 
     # Attempt local execution of the command line
     # generated from the input values
@@ -239,7 +516,92 @@ class LocalExecutor:
         of local execution.
         After execution, it checks for output file existence.
         """
-        command, exit_code, con = self.cmd_line[0], None, self.con or {}
+        mounts = list(mount_strings or [])
+        execution = self._prepareExecution(mount_strings, conOpts)
+        key = self._resultKey(mounts, conOpts) if self.cacheResults else None
+        if key is not None:
+            cached = self._restoreResult(key, execution)
+            if cached is not None:
+                return cached
+        (stdout, stderr), exit_code = self._localExecute(
+            execution["container_command"] or execution["command"],
+            self.logFiles,
+            execution["env"],
+        )
+        # Give the OS some time to make the outputs visible
+        if exit_code == 0:
+            for delay in self._outputFilesPolls():
+                time.sleep(delay)
+        output = self._finishExecution(execution, stdout, stderr, exit_code)
+        if key is not None:
+            self._storeResult(key, output)
+        return output
+
+    # Asynchronous variant of execute
+    async def executeAsync(
+        self, mount_strings, conOpts=None, timeout=None, onOutput=None
+    ):
+        """
+        The executeAsync coroutine runs the generated command line like
+        execute, in a subprocess supervised by the running event loop, so
+        that a single loop can supervise many concurrent executions, e.g.:
+            await asyncio.gather(*[e.executeAsync([]) for e in executors])
+
+        timeout: number of seconds after which the execution is killed
+        and an ExecutorError is raised. The execution is also killed if
+        the coroutine is cancelled.
+        onOutput: function called with ("stdout" or "stderr", line) for
+        each line output by the execution, as soon as it is read.
+        Container preparation and data collection, which may block, run
+        in a worker thread.
+        """
+        execution = await asyncio.to_thread(
+            self._prepareExecution, mount_strings, conOpts
+        )
+        try:
+            (stdout, stderr), exit_code = await self._localExecuteAsync(
+                execution["container_command"] or execution["command"],
+                timeout,
+                onOutput,
+                self.logFiles,
+                execution["env"],
+            )
+        except BaseException:
+            self._removeExecutionScript(execution)
+            raise
+        # Give the OS some time to make the outputs visible
+        if exit_code == 0:
+            for delay in self._outputFilesPolls():
+                await asyncio.sleep(delay)
+        return await asyncio.to_thread(
+            self._finishExecution, execution, stdout, stderr, exit_code
+        )
+
+    # Private generator yielding the delays to wait for until the required
+    # output files exist (e.g. on a network file system), with a bounded
+    # exponential backoff. Stops when all the required files are found or
+    # after self.outputWait seconds.
+    def _outputFilesPolls(self):
+        if "output-files" not in self.desc_dict:
+            return
+        required = [
+            f
+            for f in evaluateEngine(self, "output-files/optional=False").values()
+            if f is not None
+        ]
+        deadline = time.time() + self.outputWait
+        delay = 0.005
+        while [f for f in required if not glob(f)]:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            yield min(delay, remaining)
+            delay = min(2 * delay, 0.1)
+
+    # Private method building the command (and container command) to
+    # execute. Returns a dictionary describing the execution.
+    def _prepareExecution(self, mount_strings, conOpts=None):
+        command, con = self.cmd_line[0], self.con or {}
         # Check for Container image
         conType, conImage = (
             con.get("type"),
@@ -251,8 +613,9 @@ class LocalExecutor:
         conOptsForced = conOpts is not None and conForcedCommand is not None
         conOpts = conOpts or con.get("container-opts")
         conIsPresent = conImage is not None
-        # Export environment variables,
-        #  if they are specified in the descriptor
+        # Environment variables specified in the descriptor, passed to
+        #  the process of this execution only (executions of a batch
+        #  share the environment of the process)
         envVars = {}
         if "environment-variables" in list(self.desc_dict.keys()):
             variables = [
@@ -262,7 +625,6 @@ class LocalExecutor:
             for envVarName, envVarValue in variables:
                 if envVarValue in inputsByValKey:
                     envVarValue = self.in_dict[inputsByValKey[envVarValue]["id"]]
-                os.environ[envVarName] = envVarValue
                 envVars[envVarName] = envVarValue
         # Container script constant name
         # Note that docker/singularity cannot do a local volume
@@ -280,12 +642,20 @@ class LocalExecutor:
         container_location = ""
         container_command = ""
         if conIsPresent:
-            # Figure out which container type to use
-            (conTypeToUse, conBinName) = self._chooseContainerTypeToUse(
-                conType, conForcedCommand
-            )
-            # Pull the container
-            (conPath, container_location) = self.prepare(conTypeToUse, conBinName)
+            # Figure out which container type to use and pull the
+            # container, unless already done by a previous execution
+            if self._container is None:
+                (conTypeToUse, conBinName) = self._chooseContainerTypeToUse(
+                    conType, conForcedCommand
+                )
+                (conPath, container_location) = self.prepare(conTypeToUse, conBinName)
+                self._container = (
+                    conTypeToUse,
+                    conBinName,
+                    conPath,
+                    container_location,
+                )
+            (conTypeToUse, conBinName, conPath, container_location) = self._container
             # Generate command script
             # Get the supported shell by the docker or singularity
             cmdString = f"#!{self.shell}"
@@ -295,7 +665,7 @@ class LocalExecutor:
             with open(dsname, "w") as scrFile:
                 scrFile.write(cmdString)
             # Ensure the script is executable
-            self._localExecute("chmod 755 " + dsname)
+            os.chmod(dsname, 0o755)
             # Prepare extra environment variables
             envString = ""
             if envVars:
@@ -421,53 +791,136 @@ class LocalExecutor:
                 if self.noPull:
                     pullmode = " --pull=never"
 
-                container_command = (
-                    "docker run"
-                    + userchange
-                    + pullmode
-                    + " --entrypoint="
-                    + self.shell
-                    + " --rm"
-                    + envString
-                    + " -v "
-                    + docker_mounts
-                    + " -w "
-                    + launchDir
-                    + " "
-                    + conOptsString
-                    + str(conImage)
-                    + " "
-                    + dsname
-                )
+                if self.session:
+                    session = self._getSession(
+                        conTypeToUse,
+                        conBinName,
+                        "docker run -d -i"
+                        + userchange
+                        + pullmode
+                        + " --entrypoint="
+                        + self.shell
+                        + " --rm -v "
+                        + docker_mounts
+                        + " -w "
+                        + launchDir
+                        + " "
+                        + conOptsString
+                        + str(conImage),
+                    )
+                    container_command = (
+                        "docker exec"
+                        + envString
+                        + " -w "
+                        + launchDir
+                        + " "
+                        + session.name
+                        + " "
+                        + self.shell
+                        + " "
+                        + dsname
+                    )
+                else:
+                    container_command = (
+                        "docker run"
+                        + userchange
+                        + pullmode
+                        + " --entrypoint="
+                        + self.shell
+                        + " --rm"
+                        + envString
+                        + " -v "
+                        + docker_mounts
+                        + " -w "
+                        + launchDir
+                        + " "
+                        + conOptsString
+                        + str(conImage)
+                        + " "
+                        + dsname
+                    )
             elif conTypeToUse == "singularity":
                 envString = ""
                 if envVars:
                     for key, val in list(envVars.items()):
                         envString += f"SINGULARITYENV_{key}='{val}' "
                 singularity_mounts = "-B " + " -B ".join(mount_strings)
-                container_command = (
-                    envString + conBinName + " exec "
-                    "--cleanenv "
-                    + singularity_mounts
-                    + " -W "
-                    + launchDir
-                    + " "
-                    + conOptsString
-                    + str(conPath)
-                    + " "
-                    + dsname
-                )
-            (stdout, stderr), exit_code = self._localExecute(container_command)
-        # Otherwise, just run command locally
-        else:
-            (stdout, stderr), exit_code = self._localExecute(command)
-        time.sleep(0.5)  # Give the OS a (half) second to finish writing
+                if self.session:
+                    session = self._getSession(
+                        conTypeToUse,
+                        conBinName,
+                        conBinName
+                        + " instance start --cleanenv "
+                        + singularity_mounts
+                        + " "
+                        + conOptsString
+                        + str(conPath),
+                    )
+                    container_command = (
+                        envString + conBinName + " exec "
+                        "--cleanenv -W "
+                        + launchDir
+                        + " instance://"
+                        + session.name
+                        + " "
+                        + dsname
+                    )
+                else:
+                    container_command = (
+                        envString + conBinName + " exec "
+                        "--cleanenv "
+                        + singularity_mounts
+                        + " -W "
+                        + launchDir
+                        + " "
+                        + conOptsString
+                        + str(conPath)
+                        + " "
+                        + dsname
+                    )
+        # Otherwise, the command is just run locally
+        return {
+            "command": command,
+            "container_command": container_command,
+            "container_location": container_location,
+            "script": dsname if conIsPresent else None,
+            "env": dict(os.environ, **envVars) if envVars else None,
+        }
 
-        # Destroy temporary docker script, if desired.
-        # By default, keep the script so the dev can look at it.
-        if conIsPresent and not self.debug:
-            if os.path.isfile(dsname):
-                os.remove(dsname)
+    # Returns the container session started with startCommand, starting
+    # it if needed. Sessions are identified by their start command, i.e.
+    # by image, mounts and container options.
+    def _getSession(self, conTypeToUse, conBinName, startCommand):
+        with self._sessionsLock:
+            session = self._sessions.get(startCommand)
+            if session is None:
+                if self.debug:
+                    print_info(f"Starting container session: {startCommand}")
+                session = ContainerSession(conTypeToUse, conBinName, startCommand)
+                session.start()
+                self._sessions[startCommand] = session
+            return session
+
+    # Stops the container sessions started by this executor
+    def closeSessions(self):
+        with self._sessionsLock:
+            for session in self._sessions.values():
+                session.stop()
+            self._sessions.clear()
+
+    # Destroy temporary docker script, if desired.
+    # By default, keep the script so the dev can look at it.
+    def _removeExecutionScript(self, execution):
+        script = execution["script"]
+        if script is not None and not self.debug:
+            if os.path.isfile(script):
+                os.remove(script)
+
+    # Private method checking the outputs of an execution prepared by
+    # _prepareExecution, and collecting execution data.
+    # Returns an ExecutorOutput.
+    def _finishExecution(self, execution, stdout, stderr, exit_code):
+        self._removeExecutionScript(execution)
 
         # Check for output files
         missing_files = []
@@ -480,6 +933,8 @@ class LocalExecutor:
             optional_files = evaluateEngine(self, "output-files/optional=True")
             for f in all_files.keys():
                 file_name = all_files[f]
+                if file_name is None:
+                    continue  # No conditional path template applies
                 fd = FileDescription(f, file_name, False)
                 f_glob = glob(file_name)
                 if f_glob:
@@ -506,9 +961,10 @@ class LocalExecutor:
             desc_err,
             output_files,
             missing_files,
-            command,
-            container_command,
-            container_location,
+            execution["command"],
+            execution["container_command"],
+            execution["container_location"],
+            *(self.logFiles or ()),
         )
 
         if not self.skipDataCollect:
@@ -521,6 +977,105 @@ class LocalExecutor:
 
         return executor_output
 
+    # Private method returning the key identifying the current execution
+    # in the result cache, from the content of the descriptor, invocation,
+    # input files and container image. Returns None if the Docker image
+    # digest is unknown. Singularity images are identified by path, size
+    # and modification time rather than hashed.
+    def _resultKey(self, mount_strings, conOpts):
+        container = None
+        if self._container is not None:
+            (conTypeToUse, conBinName, conPath, container_location) = self._container
+            if conTypeToUse == "docker":
+                if self._imageDigest is None:
+                    return None
+                container = [conTypeToUse, self.con.get("image"), self._imageDigest]
+            else:
+                stat = os.stat(conPath)
+                container = [
+                    conTypeToUse,
+                    op.realpath(conPath),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                ]
+        input_files = {}
+        for param in self.inputs:
+            value = self.in_dict.get(param["id"])
+            if param.get("type") == "File" and value is not None:
+                if isinstance(value, list):
+                    input_files[param["id"]] = [pathDigest(v) for v in value]
+                else:
+                    input_files[param["id"]] = pathDigest(value)
+        return resultKey(
+            descriptor=descriptorHash(self.desc_dict),
+            invocation=self.in_dict,
+            inputFiles=input_files,
+            container=container,
+            mounts=mount_strings,
+            containerOptions=conOpts,
+        )
+
+    # Private method restoring the outputs of an identical execution from
+    # the result cache. Returns an ExecutorOutput, or None if there is no
+    # such execution. Executions restored from the cache are not recorded
+    # by data collection.
+    def _restoreResult(self, key, execution):
+        record = restoreResult(key)
+        if record is None:
+            return None
+        self._removeExecutionScript(execution)
+        print_info("Outputs restored from a previous execution, see --cache-results")
+        (stdout, stderr) = (record["stdout"], record["stderr"])
+        if self.logFiles:
+            for content, logFile in zip((stdout, stderr), self.logFiles):
+                with open(logFile, "w") as fhandle:
+                    fhandle.write(content or "")
+            (stdout, stderr) = ("", "")
+        output = ExecutorOutput(
+            stdout,
+            stderr,
+            record["exit-code"],
+            record["error-message"],
+            [FileDescription(*f) for f in record["output-files"]],
+            [],
+            record["shell-command"],
+            record["container-command"],
+            record["container-location"],
+            *(self.logFiles or ()),
+        )
+        output.cached = True
+        return output
+
+    # Private method storing the outputs of a successful execution in the
+    # result cache
+    def _storeResult(self, key, output):
+        if output.exit_code != 0 or output.missing_files:
+            return
+        (stdout, stderr) = (output.stdout, output.stderr)
+        if self.logFiles:
+            logs = []
+            for logFile in self.logFiles:
+                with open(logFile, errors="backslashreplace") as fhandle:
+                    logs.append(fhandle.read())
+            (stdout, stderr) = logs
+        record = {
+            "stdout": stdout,
+            "stderr": stderr,
+            "exit-code": output.exit_code,
+            "error-message": output.error_message,
+            "shell-command": output.shell_command,
+            "container-command": output.container_command,
+            "container-location": output.container_location,
+        }
+        storeResult(
+            key,
+            record,
+            {
+                f.boutiques_name: (f.file_name, f.optional == "Optional")
+                for f in output.output_files
+            },
+        )
+
     # Looks for the container image locally and pulls it if not found
     # Returns a tuple containing the container filename (for Singularity)
     # and the container location (local or pulled)
@@ -542,11 +1097,18 @@ class LocalExecutor:
             (conTypeToUse, conBinName) = self._chooseContainerTypeToUse(conType)
 
         if conTypeToUse == "docker":
-            # Pull the docker image, if we can
-            if self.noPull or self._localExecute("docker pull " + str(conImage))[1]:
-                container_location = "Local copy"
-            else:
+            # Pull the docker image, if we can and it is not already local
+            image = resolveDockerImage(
+                str(conImage),
+                lambda: not self._localExecute("docker pull " + str(conImage))[1],
+                self.imageFreshness,
+                self.noPull,
+            )
+            self._recordImageResolution(image)
+            if image.pulled:
                 container_location = "Pulled from Docker"
+            else:
+                container_location = "Local copy"
             return (conName, container_location)
 
         elif conTypeToUse == "singularity":
@@ -576,74 +1138,85 @@ class LocalExecutor:
                 imageDir = op.normpath(op.dirname(self.imagePath))
             else:
                 conName = conImage.replace("/", "-").replace(":", "-") + ".simg"
-                imageDir = op.normpath("")
+                # Images are shared by all descriptors in the cache directory
+                imageDir = op.normpath(self.imageCacheDir or "")
+                os.makedirs(imageDir, exist_ok=True)
+            image = conIndex + conImage
 
             # Check if container already exists
             if self._singConExists(conName, imageDir):
                 conPath = op.abspath(op.join(imageDir, conName))
+                self._recordImageResolution(
+                    ImageResolution(image, None, False, True, 0.0)
+                )
                 return conPath, f"Local ({conName})"
 
             # Container image does not exist and we can't pull it: just fail
             if self.noPull:
                 raise_error(ExecutorError, "Unable to retrieve Singularity " "image.")
-            # Try to pull the container image
-            if self.imagePath:
-                lockDir = self.imagePath + "-lock"
-            else:
-                lockDir = conName + "-lock"
-
-            maxcount = 36
-            count = 0
-
-            while count < maxcount:
-                count += 1
-                try:
-                    os.mkdir(lockDir)
-                except OSError:
-                    print_info(
-                        "Another process seems to be pulling the "
-                        "image ({} exists), sleeping 5 seconds".format(lockDir)
-                    )
-                    time.sleep(5)
-                else:
-                    try:
-                        # Check if container was created while waiting
-                        if self._singConExists(conName, imageDir):
-                            conPath = op.abspath(op.join(imageDir, conName))
-                            container_location = f"Local ({conName})"
-                        # Container still does not exist, so pull it
-                        else:
-                            conPath, container_location = self._pullSingImage(
-                                conName,
-                                conIndex,
-                                conImage,
-                                imageDir,
-                                lockDir,
-                                conBinName,
+            # Try to pull the container image, unless another process
+            # pulls it in the meantime
+            lock = ImageLock(op.join(imageDir, conName))
+            if lock.acquire(lambda: self._singConExists(conName, imageDir)):
+                with lock:
+                    # Check if container was created while waiting
+                    if self._singConExists(conName, imageDir):
+                        conPath = op.abspath(op.join(imageDir, conName))
+                        container_location = f"Local ({conName})"
+                    # Container still does not exist, so pull it
+                    else:
+                        start = time.time()
+                        conPath, container_location = self._pullSingImage(
+                            conName,
+                            conIndex,
+                            conImage,
+                            imageDir,
+                            conBinName,
+                        )
+                        self._recordImageResolution(
+                            ImageResolution(
+                                image, None, True, False, time.time() - start
                             )
-                        return conPath, container_location
-                    finally:
-                        self._cleanUpAfterSingPull(lockDir)
-            # If loop times out, check again for existence, otherwise
-            # raise an error
+                        )
+                    return conPath, container_location
+            # The image was pulled by another process, or we timed out
+            # while waiting for it
             if self._singConExists(conName, imageDir):
                 conPath = op.abspath(op.join(imageDir, conName))
                 return conPath, f"Local ({conName})"
             raise_error(ExecutorError, "Unable to retrieve Singularity " "image.")
 
+    # Private method adding the pull time and cache hits of a container
+    # image resolution to the execution statistics and summary
+    def _recordImageResolution(self, image):
+        self._imageDigest = image.digest
+        self.imageStats["image-pulls"] += int(image.pulled)
+        self.imageStats["image-pull-time"] += round(image.pull_time, 3)
+        self.imageStats["image-cache-hits"] += int(image.cache_hit)
+        if not self.skipDataCollect:
+            self.summary["container-image"] = {
+                "image": image.image,
+                "digest": image.digest,
+                "pulled": image.pulled,
+                "cache-hit": image.cache_hit,
+                "pull-time": round(image.pull_time, 3),
+            }
+
     # Private method that checks if a Singularity image exists locally
     def _singConExists(self, conName, imageDir):
         return conName in os.listdir(imageDir)
 
     # Private method that pulls a Singularity image
-    def _pullSingImage(
-        self, conName, conIndex, conImage, imageDir, lockDir, conBinName
-    ):
+    def _pullSingImage(self, conName, conIndex, conImage, imageDir, conBinName):
         # Give the file a temporary name while it's building
         conNameTmp = conName + ".tmp"
+        # Remove what a previous, interrupted pull left behind
+        if op.exists(op.join(imageDir, conNameTmp)):
+            os.remove(op.join(imageDir, conNameTmp))
         # Set the pull directory to the specified imagePath
-        if self.imagePath:
-            os.environ["SINGULARITY_PULLFOLDER"] = imageDir
+        env = None
+        if self.imagePath or self.imageCacheDir:
+            env = dict(os.environ, SINGULARITY_PULLFOLDER=imageDir)
         pull_loc = f'"{conNameTmp}" {conIndex}{conImage}'
         container_location = (
             "Pulled from {1}{2} ({0} not found "
@@ -653,7 +1226,7 @@ class LocalExecutor:
         ).format(conName, conIndex, conImage)
         # Pull the singularity image
         sing_command = conBinName + " pull --name " + pull_loc
-        (stdout, stderr), return_code = self._localExecute(sing_command)
+        (stdout, stderr), return_code = self._localExecute(sing_command, env=env)
         if return_code:
             message = (
                 "Could not pull Singularity"
@@ -670,15 +1243,13 @@ class LocalExecutor:
         conPath = op.abspath(op.join(imageDir, conName))
         return conPath, container_location
 
-    # Removes the lock directory and environment variable
-    # created while pulling an image
-    def _cleanUpAfterSingPull(self, lockDir):
-        os.rmdir(lockDir)
-        if "SINGULARITY_PULLFOLDER" in os.environ:
-            del os.environ["SINGULARITY_PULLFOLDER"]
-
+    # Engine lookups are memoized for the whole process, so executions
+    # and batches after the first one do not probe the engines again
     def _isCommandInstalled(self, command):
-        return not subprocess.Popen(f"{command} --version", shell=True).wait()
+        engine = findContainerEngine(command, self.probeEngines)
+        if engine is not None and engine.version and self.debug:
+            print_info(f"Using {engine.path}: {engine.version}")
+        return engine is not None
 
     # Gets forced container command name, if any --force-X flag is set.
     # Flags are mutually exclusive so test order doesn't matter.
@@ -725,11 +1296,24 @@ class LocalExecutor:
 
     # Private method that attempts to locally execute the given
     # command. Returns the exit code.
-    def _localExecute(self, command):
+    # If logFiles is a (stdout path, stderr path) tuple, the outputs are
+    # written to these files instead of being returned. env is the
+    # environment of the command, by default that of this process.
+    def _localExecute(self, command, logFiles=None, env=None):
         # Note: invokes the command through the shell
         # (potential injection dangers)
         if self.debug:
             print_info(f"Running: {command}")
+        if logFiles is not None:
+            with open(logFiles[0], "wb") as out, open(logFiles[1], "wb") as err:
+                try:
+                    process = subprocess.Popen(
+                        command, shell=True, stdout=out, stderr=err, env=env
+                    )
+                except OSError as e:
+                    sys.stderr.write("OS Error during attempted execution!")
+                    raise e
+                return ("", ""), process.wait()
         try:
             if self.stream:
                 process = subprocess.Popen(
@@ -737,6 +1321,7 @@ class LocalExecutor:
                     shell=True,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
+                    env=env,
                 )
             else:
                 process = subprocess.Popen(
@@ -744,6 +1329,7 @@ class LocalExecutor:
                     shell=True,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE,
+                    env=env,
                 )
 
         except OSError as e:
@@ -766,6 +1352,77 @@ class LocalExecutor:
         # printed in real time
         return (None, None), process.returncode
 
+    # Asynchronous variant of _localExecute, see executeAsync for
+    # timeout and onOutput. Returns ((stdout, stderr), exit code).
+    async def _localExecuteAsync(
+        self, command, timeout=None, onOutput=None, logFiles=None, env=None
+    ):
+        if self.debug:
+            print_info(f"Running: {command}")
+        if logFiles is not None:
+            with open(logFiles[0], "wb") as out, open(logFiles[1], "wb") as err:
+                process = await asyncio.create_subprocess_shell(
+                    command,
+                    stdout=out,
+                    stderr=err,
+                    start_new_session=True,
+                    env=env,
+                )
+                await self._waitForProcess(process, process.wait(), timeout)
+            return ("", ""), process.returncode
+
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=(
+                asyncio.subprocess.STDOUT if self.stream else asyncio.subprocess.PIPE
+            ),
+            start_new_session=True,
+            env=env,
+        )
+        outputs = {"stdout": [], "stderr": []}
+
+        async def readLines(pipe, name):
+            while True:
+                line = await pipe.readline()
+                if not line:
+                    break
+                outputs[name].append(line)
+                if self.stream:
+                    sys.stdout.write(line.decode("utf-8", "backslashreplace"))
+                if onOutput is not None:
+                    onOutput(name, line.decode("utf-8", "backslashreplace"))
+
+        readers = [readLines(process.stdout, "stdout")]
+        if process.stderr is not None:
+            readers.append(readLines(process.stderr, "stderr"))
+        await self._waitForProcess(
+            process, asyncio.gather(*readers, process.wait()), timeout
+        )
+        if self.stream:
+            # Output was already printed in real time
+            return (None, None), process.returncode
+        return (
+            b"".join(outputs["stdout"]),
+            b"".join(outputs["stderr"]),
+        ), process.returncode
+
+    # Private coroutine awaiting the completion of a process, and killing
+    # it (and its children) on timeout or cancellation
+    async def _waitForProcess(self, process, completion, timeout):
+        try:
+            await asyncio.wait_for(completion, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError):
+                if process.returncode is None:
+                    process.kill()
+            await process.wait()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise_error(ExecutorError, f"Execution timed out after {timeout}s")
+
     # Private method to generate a random input parameter set that follows
     # the constraints from the json descriptor
     # This method fills in the in_dict field of the object
@@ -886,20 +1543,7 @@ class LocalExecutor:
         # Returns a list of the ids of parameters that
         # disable the input parameter
         def disablersOf(inParam):
-            return [
-                disabler[0]
-                for disabler in [
-                    disabler
-                    for disabler in [
-                        (
-                            prm["id"],
-                            self.safeGet(prm["id"], "disables-inputs") or [],
-                        )
-                        for prm in self.inputs
-                    ]
-                    if inParam["id"] in disabler[1]
-                ]
-            ]
+            return self.compiledDesc.disablersOf(inParam["id"])
 
         # Returns the list of mutually requiring parameters of the target
         def mutReqs(targetParam):
@@ -917,7 +1561,7 @@ class LocalExecutor:
 
         def getAllBranchedReqs(targ, reqs):
             for r in [r for r in self.reqsOf(targ["id"]) if r not in reqs]:
-                if r in [g["id"] for g in self.groups]:
+                if self.compiledDesc.isGroup(r):
                     for gReq in self.reqsOf(r):
                         if gReq not in reqs:
                             reqs.append(gReq)
@@ -943,7 +1587,7 @@ class LocalExecutor:
             # If it is in a mutex group with one target already chosen,
             # it cannot be filled
             for r in self.reqsOf(targ["id"]):
-                if r in [g["id"] for g in self.groups]:
+                if self.compiledDesc.isGroup(r):
                     grpCanBeFilled = False
                     for gReq in self.reqsOf(r):
                         if isOrCanBeFilled(self.byId(gReq)):
@@ -969,12 +1613,12 @@ class LocalExecutor:
         # (Added after requires-inputs: group was implemented)
         def groupMemberCanBeAdded(targ):
             # if target is a group member
-            if targ["id"] in [m for g in self.groups for m in g["members"]]:
+            if self.compiledDesc.isGroupMember(targ["id"]):
                 for req in self.reqsOf(targ["id"]):
                     # If targ requires group input and one of required members
                     # has been chosen
                     if (
-                        req in [g["id"] for g in self.groups]
+                        self.compiledDesc.isGroup(req)
                         and len(set(self.reqsOf(req)).intersection(set(self.in_dict)))
                         == 1
                     ):
@@ -1008,14 +1652,14 @@ class LocalExecutor:
                 if not isOrCanBeFilled(current):
                     return False
                 for mutreq in mutReqs(current):
-                    if not mutreq["id"] in [c["id"] for c in checked] and mutreq[
-                        "id"
-                    ] not in [g["id"] for g in self.groups]:
+                    if not mutreq["id"] in [
+                        c["id"] for c in checked
+                    ] and not self.compiledDesc.isGroup(mutreq["id"]):
                         toCheck.append(mutreq)
                 for greq in [
                     g
                     for g in self.reqsOf(current["id"])
-                    if g in [grp["id"] for grp in self.groups]
+                    if self.compiledDesc.isGroup(g)
                     and self.safeGrpGet(g, "mutually-exclusive")
                 ]:
                     # Check if one of the members is already added
@@ -1028,7 +1672,7 @@ class LocalExecutor:
                         continue
                     # Add random member if current requires mutex group
                     rndMember = rnd.choice(self.safeGrpGet(greq, "members"))
-                    toCheck.append({i["id"]: i for i in self.inputs}[rndMember])
+                    toCheck.append(self.byId(rndMember))
             return checked
 
         # Start actual dictionary filling part
@@ -1127,10 +1771,7 @@ class LocalExecutor:
             print_info("Input: " + str(self.in_dict))
         # Check results (as much as possible)
         try:
-            args = [self.desc_path, "-i", json.dumps(self.in_dict)]
-            if self.sandbox:
-                args.append("--sandbox")
-            boutiques.invocation(*args)
+            self._validateInvocation(dict(self.in_dict))
         # If an error occurs, print out the problems already
         # encountered before blowing up
         except Exception as e:  # Avoid BaseExceptions like SystemExit
@@ -1144,6 +1785,15 @@ class LocalExecutor:
             # Add new command line
             self.cmd_line.append(self._generateCmdLineFromInDict())
 
+    # Validates the descriptor (once per process, see
+    # getValidatedDescriptor) and the given input dictionary, to which
+    # default values are added
+    def _validateInvocation(self, in_dict):
+        validated = getValidatedDescriptor(
+            self.desc_dict, descriptor_path=self.desc_path, sandbox=self.sandbox
+        )
+        validated.validateInvocation(addDefaultValues(self.desc_dict, in_dict))
+
     # Read in parameter input file or string
     def readInput(self, infile):
         """
@@ -1174,10 +1824,7 @@ class LocalExecutor:
         addDefaultValues(self.desc_dict, self.in_dict)
         # Check results (as much as possible)
         try:
-            args = [self.desc_path, "-i", json.dumps(self.in_dict)]
-            if self.sandbox:
-                args.append("--sandbox")
-            boutiques.invocation(*args)
+            self._validateInvocation(self.in_dict)
         except Exception:  # Avoid catching BaseExceptions like SystemExit
             sys.stderr.write(
                 "An error occurred in validation\n" "Previously saved issues\n"
@@ -1189,18 +1836,93 @@ class LocalExecutor:
         # Build and save output command line (as a single-entry list)
         self.cmd_line = [self._generateCmdLineFromInDict()]
 
+    # Reads a batch of invocations, see readBatchInvocations
+    def readBatchInvocations(self, path):
+        return readBatchInvocations(path, self.desc_dict)
+
+    # Executes a batch of invocations with the current descriptor
+    def executeBatch(
+        self,
+        invocations,
+        mount_strings,
+        conOpts=None,
+        workers=None,
+        failFast=False,
+        logDir=None,
+    ):
+        """
+        The executeBatch method launches a list of invocations, given as
+        (name, input dictionary) tuples, e.g. from readBatchInvocations.
+        All the invocations are validated against the invocation schema
+        of the descriptor before any of them is launched. The container
+        image is then resolved once and the invocations are executed
+        concurrently by a BatchScheduler (see its documentation for
+        workers, failFast and logDir).
+        Returns a BatchExecutorOutput.
+        """
+        from boutiques.invocationSchemaHandler import InvocationValidationError
+
+        start = time.time()
+        validator = getValidatedDescriptor(
+            self.desc_dict, descriptor_path=self.desc_path, sandbox=self.sandbox
+        ).invocationValidator
+        invalid = []
+        for name, in_dict in invocations:
+            data = addDefaultValues(self.desc_dict, dict(in_dict))
+            error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+            if error is not None:
+                invalid.append(f"{name}: {error.message}")
+        if invalid:
+            raise_error(
+                InvocationValidationError,
+                "Invalid invocation(s) in batch:"
+                + os.linesep
+                + os.linesep.join(invalid),
+            )
+
+        # Pull the container image once for the whole batch
+        container_location = ""
+        if self.con is not None and not self.noContainer:
+            (conTypeToUse, conBinName) = self._chooseContainerTypeToUse(
+                self.con.get("type"), self._getContainerForcedCommand()
+            )
+            (conPath, container_location) = self.prepare(conTypeToUse, conBinName)
+            self._container = (conTypeToUse, conBinName, conPath, container_location)
+
+        scheduler = BatchScheduler(self, workers, failFast, logDir)
+        try:
+            outputs, errors = scheduler.run(invocations, mount_strings, conOpts)
+        finally:
+            self.closeSessions()
+        status = scheduler.status()
+        status.update(self.imageStats)
+        return BatchExecutorOutput(
+            outputs,
+            errors,
+            container_location,
+            time.time() - start,
+            status,
+        )
+
+    # Private method returning a copy of the executor, sharing the
+    # descriptor and container, set up for the given (already validated)
+    # input dictionary
+    def _forInvocation(self, in_dict):
+        executor = copy.copy(self)
+        executor.in_dict = OrderedDict(in_dict)
+        executor.out_dict = {}
+        if not self.skipDataCollect:
+            executor.summary = dict(self.summary)
+            executor.public_in = executor._generatePublicInvocation()
+        addDefaultValues(executor.desc_dict, executor.in_dict)
+        executor.cmd_line = [executor._generateCmdLineFromInDict()]
+        return executor
+
     # Private method to replace the keys in template by input and output
     # values. Input and output values are looked up in self.in_dict and
-    # self.out_dict
-    # * if use_flags is true, keys will be replaced by:
-    #      * flag+flag-separator+value if flag is not None
-    #      * value otherwise
-    # * if unfound_keys is "remove", unfound keys will be replaced by ""
-    # * if unfound_keys is "clear" then the template is cleared if it has
-    #     unfound keys (useful for configuration files)
-    # * before being substituted, the values will be:
-    #     * stripped from all the strings in stripped_extensions
-    #     * escaped for special characters
+    # self.out_dict. See CompiledTemplate.render for the options.
+    # Templates from the descriptor are compiled once in self.compiledDesc,
+    # this method compiles the given template on the fly.
     def _replaceKeysInTemplate(
         self,
         template,
@@ -1210,144 +1932,76 @@ class LocalExecutor:
         is_output=False,
         escape_special_chars=True,
     ):
-        def escape_string(s):
-            try:
-                from shlex import quote
-            except ImportError as e:
-                from shlex import quote
-            return quote(s)
+        return self.compiledDesc.compileTemplate(template).render(
+            self._inOutDict(),
+            use_flags=use_flags,
+            unfound_keys=unfound_keys,
+            stripped_extensions=stripped_extensions,
+            is_output=is_output,
+            escape_special_chars=escape_special_chars,
+            escaped_ids=self.out_dict,
+        )
 
-        # Concatenate input and output dictionaries
+    # Concatenates input and output dictionaries
+    def _inOutDict(self):
         in_out_dict = dict(self.in_dict)
-        in_out_dict.update(self.out_dict)
-        # Go through all the keys
-        for param_id in [x["id"] for x in self.inputs + self.outputs]:
-            escape = (
-                escape_special_chars
-                and (
-                    self.safeGet(param_id, "type") == "String"
-                    or self.safeGet(param_id, "type") == "File"
-                )
-                or param_id in self.out_dict.keys()
-            )
-            clk = self.safeGet(param_id, "value-key")
-            if clk is None:
-                continue
-            if param_id in list(in_out_dict.keys()):  # param has a value
-                val = in_out_dict[param_id]
-                if type(val) is list:
-                    list_sep = self.safeGet(param_id, "list-separator")
-                    if list_sep is None:
-                        list_sep = " "
-                    escaped_val = []
-                    for x in val:
-                        escaped_val.append(escape_string(str(x)) if escape else str(x))
-                    val = list_sep.join(escaped_val)
-                elif escape:
-                    val = escape_string(val)
-                # Add flags and separator if necessary
-                flag = self.safeGet(param_id, "command-line-flag")
-                if use_flags and flag is not None:
-                    sep = self.safeGet(param_id, "command-line-flag-separator")
-                    if sep is None:
-                        sep = " "
-                    # special case for flag-type inputs
-                    if self.safeGet(param_id, "type") == "Flag":
-                        val = "" if val is False else flag
-                    else:
-                        val = flag + sep + str(val)
-                # Remove file extensions from input value
-                if (
-                    self.safeGet(param_id, "type") == "File"
-                    or self.safeGet(param_id, "type") == "String"
-                ):
-                    for extension in stripped_extensions:
-                        val = val.replace(extension, "")
-                    # Remove path if a) a file, b) not the first item in the
-                    # template; for output files specifically
-                    if (
-                        self.safeGet(param_id, "type") == "File"
-                        and template.find(clk) > 0
-                        and is_output
-                    ):
-                        val = op.basename(val)
-                # Here val can be a number so we need to cast it
-                if val is not None and val != "":
-                    template = template.replace(clk, str(val))
-                else:
-                    template = template.replace(" " + clk, str(val))
-            else:  # param has no value
-                if unfound_keys == "remove":
-                    if (" " + clk) in template:
-                        template = template.replace(" " + clk, "")
-                    else:
-                        template = template.replace(clk, "")
-                elif unfound_keys == "clear":
-                    if clk in template:
-                        return ""
-        return template
+        in_out_dict.update(getattr(self, "out_dict", {}))
+        return in_out_dict
 
     # Private method to generate output file names.
     # Output file names will be put in self.out_dict.
-    def _generateOutputFileNames(self):
-        if not hasattr(self, "out_dict"):
-            # a dictionary that will contain the output file names
-            self.out_dict = {}
-        for outputId, isPathTemplate in [
-            (x["id"], "path-template" in x) for x in self.outputs
-        ]:
-            if isPathTemplate:
-                if outputId in list(self.out_dict.keys()):
-                    outputFileName = self.out_dict[outputId]
-                else:
-                    outputFileName = self.safeGet(outputId, "path-template")
-
+    # Outputs are generated in dependency order so that path templates
+    # can contain output keys; in_out_dict is updated with the file names.
+    def _generateOutputFileNames(self, in_out_dict=None):
+        if in_out_dict is None:
+            in_out_dict = dict(self.in_dict)
+        # a dictionary that will contain the output file names
+        self.out_dict = {}
+        for outputId in self.compiledDesc.outputOrder:
+            template = self.compiledDesc.pathTemplates.get(outputId)
             # if 'conditional-path-template' in outputItem
             # (key=conditions, value=path)
-            # Initialize file name with path template or existing value
-            elif not isPathTemplate:
-                for templateObj in self.safeGet(outputId, "conditional-path-template"):
-                    templateKey = list(templateObj.keys())[0]
-                    condition = self._getCondPathTemplateExp(templateKey)
+            if template is None:
+                for templateKey, condTemplate in self.compiledDesc.conditionalTemplates[
+                    outputId
+                ]:
+                    condition = self._getCondPathTemplateExp(templateKey, in_out_dict)
                     # If condition is true, set fileName
                     # Stop checking (if-elif...)
-                    if condition == "default":
-                        outputFileName = templateObj["default"]
-                        break
-                    elif eval(condition):
-                        outputFileName = templateObj[templateKey]
+                    if condition == "default" or eval(condition):
+                        template = condTemplate
                         break
+                else:
+                    continue  # No path template applies to this output
 
             stripped_extensions = self.safeGet(
                 outputId, "path-template-stripped-extensions"
             )
             if stripped_extensions is None:
                 stripped_extensions = []
-            se = stripped_extensions  # Renaming variable to save space
-            # We keep the unfound keys because they will be
-            # substituted in a second call to the method in case
-            # they are output keys
-            outputFileName = self._rkit(
-                outputFileName,
+            outputFileName = template.render(
+                in_out_dict,
                 use_flags=False,
                 unfound_keys="keep",
-                stripped_extensions=se,
+                stripped_extensions=stripped_extensions,
                 is_output=True,
                 escape_special_chars=False,
+                escaped_ids=self.out_dict,
             )
 
             if self.safeGet(outputId, "uses-absolute-path"):
                 outputFileName = os.path.abspath(outputFileName)
             self.out_dict[outputId] = outputFileName
+            in_out_dict[outputId] = outputFileName
+        return in_out_dict
 
-    def _getCondPathTemplateExp(self, templateKey):
+    def _getCondPathTemplateExp(self, templateKey, in_out_dict=None):
+        if in_out_dict is None:
+            in_out_dict = self._inOutDict()
         splitExp = conditionalExpFormat(templateKey).split()
         parsedExp = []
         for word in [word.strip() for word in splitExp if len(word) > 0]:
-            all_ids = [i["id"] for i in (self.inputs + self.outputs)]
             # Substitute boolean expression key by its value
-            in_out_dict = self.in_dict.copy()
-            in_out_dict.update(self.out_dict)
             if word in in_out_dict:
                 value = f"{in_out_dict[word]}"
                 if value.replace(".", "").replace("-", "").isdigit():
@@ -1356,7 +2010,7 @@ class LocalExecutor:
                     parsedExp.append(f'"{value}"')
             # Boolean expression key is not chosen (optional input),
             # therefore expression is false
-            elif word in all_ids:
+            elif word in self.compiledDesc.parameter_ids:
                 parsedExp = ["False"]
                 break
             # Word is an expression char, just append it
@@ -1366,30 +2020,31 @@ class LocalExecutor:
 
     # Private method to write configuration files
     # Configuration files are output files that have a file-template
-    def _writeConfigurationFiles(self):
-        for outputId in [x["id"] for x in self.outputs]:
-            fileTemplate = self.safeGet(outputId, "file-template")
-            if fileTemplate is None:
-                continue  # this is not a configuration file
+    def _writeConfigurationFiles(self, in_out_dict=None):
+        if in_out_dict is None:
+            in_out_dict = self._inOutDict()
+        for outputId, fileTemplate in self.compiledDesc.fileTemplates.items():
+            if outputId not in self.out_dict:
+                continue
             stripped_extensions = self.safeGet(
                 outputId, "path-template-stripped-extensions"
             )
             if stripped_extensions is None:
                 stripped_extensions = []
-            se = stripped_extensions  # Renaming variable to save space
             # We substitute the keys line by line so that we can
             # clear the lines that have keys with no value
             # (undefined optional params)
             newTemplate = []
             for line in fileTemplate:
                 newTemplate.append(
-                    self._rkit(
-                        line,
+                    line.render(
+                        in_out_dict,
                         use_flags=False,
                         unfound_keys="clear",
-                        stripped_extensions=se,
+                        stripped_extensions=stripped_extensions,
                         is_output=False,
                         escape_special_chars=True,
+                        escaped_ids=self.out_dict,
                     )
                 )
             template = os.linesep.join(newTemplate)
@@ -1405,26 +2060,20 @@ class LocalExecutor:
     # using the input data
     def _generateCmdLineFromInDict(self):
         # Generate output file names
-        self._generateOutputFileNames()
-        # it is required to call the method twice in case path
-        # templates contain output keys
-        self._generateOutputFileNames()
+        in_out_dict = self._generateOutputFileNames()
         # Write configuration files
-        self._writeConfigurationFiles()
-        # Get the command line template
-        template = self.desc_dict["command-line"]
-        # Substitute every given value into the template
-        # (incl. flags, flag-seps, ...)
-        template = self._rkit(
-            template,
+        self._writeConfigurationFiles(in_out_dict)
+        # Substitute every given value into the command-line template
+        # (incl. flags, flag-seps, ...) and return it
+        return self.compiledDesc.commandLine.render(
+            in_out_dict,
             use_flags=True,
             unfound_keys="remove",
             stripped_extensions=[],
             is_output=False,
             escape_special_chars=True,
+            escaped_ids=self.out_dict,
         )
-        # Return substituted command line
-        return template
 
     # Print the command line result
     def printCmdLine(self):
@@ -1438,6 +2087,7 @@ class LocalExecutor:
         summary = {}
         summary["name"] = self.desc_dict["name"]
         summary["descriptor-doi"] = self._findDOI(desc)
+        summary["hash-algorithm"] = self.hashAlgorithm
         return summary
 
     # Private method to attempt to find descriptor DOI
@@ -1478,15 +2128,19 @@ class LocalExecutor:
         public_in_dict = self.in_dict.copy()
         # Replace file type inputs with object containing
         # input file hash and filename
+        pending = []
         for x in self.inputs:
             if x.get("type") == "File":
                 id = x.get("id")
                 path = public_in_dict.get(id)
                 if path is not None:
                     if isinstance(path, list):
-                        public_in_dict[id] = [self._buildPublicFile(p) for p in path]
+                        public_in_dict[id] = [
+                            self._buildPublicFile(p, pending) for p in path
+                        ]
                     else:
-                        public_in_dict[id] = self._buildPublicFile(path)
+                        public_in_dict[id] = self._buildPublicFile(path, pending)
+        self._hashPublicFiles(pending)
 
         return public_in_dict
 
@@ -1503,15 +2157,19 @@ class LocalExecutor:
 
         # Iterate through output files to generate output objects
         # and generate objects with hash of files
+        pending = []
         out_files_dict = {
-            id: self._buildPublicFile(filename)
+            id: self._buildPublicFile(filename, pending)
             for id, filename in out_files_dict.items()
         }
+        self._hashPublicFiles(pending)
         public_out_dict["output-files"] = out_files_dict
         return public_out_dict
 
-    # Private method to recursively explore directory and hash all files
-    def _buildPublicFile(self, path):
+    # Private method to recursively explore directory and list all files.
+    # The objects of files are appended to pending, with their path, to
+    # be hashed together by _hashPublicFiles.
+    def _buildPublicFile(self, path, pending):
         filename = extractFileName(path)
         # If path is not found, report it
         if not os.path.exists(path):
@@ -1520,12 +2178,27 @@ class LocalExecutor:
         if os.path.isdir(path):
             contents = os.listdir(path)
             # Recursive call to expand directory
-            files = [self._buildPublicFile(os.path.join(path, x)) for x in contents]
+            files = [
+                self._buildPublicFile(os.path.join(path, x), pending)
+                for x in contents
+            ]
             return {"file-name": filename, "files": files}
-        # Files are hashed
+        # Files are hashed later
         else:
-            md5sum = computeMD5(path)
-            return {"file-name": filename, "md5sum": md5sum}
+            public_file = {"file-name": filename}
+            pending.append((path, public_file))
+            return public_file
+
+    # Private method hashing files listed by _buildPublicFile in parallel.
+    # Digests are stored as "<algorithm>sum", e.g. "md5sum".
+    def _hashPublicFiles(self, pending):
+        digests = hashFiles(
+            [path for path, public_file in pending],
+            self.hashAlgorithm,
+            self.hashWorkers,
+        )
+        for path, public_file in pending:
+            public_file[self.hashAlgorithm + "sum"] = digests[path]
 
     # Private method to publish data collection objects to file
     # summary, publicInput an publicOutput are combined and
@@ -1541,15 +2214,15 @@ class LocalExecutor:
             "public-output": self.public_out,
             "additional-information": self.provenance,
         }
-        # Convert dictionary to Json string
-        content = json.dumps(data_dict, indent=4)
-        # Write collected data to file
-        data_cache_dir = getDataCacheDir()
-        filename = f"{tool_name}_{date_time}.json"
-        file_path = os.path.join(data_cache_dir, filename)
-        file = open(file_path, "w+")
-        file.write(content)
-        file.close()
+        # Add collected data to the data store, records are named after
+        # the files they are exported to (see DataStore). The random
+        # suffix keeps the names of concurrent executions unique.
+        filename = f"{tool_name}_{date_time}_{uuid.uuid4().hex[:12]}.json"
+        store = DataStore()
+        try:
+            store.add(filename, data_dict)
+        finally:
+            store.close()
         if self.debug:
             print_info(f"Data capture from execution saved to cache as {filename}")
 
@@ -1559,29 +2232,45 @@ class LocalExecutor:
     def _saveDescriptorToCache(self):
         tool_name = self.desc_dict.get("name").replace(" ", "-")
         data_cache_dir = getDataCacheDir()
-        data_cache_files = os.listdir(data_cache_dir)
-        # Filter for descriptors in cache with the same tool name to check
-        # if descriptor already in cache
-        matching_files = [
-            x
-            for x in data_cache_files
-            if len(x.split("_")) > 1 and x.split("_")[1] is tool_name.replace(" ", "-")
-        ]
-        match = None
-        for fl in matching_files:
-            path = os.path.join(data_cache_dir, fl)
-            file_dict = loadJson(path)
-            if file_dict == self.desc_dict:
-                match = fl
-                break
-        if match:
-            if self.debug:
-                print_info(
-                    f"Unpublished descriptor match found in data cache as {match}"
-                )
+        digest = descriptorHash(self.desc_dict)
+        store = DataStore()
+        try:
+            match = self._findCachedDescriptor(
+                store, digest, tool_name, data_cache_dir
+            )
+            if match:
+                if self.debug:
+                    print_info(
+                        f"Unpublished descriptor match found in data cache as {match}"
+                    )
+                return match
+            filename = self._writeDescriptorToCache(tool_name, data_cache_dir)
+            store.addDescriptorFile(digest, filename)
+        finally:
+            store.close()
+        return filename
+
+    # Private method returning the name of the copy of the descriptor in
+    # the data cache, looked up by content hash in the data store. Copies
+    # written before the data store indexed them are looked up by tool
+    # name and then indexed.
+    def _findCachedDescriptor(self, store, digest, tool_name, data_cache_dir):
+        match = store.descriptorFile(digest)
+        if match is not None and os.path.isfile(os.path.join(data_cache_dir, match)):
             return match
+        prefix = f"descriptor_{tool_name}_"
+        for fl in os.listdir(data_cache_dir):
+            if fl.startswith(prefix):
+                if loadJson(os.path.join(data_cache_dir, fl)) == self.desc_dict:
+                    store.addDescriptorFile(digest, fl)
+                    return fl
+        return None
+
+    # Private method writing the descriptor to the data cache, returns the
+    # name of the written file
+    def _writeDescriptorToCache(self, tool_name, data_cache_dir):
         # Write descriptor to data cache and save return filename
-        content = json.dumps(self.desc_dict, indent=4)
+        content = jsonBackend.dumps(self.desc_dict)
         date_time = datetime.datetime.now().strftime("%Y-%m-%d_%Hh%Mm%Ss%fms")
         filename = f"descriptor_{tool_name}_{date_time}.json"
         path = os.path.join(data_cache_dir, filename)
@@ -1596,6 +2285,93 @@ class LocalExecutor:
         return filename
 
 
+# Returns the number of cores usable by this process and the available
+# memory of the host in GB (None if it cannot be determined)
+def hostResources():
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    ram = None
+    try:
+        with open("/proc/meminfo") as fhandle:
+            for line in fhandle:
+                if line.startswith("MemAvailable:"):
+                    ram = int(line.split()[1]) / (1024.0**2)  # kB to GB
+                    break
+    except OSError:
+        pass
+    if ram is None:
+        try:
+            pages = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+            ram = pages / (1024.0**3)
+        except (AttributeError, ValueError, OSError):
+            pass
+    return cores, ram
+
+
+# Returns True if the invocation given to 'bosh exec launch' describes
+# a batch of invocations (a directory, a glob pattern matching JSON
+# files, a JSON-lines or a CSV file)
+def isBatchInvocation(invocation):
+    if op.isdir(invocation):
+        return True
+    if op.isfile(invocation):
+        return invocation.lower().endswith((".jsonl", ".ndjson", ".csv"))
+    # JSON objects given on the command line may contain brackets
+    return (
+        not invocation.lstrip().startswith("{")
+        and has_magic(invocation)
+        and len(glob(invocation)) > 0
+    )
+
+
+# Reads a batch of invocations from a directory of JSON files, a glob
+# pattern matching JSON files, a JSON-lines file (one invocation per
+# line) or a CSV file (one column per input id, one invocation per row;
+# numbers, booleans and lists are given in JSON syntax, except for the
+# String and File inputs of desc_dict).
+# Returns a list of (name, input dictionary) tuples.
+def readBatchInvocations(path, desc_dict=None):
+    invocations = []
+    if op.isdir(path) or not op.exists(path):
+        pattern = op.join(path, "*.json") if op.isdir(path) else path
+        for fname in sorted(glob(pattern)):
+            invocations.append((op.basename(fname), loadJson(fname)))
+    elif path.lower().endswith(".csv"):
+        inputs = {i["id"]: i for i in (desc_dict or {}).get("inputs", [])}
+        with open(path, newline="") as fhandle:
+            for row, values in enumerate(csv.DictReader(fhandle), start=1):
+                in_dict = OrderedDict()
+                for key, value in values.items():
+                    if key is None or value is None or value == "":
+                        continue  # Extra or empty cells are unset inputs
+                    key = key.strip()
+                    in_dict[key] = _parseCsvValue(inputs.get(key), value)
+                invocations.append((f"{op.basename(path)}:{row}", in_dict))
+    else:
+        with open(path) as fhandle:
+            for line, content in enumerate(fhandle, start=1):
+                if not content.strip():
+                    continue
+                in_dict = jsonBackend.loads(content)
+                invocations.append((f"{op.basename(path)}:{line}", in_dict))
+    if not invocations:
+        raise_error(ExecutorError, f"No invocation found in {path}")
+    return invocations
+
+
+# Converts a CSV cell to the type of the input
+def _parseCsvValue(param, value):
+    if param is not None:
+        if param.get("type") in ("String", "File") and not param.get("list"):
+            return value
+    try:
+        return jsonBackend.loads(value)
+    except ValueError:
+        return value
+
+
 # Adds default values to input dictionary
 # for parameters whose values were not given
 def addDefaultValues(desc_dict, in_dict):
@@ -1604,13 +2380,3 @@ def addDefaultValues(desc_dict, in_dict):
         if in_dict.get(in_param["id"]) is None:
             in_dict[in_param["id"]] = in_param.get("default-value")
     return in_dict
-
-
-# Hashes files with MD5,
-# capable of handling large data files
-def computeMD5(filepath):
-    hash_md5 = hashlib.md5()
-    with open(filepath, "rb") as fhandle:
-        for chunk in iter(lambda: fhandle.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
@@ -2,8 +2,7 @@
 
 import os
 
-import simplejson as json
-
+from boutiques import jsonBackend
 from boutiques.logger import print_info, raise_error
 from boutiques.util.utils import customSortDescriptorByKey, loadJson
 from boutiques.validator import ValidationError, validate_descriptor
@@ -161,7 +160,7 @@ class Publisher:
         if self.descriptor.get("doi"):
             del self.descriptor["doi"]
         with open(self.descriptor_file_name, "w") as fhandle:
-            fhandle.write(json.dumps(self.descriptor, indent=4))
+            jsonBackend.dump(self.descriptor, fhandle)
 
         self.zenodo_helper.zenodo_upload_file(
             deposition_id,
@@ -177,7 +176,7 @@ class Publisher:
         # Assign new doi to published descriptor
         self.descriptor["doi"] = self.doi
         with open(self.descriptor_file_name, "w") as fhandle:
-            fhandle.write(json.dumps(self.descriptor, indent=4))
+            jsonBackend.dump(self.descriptor, fhandle)
 
         if os.path.isfile(self.descriptor_file_name):
             return "OK"
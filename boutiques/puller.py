@@ -1,25 +1,19 @@
 import os
-import urllib
-
-import requests
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from boutiques import httpClient
 from boutiques.logger import print_info, raise_error
-from boutiques.searcher import Searcher
 from boutiques.zenodoHelper import ZenodoError, ZenodoHelper
 
-try:
-    # Python 3
-    from urllib.request import urlopen, urlretrieve
-except ImportError:
-    # Python 2
-    from urllib import urlretrieve
-
-    from urllib2 import urlopen
+# Number of descriptors resolved and downloaded at the same time
+PULL_WORKERS = 8
 
 
 class Puller:
 
-    def __init__(self, zids, verbose=False, sandbox=False):
+    def __init__(self, zids, verbose=False, sandbox=False, workers=PULL_WORKERS):
         # remove zenodo prefix
         self.zenodo_entries = []
         self.cache_dir = os.path.join(
@@ -50,48 +44,86 @@ class Puller:
                 )
         self.verbose = verbose
         self.sandbox = sandbox
+        self.workers = workers
+        # Time taken to pull each descriptor, in seconds, by Zenodo id
+        self.timings = {}
         if self.verbose:
             for zid in discarded_zids:
                 print_info(f"Discarded duplicate id {zid}")
         self.zenodo_helper = ZenodoHelper(sandbox=self.sandbox, verbose=self.verbose)
 
+    # Returns the paths of the descriptors, downloading those that are not
+    # cached. Descriptors are resolved through the record API and
+    # downloaded by a pool of threads, and written to the cache through
+    # a temporary file, so that concurrent pulls never read a partial
+    # descriptor.
     def pull(self):
-        # return cached file if it exists
-        json_files = []
+        json_files = {}
+        missing = []
         for entry in self.zenodo_entries:
+            # return cached file if it exists
             if os.path.isfile(entry["fname"]):
                 if self.verbose:
                     print_info(f"Found cached file at {entry['fname']}")
-                json_files.append(entry["fname"])
-                continue
+                json_files[entry["zid"]] = entry["fname"]
+            else:
+                missing.append(entry)
+
+        if missing:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Descriptors get the mode of newly created files rather than
+            # the private mode of temporary files, so that other users
+            # sharing the cache can read them. The umask can only be read
+            # by setting it, which is done before starting the threads.
+            umask = os.umask(0)
+            os.umask(umask)
+            self._file_mode = 0o666 & ~umask
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(self._pull_entry, entry) for entry in missing]
+                try:
+                    # Descriptors are checked in order, so that the first
+                    # missing descriptor is reported
+                    for entry, future in zip(missing, futures):
+                        json_files[entry["zid"]] = future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
 
-            searcher = Searcher(
-                entry["zid"], self.verbose, self.sandbox, exact_match=True
+        return [json_files[entry["zid"]] for entry in self.zenodo_entries]
+
+    def _pull_entry(self, entry):
+        start = time.time()
+        record = self.zenodo_helper.zenodo_get_record(entry["zid"])
+        if record["id"] != int(entry["zid"]):
+            raise_error(
+                ZenodoError,
+                'Searched-for descriptor "{}" '
+                'does not match descriptor "{}" returned '
+                "from Zenodo".format(entry["zid"], record["id"]),
             )
-            r = self.zenodo_helper.zenodo_search(searcher.query, searcher.query_line)
-            if not len(r.json()["hits"]["hits"]):
-                raise_error(
-                    ZenodoError,
-                    f"Descriptor \"{entry['zid']}\" not found",
+        file_path = record["files"][0]["links"]["self"]
+        if self.verbose:
+            print_info(f"Downloading descriptor {file_path.split('/')[-1]}")
+        r = httpClient.get(file_path)
+        if r.status_code != 200:
+            raise_error(
+                ZenodoError, f"Cannot download descriptor \"{entry['zid']}\"", r
+            )
+        (fd, tmp) = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fhandle:
+                os.fchmod(fhandle.fileno(), self._file_mode)
+                fhandle.write(r.content)
+            os.replace(tmp, entry["fname"])
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.timings[entry["zid"]] = time.time() - start
+        if self.verbose:
+            print_info(
+                "Downloaded descriptor to {} in {:.2f}s".format(
+                    entry["fname"], self.timings[entry["zid"]]
                 )
-            for hit in r.json()["hits"]["hits"]:
-                file_path = hit["files"][0]["links"]["self"]
-                file_name = file_path.split(os.sep)[-1]
-                if hit["id"] == int(entry["zid"]):
-                    if not os.path.exists(self.cache_dir):
-                        os.makedirs(self.cache_dir)
-                    if self.verbose:
-                        print_info(f"Downloading descriptor {file_name}")
-                    downloaded = urlretrieve(file_path, entry["fname"])
-                    if self.verbose:
-                        print_info("Downloaded descriptor to " + downloaded[0])
-                    json_files.append(downloaded[0])
-                else:
-                    raise_error(
-                        ZenodoError,
-                        'Searched-for descriptor "{}" '
-                        'does not match descriptor "{}" returned '
-                        "from Zenodo".format(entry["zid"], hit["id"]),
-                    )
-
-        return json_files
+            )
+        return entry["fname"]
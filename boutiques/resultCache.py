@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+import hashlib
+import os
+import os.path as op
+import shutil
+import tempfile
+import time
+
+from boutiques import jsonBackend
+from boutiques.__version__ import VERSION
+from boutiques.fileHashing import hashFiles
+from boutiques.util.utils import computeMD5
+
+# Results of executions, stored by 'bosh exec launch --cache-results' in
+# a content-addressed store:
+#   <cache dir>/entries/<key>.json  ExecutorOutput fields and, for each
+#                                   output file, the MD5 of its content
+#   <cache dir>/objects/<md5>       content of the output files
+# Objects are hard-linked to the output files they are stored from when
+# possible, so they are checked against their MD5 before being restored.
+# Restored outputs are copies, so that modifying one of them changes
+# neither the object nor the other outputs restored from it.
+
+
+def getResultCacheDir():
+    cache_dir = op.join(op.expanduser("~"), ".cache", "boutiques")
+    return op.join(cache_dir, "results")
+
+
+# Returns the key identifying an execution from the content hashes of
+# all that determines its results, e.g. descriptor hash, invocation,
+# input file digests (see pathDigest) and container image digest
+def resultKey(**components):
+    content = jsonBackend.dumps(components, compact=True, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Returns the MD5 of a file, or a digest of the names and MD5s of the
+# files of a directory. Returns None if the path does not exist.
+def pathDigest(path):
+    if op.isfile(path):
+        return computeMD5(path)
+    if not op.isdir(path):
+        return None
+    digest = hashlib.md5()
+    for relpath, md5 in sorted(_listFiles(path).items()):
+        digest.update(f"{relpath}\0{md5}\0".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+# Stores the result of an execution. record holds the fields of its
+# ExecutorOutput and outputFiles maps output ids to (path, optional)
+# tuples of the files or directories it produced. Failures to store the
+# result (e.g. full disk) are ignored.
+def storeResult(key, record, outputFiles):
+    cache_dir = getResultCacheDir()
+    entry = {
+        "boutiques-version": VERSION,
+        "created": time.time(),
+        "output": record,
+        "output-files": [],
+    }
+    try:
+        for output_id, (path, optional) in outputFiles.items():
+            if op.isdir(path):
+                objects = _listFiles(path)
+                for relpath, md5 in objects.items():
+                    _storeObject(op.join(path, relpath), md5)
+            else:
+                objects = {"": computeMD5(path)}
+                _storeObject(path, objects[""])
+            entry["output-files"].append(
+                {
+                    "id": output_id,
+                    "path": path,
+                    "optional": optional,
+                    "directory": op.isdir(path),
+                    "objects": objects,
+                }
+            )
+        _writeAtomically(
+            op.join(cache_dir, "entries", key + ".json"),
+            lambda fhandle: jsonBackend.dump(entry, fhandle, compact=True),
+        )
+    except OSError:
+        pass
+
+
+# Restores the output files of a stored result and returns its record,
+# or returns None if there is no valid result for this key
+def restoreResult(key):
+    entry_file = op.join(getResultCacheDir(), "entries", key + ".json")
+    try:
+        with open(entry_file) as fhandle:
+            entry = jsonBackend.load(fhandle)
+    except (OSError, ValueError):
+        return None
+    if entry.get("boutiques-version") != VERSION or not all(
+        _isValidObject(md5)
+        for output in entry["output-files"]
+        for md5 in output["objects"].values()
+    ):
+        _remove(entry_file)
+        return None
+    try:
+        for output in entry["output-files"]:
+            if output["directory"]:
+                for relpath, md5 in output["objects"].items():
+                    _restoreObject(md5, op.join(output["path"], relpath))
+            else:
+                _restoreObject(output["objects"][""], output["path"])
+    except OSError:
+        return None
+    record = dict(entry["output"])
+    record["output-files"] = [
+        (output["id"], output["path"], output["optional"])
+        for output in entry["output-files"]
+    ]
+    return record
+
+
+# Removes all the stored results
+def clearResultCache():
+    shutil.rmtree(getResultCacheDir(), ignore_errors=True)
+
+
+def _objectPath(md5):
+    return op.join(getResultCacheDir(), "objects", md5)
+
+
+def _listFiles(directory):
+    paths = [
+        op.join(root, fname)
+        for root, dirs, fnames in os.walk(directory)
+        for fname in fnames
+    ]
+    return {
+        op.relpath(path, directory): md5
+        for path, md5 in hashFiles(paths, "md5").items()
+    }
+
+
+# Objects are shared by all the results with the same output content
+def _storeObject(path, md5):
+    target = _objectPath(md5)
+    if op.exists(target):
+        return
+    _writeAtomically(target, lambda tmp: _linkOrCopy(path, tmp), path=True)
+
+
+# Objects may have been modified through hard links to output files
+def _isValidObject(md5):
+    try:
+        return computeMD5(_objectPath(md5)) == md5
+    except OSError:
+        return False
+
+
+def _restoreObject(md5, path):
+    if op.dirname(path):
+        os.makedirs(op.dirname(path), exist_ok=True)
+    _writeAtomically(path, lambda tmp: shutil.copy2(_objectPath(md5), tmp), path=True)
+
+
+def _linkOrCopy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+# Writes a file through a temporary file renamed once complete. write
+# receives an open file, or the temporary path if path is true.
+def _writeAtomically(target, write, path=False):
+    os.makedirs(op.dirname(target) or ".", exist_ok=True)
+    (fd, tmp) = tempfile.mkstemp(dir=op.dirname(target) or ".", suffix=".tmp")
+    try:
+        if path:
+            os.close(fd)
+            os.remove(tmp)
+            write(tmp)
+        else:
+            with os.fdopen(fd, "w") as fhandle:
+                write(fhandle)
+        os.replace(tmp, target)
+    except BaseException:
+        _remove(tmp)
+        raise
+    # Renaming a hard link to the file it links to does nothing
+    if op.exists(tmp) and op.samefile(tmp, target):
+        os.remove(tmp)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,13 +1,12 @@
-import hashlib
 import os.path as op
 
 import boutiques as bosh
 from boutiques import __file__ as bfile
+from boutiques.util.utils import computeMD5
 
 
 def compute_md5(filename):
-    with open(filename, "rb") as fhandle:
-        return hashlib.md5(open(filename, "rb").read()).hexdigest()
+    return computeMD5(filename)
 
 
 def test(descriptor, test, invocation, paramsDict):
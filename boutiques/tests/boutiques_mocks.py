@@ -1,4 +1,9 @@
+import json
 import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from boutiques import __file__ as bfile
 
@@ -11,6 +16,10 @@ class MockHttpResponse:
     def json(self):
         return self.mock_json
 
+    @property
+    def content(self):
+        return json.dumps(self.mock_json).encode("utf-8")
+
 
 ZENODO_RECORD = 129904
 ZENODO_FILE = (
@@ -65,16 +74,27 @@ example_boutiques_tool = MockZenodoRecord(
 )
 
 
-def mock_get():
-    return mock_zenodo_search(
-        [
-            MockZenodoRecord(
-                ZENODO_RECORD,
-                "Example Boutiques Tool",
-                filename=ZENODO_FILE,
-            )
-        ]
-    )
+# Mocks the GET requests of Puller: the record API returns the given
+# mock records (by default example_boutiques_tool), and their file links
+# the content of example1_docker.json
+def mock_get_records(records=None):
+    def get(*args, **kwargs):
+        for record in records or [example_boutiques_tool]:
+            if args[0].endswith(f"/api/records/{record.id}"):
+                return MockHttpResponse(200, get_zenodo_record(record))
+            if args[0] == record.filename:
+                descriptor = os.path.join(
+                    os.path.dirname(bfile),
+                    "schema",
+                    "examples",
+                    "example1",
+                    "example1_docker.json",
+                )
+                with open(descriptor) as fhandle:
+                    return MockHttpResponse(200, json.load(fhandle))
+        return MockHttpResponse(404)
+
+    return get
 
 
 def mock_zenodo_test_api(*args, **kwargs):
@@ -210,3 +230,125 @@ def mock_post_publish_bulk():
         mock_zenodo_upload_descriptor(),
         mock_zenodo_publish(1234567),
     ]
+
+
+# Local HTTP server implementing the parts of the Zenodo deposition API
+# used to publish records: depositions, bucket uploads and publication.
+# Uploads of the files in "fail" are answered with the given status code
+# (once for transient errors, always otherwise).
+class MockZenodoServer:
+    def __init__(self):
+        self.depositions = {}
+        self.uploads = []
+        self.fail = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.endpoint = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, content=None):
+                body = json.dumps(content or {}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                # Token check of ZenodoHelper.zenodo_test_api
+                self.reply(200 if "access_token" in self.path else 403)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                if self.path == "/api/deposit/depositions":
+                    with mock.lock:
+                        zid = len(mock.depositions) + 1
+                        mock.depositions[zid] = {"files": {}, "published": False}
+                    bucket = f"{mock.endpoint}/api/files/bucket-{zid}"
+                    return self.reply(201, {"id": zid, "links": {"bucket": bucket}})
+                match = re.match(
+                    r"/api/deposit/depositions/(\d+)/actions/publish", self.path
+                )
+                if match:
+                    mock.depositions[int(match.group(1))]["published"] = True
+                    return self.reply(202, {"doi": f"10.5281/zenodo.{match.group(1)}"})
+                self.reply(404)
+
+            def do_PUT(self):
+                match = re.match(r"/api/files/bucket-(\d+)/(.+)", self.path)
+                content = self.rfile.read(int(self.headers["Content-Length"]))
+                if match is None:
+                    return self.reply(404)
+                filename = match.group(2)
+                with mock.lock:
+                    status = mock.fail.get(filename)
+                    if status is not None and status >= 500:
+                        del mock.fail[filename]
+                    if status is None:
+                        mock.uploads.append(filename)
+                        deposition = mock.depositions[int(match.group(1))]
+                        deposition["files"][filename] = content
+                if status is not None:
+                    return self.reply(status)
+                self.reply(201, {"key": filename})
+
+        return Handler
+
+
+# Local HTTP server replying to any request with the (status, headers,
+# delay) tuples of responses, in order, then with the last one
+class MockHttpServer:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.endpoint = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                mock.requests.append((self.command, self.rfile.read(length)))
+                (status, headers, delay) = (
+                    mock.responses.pop(0)
+                    if len(mock.responses) > 1
+                    else mock.responses[0]
+                )
+                time.sleep(delay)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_request
+
+        return Handler
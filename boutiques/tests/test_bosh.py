@@ -1,9 +1,12 @@
 #!/usr/bin/env python
-from boutiques import BoutiquesError
+import os
+
+from boutiques import BoutiquesError, jsonBackend
 from boutiques.bosh import bosh
 from boutiques.dataHandler import DataHandlerError
 from boutiques.localExec import ExecutorError
 from boutiques.tests.BaseTest import BaseTest
+from boutiques.util.utils import clearLoadJsonCache, loadJson, loadJsonStats
 
 
 class TestBosh(BaseTest):
@@ -26,3 +29,51 @@ class TestBosh(BaseTest):
         self.assertRaises(BoutiquesError, bosh, ["evaluate", "--help"])
         self.assertRaises(BoutiquesError, bosh, ["create", "--help"])
         self.assertRaises(BoutiquesError, bosh, ["example", "--help"])
+
+    def test_load_json_cache(self):
+        clearLoadJsonCache()
+        path = os.path.join(self.test_temp, "doc.json")
+        with open(path, "w") as fhandle:
+            fhandle.write('{"a": [1, 2], "b": {"c": "d"}}')
+        first = loadJson(path)
+        first["a"].append(3)
+        first["b"]["c"] = "modified"
+        # Returned objects are copies, the memoized object is unchanged
+        second = loadJson(path)
+        self.assertEqual(second, {"a": [1, 2], "b": {"c": "d"}})
+        self.assertEqual(loadJsonStats(), {"hits": 1, "misses": 1})
+
+        # Modified files are parsed again
+        with open(path, "w") as fhandle:
+            fhandle.write('{"a": [1, 2, 3]}')
+        self.assertEqual(loadJson(path), {"a": [1, 2, 3]})
+        self.assertEqual(loadJsonStats(), {"hits": 1, "misses": 2})
+
+        # JSON strings are memoized by content
+        self.assertEqual(loadJson('{"e": 1}'), loadJson('{"e": 1}'))
+        self.assertEqual(loadJsonStats(), {"hits": 2, "misses": 3})
+        clearLoadJsonCache()
+
+    def test_json_backend(self):
+        backends = ["simplejson"]
+        if jsonBackend.orjson is not None:
+            backends.append("orjson")
+        try:
+            for backend in backends:
+                jsonBackend.setBackend(backend)
+                self.assertEqual(jsonBackend.getBackend(), backend)
+                doc = jsonBackend.loads('{"b": 1, "a": [1.5, "c"], "s": "\\ud800"}')
+                self.assertEqual(list(doc), ["b", "a", "s"])
+                self.assertIs(type(doc), dict)
+                self.assertEqual(doc.pop("s"), "\ud800")
+                self.assertEqual(
+                    jsonBackend.dumps(doc, compact=True), '{"b":1,"a":[1.5,"c"]}'
+                )
+                self.assertEqual(
+                    jsonBackend.dumps(doc, compact=True, sort_keys=True),
+                    '{"a":[1.5,"c"],"b":1}',
+                )
+                self.assertTrue(jsonBackend.dumps(doc).startswith('{\n    "b": 1'))
+        finally:
+            jsonBackend.setBackend()
+        self.assertRaises(ValueError, jsonBackend.setBackend, "fastjson")
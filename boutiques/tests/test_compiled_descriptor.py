@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+from boutiques.compiledDescriptor import CompiledDescriptor
+from boutiques.tests.BaseTest import BaseTest
+from boutiques.util.utils import loadJson
+
+
+class TestCompiledDescriptor(BaseTest):
+    def test_lookups(self):
+        desc = loadJson(self.example1_descriptor)
+        compiled = CompiledDescriptor(desc)
+
+        self.assertIs(compiled.param("str_input"), desc["inputs"][1])
+        self.assertIs(compiled.param("logfile"), desc["output-files"][0])
+        self.assertIs(compiled.group("an_example_group"), desc["groups"][0])
+        self.assertIs(compiled.groupOf("enum_input"), desc["groups"][0])
+        self.assertIsNone(compiled.groupOf("str_input"))
+        self.assertTrue(compiled.isGroup("an_example_group"))
+        self.assertFalse(compiled.isGroup("str_input"))
+        self.assertEqual(
+            compiled.requirementsOf("an_example_group"), ["num_input", "enum_input"]
+        )
+        self.assertEqual(compiled.requirementsOf("flag_input"), ["file_input"])
+        self.assertEqual(compiled.requirementsOf("str_input"), [])
+        self.assertEqual(compiled.disablersOf("num_input"), ["flag_input"])
+
+    def test_compiled_parameters(self):
+        desc = loadJson(self.example1_descriptor)
+        compiled = CompiledDescriptor(desc)
+
+        param = compiled.compiled("str_input_list")
+        self.assertEqual(param.type, "String")
+        self.assertEqual(param.flag, "-i")
+        self.assertEqual(param.flag_separator, " ")
+        self.assertTrue(param.escape)
+        self.assertFalse(param.is_output)
+        self.assertTrue(compiled.compiled("logfile").is_output)
+        self.assertEqual(
+            [p.id for p in compiled.compiledParameters()],
+            [i["id"] for i in desc["inputs"] + desc["output-files"]],
+        )
+        with self.assertRaises(TypeError):
+            compiled._params["str_input"] = {}
+
+    def test_template_render(self):
+        desc = {
+            "command-line": "tool [A] [B] [C] -o [OUT2]",
+            "inputs": [
+                {"id": "a", "type": "String", "value-key": "[A]"},
+                {
+                    "id": "b",
+                    "type": "Number",
+                    "value-key": "[B]",
+                    "command-line-flag": "-b",
+                    "command-line-flag-separator": "=",
+                },
+                {"id": "c", "type": "File", "value-key": "[C]", "list": True},
+            ],
+            "output-files": [
+                {"id": "out2", "value-key": "[OUT2]", "path-template": "[OUT1].2"},
+                {"id": "out1", "value-key": "[OUT1]", "path-template": "[A].1"},
+            ],
+        }
+        compiled = CompiledDescriptor(desc)
+        self.assertEqual(compiled.outputOrder, ("out1", "out2"))
+
+        template = compiled.commandLine
+        values = {"a": "x y", "b": 3, "out2": "o.2"}
+        self.assertEqual(
+            template.render(values, use_flags=True, escaped_ids=["out2"]),
+            "tool 'x y' -b=3 -o o.2",
+        )
+        self.assertEqual(
+            template.render({"c": ["f1", "f 2"]}, unfound_keys="keep"),
+            "tool [A] [B] f1 'f 2' -o [OUT2]",
+        )
+        self.assertEqual(template.render(values, unfound_keys="clear"), "")
@@ -1,27 +1,23 @@
 import datetime as dt
-import glob
 import os
 import subprocess
+import time
 from unittest import mock
 
 import pytest
-from boutiques_mocks import example_boutiques_tool, mock_get
+from boutiques_mocks import example_boutiques_tool, mock_get_records
 
 import boutiques as bosh
 from boutiques import __file__ as bfile
-from boutiques.localExec import loadJson
+from boutiques.dataHandler import DataStore
 from boutiques.tests.BaseTest import BaseTest
 
 
 def retrieve_data_record():
-    data_collect_dict = {}
-    cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "boutiques", "data")
-    if os.path.exists(cache_dir):
-        cache_fls = glob.glob(cache_dir + "/*")
-        if cache_fls:
-            latest_file = max(cache_fls, key=os.path.getctime)
-            path = os.path.join(cache_dir, latest_file)
-            data_collect_dict = loadJson(path)
+    store = DataStore()
+    latest = store.latest()
+    data_collect_dict = {} if latest is None else store.get(latest[0])
+    store.close()
     return data_collect_dict
 
 
@@ -33,7 +29,7 @@ class TestDataCollection(BaseTest):
     @pytest.fixture(autouse=True)
     def clean_up(self):
         yield
-        # Clean up data collection files
+        # Clean up data collection files and records
         cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "boutiques", "data")
         if os.path.exists(cache_dir):
             cache_fls = os.listdir(cache_dir)
@@ -43,6 +39,12 @@ class TestDataCollection(BaseTest):
                 mtime = dt.datetime.fromtimestamp(st.st_mtime)
                 if mtime > dt.datetime.now() - dt.timedelta(minutes=2):
                     os.remove(path)
+        store = DataStore()
+        with store.connection:
+            store.connection.execute(
+                "DELETE FROM records WHERE created > ?", (time.time() - 120,)
+            )
+        store.close()
 
     @pytest.mark.skipif(
         subprocess.Popen("type docker", shell=True).wait(),
@@ -96,12 +98,9 @@ class TestDataCollection(BaseTest):
         reason="Docker not installed",
     )
     def test_skip_collection(self):
-        # Register original size of cache directory for comparison
-        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "boutiques", "data")
-        original_size = 0
-        if os.path.exists(cache_dir):
-            cache_fls = os.listdir(cache_dir)
-            original_size = len(cache_fls)
+        # Register original number of records for comparison
+        store = DataStore()
+        original_size = len(store.names())
 
         invoc = os.path.join(
             os.path.dirname(bfile),
@@ -121,17 +120,15 @@ class TestDataCollection(BaseTest):
             f"{self.get_file_path('example1_mount2')}:/test_mount2",
         )
 
-        new_size = 0
-        if os.path.exists(cache_dir):
-            cache_fls = os.listdir(cache_dir)
-            new_size = len(cache_fls)
+        new_size = len(store.names())
+        store.close()
         self.assertEqual(new_size, original_size)
 
     @pytest.mark.skipif(
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_read_doi_zenodo(self, mock_get):
         invoc = os.path.join(
             os.path.dirname(bfile),
@@ -1,16 +1,20 @@
 #!/usr/bin/env python
 
+import json
 import os
 import shutil
+import sqlite3
 from unittest import mock
 
 import pytest
 
 import boutiques
 from boutiques.bosh import bosh
+from boutiques.dataHandler import DataStore
 from boutiques.nexusHelper import NexusError
 from boutiques.tests.BaseTest import BaseTest
 from boutiques.tests.boutiques_mocks import (
+    MockZenodoServer,
     mock_empty_function,
     mock_get_data_cache,
     mock_get_data_cache_file,
@@ -21,6 +25,8 @@ from boutiques.tests.boutiques_mocks import (
     mock_post_publish_bulk,
     mock_post_publish_single,
 )
+from boutiques.util.utils import loadJson
+from boutiques.zenodoHelper import ZenodoError
 
 ZENODO_SANDBOX_TOKEN = "fake-token-123"
 
@@ -79,8 +85,8 @@ class TestDataHandler(BaseTest):
         "boutiques.dataHandler.getDataCacheDir",
         return_value=mock_get_data_cache(),
     )
-    @mock.patch("requests.get", side_effect=mock_get_publish_single())
-    @mock.patch("requests.post", side_effect=mock_post_publish_single())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_single())
+    @mock.patch("boutiques.httpClient.post", side_effect=mock_post_publish_single())
     def test_publish_single(self, mock_dir, mock_get, mock_post):
         # Publish a record that does not exist
         with self.assertRaises(ValueError) as e:
@@ -153,8 +159,54 @@ class TestDataHandler(BaseTest):
         "boutiques.dataHandler.getDataCacheDir",
         return_value=mock_get_data_cache(),
     )
-    @mock.patch("requests.get", side_effect=mock_get_publish_bulk())
-    @mock.patch("requests.post", side_effect=mock_post_publish_bulk())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_single())
+    @mock.patch("boutiques.httpClient.post", side_effect=mock_post_publish_single())
+    def test_data_store(self, mock_dir, mock_get, mock_post):
+        record = loadJson(os.path.join(mock_get_data_cache(), "tool1_123.json"))
+        record["summary"]["name"] = "tool4"
+        store = DataStore()
+        store.add("tool4_456.json", record)
+        self.assertEqual(store.names("tool4"), ["tool4_456.json"])
+        with self.assertRaises(sqlite3.IntegrityError):
+            store.add("tool4_456.json", record)
+
+        # Records of the store are listed with the files of the cache
+        boutiques.data("inspect")
+        out, _ = self.capfd.readouterr()
+        self.assertIn("There are 4 unpublished records in the cache", out)
+        self.assertIn("tool4_456.json", out)
+        boutiques.data("inspect", "-l")
+        out, _ = self.capfd.readouterr()
+        self.assertIn('"tool4"', out)
+
+        export_dir = os.path.join(self.test_temp, "export")
+        bosh(["data", "export", export_dir, "-f", "tool4_456.json"])
+        self.assertEqual(loadJson(os.path.join(export_dir, "tool4_456.json")), record)
+
+        bosh(
+            [
+                "data",
+                "publish",
+                "-f",
+                "tool4_456.json",
+                "-y",
+                "--sandbox",
+                "--zenodo-token",
+                ZENODO_SANDBOX_TOKEN,
+            ]
+        )
+        self.assertFalse(store.contains("tool4_456.json"))
+        store.add("tool4_456.json", record)
+        bosh(["data", "delete", "-y"])
+        self.assertEqual(store.names(), [])
+        store.close()
+
+    @mock.patch(
+        "boutiques.dataHandler.getDataCacheDir",
+        return_value=mock_get_data_cache(),
+    )
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_bulk())
+    @mock.patch("boutiques.httpClient.post", side_effect=mock_post_publish_bulk())
     def test_publish_bulk(self, mock_dir, mock_get, mock_post):
         bosh(
             [
@@ -172,8 +224,47 @@ class TestDataHandler(BaseTest):
         "boutiques.dataHandler.getDataCacheDir",
         return_value=mock_get_data_cache(),
     )
-    @mock.patch("requests.get", side_effect=mock_get_publish_single())
-    @mock.patch("requests.post", side_effect=mock_post_publish_single())
+    @mock.patch("boutiques.httpClient.HTTP_BACKOFF", 0.01)
+    def test_publish_bulk_resume(self, mock_dir):
+        record = loadJson(os.path.join(mock_get_data_cache(), "tool1_123.json"))
+        store = DataStore()
+        names = [f"tool4_{i}.json" for i in range(40)]
+        for name in names:
+            store.add(name, record)
+        publish = ["data", "publish", "-y", "--zenodo-token", ZENODO_SANDBOX_TOKEN]
+
+        with MockZenodoServer() as server, mock.patch(
+            "boutiques.zenodoHelper.ZenodoHelper.get_zenodo_endpoint",
+            return_value=server.endpoint,
+        ):
+            # Transient errors are retried, others interrupt the publication
+            server.fail = {"tool4_3.json": 503, "tool4_7.json": 400}
+            with self.assertRaises(ZenodoError):
+                bosh(publish)
+            self.assertNotIn("tool4_7.json", server.uploads)
+            self.assertFalse(server.depositions[1]["published"])
+            self.assertEqual(len(store.names()), 40)
+
+            # The publication resumes with the same deposition
+            del server.fail["tool4_7.json"]
+            bosh(publish)
+        self.assertEqual(len(server.depositions), 1)
+        self.assertTrue(server.depositions[1]["published"])
+        self.assertEqual(
+            sorted(server.uploads),
+            sorted(names + ["tool1_123.json", "tool3_123.json"]),
+        )
+        uploaded = server.depositions[1]["files"]["tool4_3.json"]
+        self.assertEqual(json.loads(uploaded), record)
+        self.assertEqual(store.names(), [])
+        store.close()
+
+    @mock.patch(
+        "boutiques.dataHandler.getDataCacheDir",
+        return_value=mock_get_data_cache(),
+    )
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_single())
+    @mock.patch("boutiques.httpClient.post", side_effect=mock_post_publish_single())
     def test_publish_individual(self, mock_dir, mock_get, mock_post):
         bosh(
             [
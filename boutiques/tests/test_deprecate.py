@@ -24,6 +24,10 @@ def mock_get(*args, **kwargs):
     split = args[0].split("/")
     assert len(split) >= 5
 
+    # Descriptor download
+    if args[0] == example_boutiques_tool.filename:
+        return MockHttpResponse(200, loadJson(BaseTest.example1_descriptor))
+
     command = split[4]
     # Records command
     if command == "records":
@@ -87,10 +91,10 @@ def mock_download_deprecated(url, file_path):
     return [f.name]
 
 
-@mock.patch("requests.get", side_effect=mock_get)
-@mock.patch("requests.post", side_effect=mock_post)
-@mock.patch("requests.put", side_effect=mock_zenodo_test_api)
-@mock.patch("requests.delete", side_effect=mock_zenodo_delete_files)
+@mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+@mock.patch("boutiques.httpClient.post", side_effect=mock_post)
+@mock.patch("boutiques.httpClient.put", side_effect=mock_zenodo_test_api)
+@mock.patch("boutiques.httpClient.delete", side_effect=mock_zenodo_delete_files)
 class TestDeprecate(BaseTest):
     def test_deprecate(self, *args):
         new_doi = bosh(
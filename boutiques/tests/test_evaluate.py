@@ -4,7 +4,7 @@ import os
 from unittest import mock
 
 import pytest
-from boutiques_mocks import example_boutiques_tool, mock_get
+from boutiques_mocks import example_boutiques_tool, mock_get_records
 
 import boutiques as bosh
 from boutiques import __file__ as bfile
@@ -56,7 +56,7 @@ class TestEvaluate(BaseTest):
         expect = {}
         self.assertEqual(query, expect)
 
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_evaloutput_from_zenodo(self, _):
         desc = "zenodo." + str(example_boutiques_tool.id)
         invo = self.get_file_path("invocation.json")
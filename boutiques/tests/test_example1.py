@@ -8,7 +8,7 @@ from unittest import mock
 
 import pytest
 import simplejson as json
-from boutiques_mocks import example_boutiques_tool, mock_get
+from boutiques_mocks import example_boutiques_tool, mock_get_records
 
 import boutiques as bosh
 from boutiques import __file__ as bfile
@@ -290,7 +290,7 @@ class TestExample1(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_example1_exec_docker_from_zenodo(self, _):
         invoc = os.path.join(
             os.path.dirname(bfile),
@@ -326,7 +326,7 @@ class TestExample1(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_example1_exec_docker_from_zenodo_debug(self, _):
         invoc = os.path.join(
             os.path.dirname(bfile),
@@ -356,7 +356,7 @@ class TestExample1(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_example1_exec_docker_from_zenodo_desc2func_default(self, _):
         # No mode provided, defaults to 'launch'
         example_tool = function("zenodo." + str(example_boutiques_tool.id))
@@ -380,7 +380,7 @@ class TestExample1(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_example1_exec_docker_from_zenodo_desc2func_launch(self, _):
         # Launch mode
         example_tool = function("zenodo." + str(example_boutiques_tool.id))
@@ -405,7 +405,7 @@ class TestExample1(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_example1_exec_docker_from_zenodo_desc2func_simulate(self, _):
         # Simulate with invocation
         example_tool = function("zenodo." + str(example_boutiques_tool.id))
@@ -425,7 +425,7 @@ class TestExample1(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_example1_exec_docker_from_zenodo_desc2func_simNoInvoc(self, _):
         # Simulate without invocation
         example_tool = function("zenodo." + str(example_boutiques_tool.id))
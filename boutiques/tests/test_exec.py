@@ -1,13 +1,29 @@
 #!/usr/bin/env python
 
+import asyncio
+import datetime
+import hashlib
 import os
+import time
+from unittest import mock
 
 import pytest
+import simplejson as json
 
 import boutiques as bosh
-from boutiques import __file__ as bfile
-from boutiques.localExec import ExecutorError
+from boutiques import __file__ as bfile, fileHashing
+from boutiques.containerEngines import clearEngineCache, findContainerEngine
+from boutiques.dataHandler import DataStore
+from boutiques.fileHashing import HASH_ALGORITHMS, HASH_CHUNK_SIZE, hashFiles
+from boutiques.invocationSchemaHandler import InvocationValidationError
+from boutiques.localExec import (
+    BatchScheduler,
+    ExecutorError,
+    LocalExecutor,
+    hostResources,
+)
 from boutiques.tests.BaseTest import BaseTest
+from boutiques.util.utils import computeMD5, loadJson
 
 
 class TestExec(BaseTest):
@@ -68,3 +84,466 @@ class TestExec(BaseTest):
         if os.path.exists("test_baremetal_exec.txt"):
             os.remove("test_baremetal_exec.txt")
         self.assertEqual(stdout, "Bare metal execution\n")
+
+    def test_cache_results(self):
+        outs = [os.path.join(self.test_temp, f"cached{i}.txt") for i in range(2)]
+        runs = os.path.join(self.test_temp, "runs.txt")
+        descriptor = loadJson(self.get_file_path("test_baremetal.json"))
+        descriptor["command-line"] = (
+            f"echo run >> {runs}; " + descriptor["command-line"]
+        )
+        descriptor["output-files"][0]["path-template"] = "[FILENAME]"
+
+        def launch(out):
+            return bosh.execute(
+                "launch",
+                "--no-container",
+                "--skip-data-collection",
+                "--cache-results",
+                json.dumps(descriptor),
+                json.dumps({"fileName": out}),
+            )
+
+        def count_runs():
+            with open(runs) as fhandle:
+                return fhandle.read().count("run")
+
+        def read(out):
+            with open(out) as fhandle:
+                return fhandle.read()
+
+        with mock.patch(
+            "boutiques.resultCache.getResultCacheDir",
+            return_value=os.path.join(self.test_temp, "results"),
+        ):
+            self.assertFalse(launch(outs[0]).cached)
+
+            # Cached outputs modified through the stored file are detected
+            with open(outs[0], "a") as fhandle:
+                fhandle.write("modified\n")
+            self.assertFalse(launch(outs[0]).cached)
+            self.assertFalse(launch(outs[1]).cached)
+            self.assertEqual(count_runs(), 3)
+
+            # The outputs are restored without running the tool again
+            for out in outs:
+                os.remove(out)
+            for out in outs:
+                restored = launch(out)
+                self.assertTrue(restored.cached)
+                self.assertEqual(restored.stdout, "Bare metal execution\n")
+                self.assertEqual(restored.missing_files, [])
+                self.assertEqual(read(out), "Bare metal execution\n")
+            self.assertEqual(count_runs(), 3)
+
+            # Outputs restored from the same object are independent copies
+            with open(outs[0], "a") as fhandle:
+                fhandle.write("modified\n")
+            self.assertEqual(read(outs[1]), "Bare metal execution\n")
+            os.remove(outs[1])
+            self.assertTrue(launch(outs[1]).cached)
+            self.assertEqual(read(outs[1]), "Bare metal execution\n")
+            self.assertEqual(count_runs(), 3)
+
+    def test_file_hashing(self):
+        data = os.path.join(self.test_temp, "data")
+        os.makedirs(os.path.join(data, "sub"), exist_ok=True)
+        contents = {"a.nii": b"a" * (HASH_CHUNK_SIZE + 1), "sub/b.nii": b"b"}
+        for name, content in contents.items():
+            with open(os.path.join(data, name), "wb") as fhandle:
+                fhandle.write(content)
+        paths = [os.path.join(data, name) for name in contents]
+        for algorithm in HASH_ALGORITHMS:
+            expected = [
+                hashlib.new(algorithm, c).hexdigest() for c in contents.values()
+            ]
+            self.assertEqual(hashFiles(paths, algorithm), dict(zip(paths, expected)))
+            self.assertEqual(
+                hashFiles(paths, algorithm, workers=1)[paths[1]], expected[1]
+            )
+
+        # Data-capture records name the digest used
+        executor = self.get_async_executor("echo [STR]")
+        executor.hashAlgorithm = "sha256"
+        pending = []
+        public = executor._buildPublicFile(data, pending)
+        executor._hashPublicFiles(pending)
+        self.assertEqual(public["file-name"], "data")
+        digests = [f.get("sha256sum") for f in public["files"] if "sha256sum" in f]
+        self.assertEqual(digests, [hashlib.sha256(contents["a.nii"]).hexdigest()])
+
+    def test_hash_cache(self):
+        paths = [os.path.join(self.test_temp, f"input_{i}.nii") for i in range(3)]
+        for path in paths:
+            with open(path, "w") as fhandle:
+                fhandle.write(path)
+            os.utime(path, (time.time() - 60, time.time() - 60))
+        with mock.patch(
+            "boutiques.fileHashing.getHashCacheFile",
+            return_value=os.path.join(self.test_temp, "hashes.sqlite"),
+        ), mock.patch(
+            "boutiques.fileHashing._computeDigest", wraps=fileHashing._computeDigest
+        ) as compute:
+            digests = fileHashing.hashFiles(paths)
+            self.assertEqual(compute.call_count, 3)
+            # Unchanged files are not hashed again
+            self.assertEqual(fileHashing.hashFiles(paths), digests)
+            self.assertEqual(computeMD5(paths[0]), digests[paths[0]])
+            self.assertEqual(compute.call_count, 3)
+
+            # Modified files are hashed again, recently modified files
+            # are not cached
+            with open(paths[0], "a") as fhandle:
+                fhandle.write("modified")
+            for _ in range(2):
+                fileHashing.hashFiles(paths)
+            self.assertEqual(compute.call_count, 5)
+
+            # Least recently used digests are evicted
+            with mock.patch("boutiques.fileHashing.HASH_CACHE_SIZE", 1):
+                fileHashing.hashFiles(paths[1:2], "sha256")
+            fileHashing.hashFiles(paths)
+            self.assertEqual(compute.call_count, 9)
+
+    def test_descriptor_cache(self):
+        cache_dir = os.path.join(self.test_temp, "data")
+        os.makedirs(cache_dir)
+        with mock.patch(
+            "boutiques.dataHandler.getDataCacheDir", return_value=cache_dir
+        ), mock.patch(
+            "boutiques.localExec.getDataCacheDir", return_value=cache_dir
+        ), mock.patch(
+            "boutiques.localExec.datetime"
+        ) as clock:
+            # Records of executions finishing at the same time are all kept
+            clock.datetime.now.return_value = datetime.datetime(2024, 1, 1)
+            for _ in range(3):
+                bosh.execute(
+                    "launch",
+                    "--no-container",
+                    self.get_file_path("test_baremetal.json"),
+                    json.dumps({"fileName": os.path.join(self.test_temp, "a.txt")}),
+                )
+            store = DataStore()
+            records = [store.get(name) for name in store.names()]
+            store.close()
+        # Unpublished descriptors are saved once
+        self.assertEqual(
+            os.listdir(cache_dir), [records[0]["summary"]["descriptor-doi"]]
+        )
+        self.assertEqual(len(records), 3)
+        self.assertEqual(len({r["summary"]["descriptor-doi"] for r in records}), 1)
+
+    def test_batch_execution(self):
+        jsonl = os.path.join(self.test_temp, "invocations.jsonl")
+        with open(jsonl, "w") as fhandle:
+            for i in range(3):
+                out = os.path.join(self.test_temp, f"batch_{i}.txt")
+                fhandle.write(json.dumps({"fileName": out}) + "\n")
+        csv = os.path.join(self.test_temp, "invocations.csv")
+        with open(csv, "w") as fhandle:
+            fhandle.write("fileName\n")
+            fhandle.write(os.path.join(self.test_temp, "batch_csv.txt") + "\n")
+
+        for invocations, count in [(jsonl, 3), (csv, 1)]:
+            out = bosh.execute(
+                "launch",
+                "--no-container",
+                "--skip-data-collection",
+                "--workers",
+                "2",
+                self.get_file_path("test_baremetal.json"),
+                invocations,
+            )
+            self.assertEqual(out.exit_code, 0)
+            self.assertEqual(out.summary()["invocations"], count)
+            self.assertEqual(out.summary()["succeeded"], count)
+            for output in out.outputs.values():
+                self.assertEqual(output.stdout, "Bare metal execution\n")
+        self.assertTrue(os.path.exists(os.path.join(self.test_temp, "batch_2.txt")))
+
+    def test_batch_execution_invalid(self):
+        jsonl = os.path.join(self.test_temp, "invocations.jsonl")
+        with open(jsonl, "w") as fhandle:
+            fhandle.write(json.dumps({"fileName": "a.txt"}) + "\n")
+            fhandle.write(json.dumps({"fileName": 3}) + "\n")
+        with self.assertRaises(InvocationValidationError) as e:
+            bosh.execute(
+                "launch",
+                "--no-container",
+                "--skip-data-collection",
+                self.get_file_path("test_baremetal.json"),
+                jsonl,
+            )
+        self.assertIn("invocations.jsonl:2", str(e.exception))
+        self.assertFalse(os.path.exists("a.txt"))
+
+    def test_batch_scheduler(self):
+        desc = loadJson(self.get_file_path("test_baremetal.json"))
+        cores, ram = hostResources()
+        self.assertEqual(BatchScheduler.computeSlots(desc), cores)
+        self.assertEqual(BatchScheduler.computeSlots(desc, 1), 1)
+        desc["suggested-resources"] = {"cpu-cores": cores + 1}
+        self.assertEqual(BatchScheduler.computeSlots(desc, 4), 1)
+        if ram is not None:
+            desc["suggested-resources"] = {"ram": ram * 2}
+            self.assertEqual(BatchScheduler.computeSlots(desc), 1)
+
+    def test_batch_execution_fail_fast_and_logs(self):
+        jsonl = os.path.join(self.test_temp, "invocations.jsonl")
+        logs = os.path.join(self.test_temp, "logs")
+        with open(jsonl, "w") as fhandle:
+            # The first invocation fails: its directory does not exist
+            fhandle.write(json.dumps({"fileName": "/nonexistent/out.txt"}) + "\n")
+            for i in range(3):
+                out = os.path.join(self.test_temp, f"batch_{i}.txt")
+                fhandle.write(json.dumps({"fileName": out}) + "\n")
+
+        out = bosh.execute(
+            "launch",
+            "--no-container",
+            "--skip-data-collection",
+            "--workers",
+            "1",
+            "--fail-fast",
+            "--log-dir",
+            logs,
+            self.get_file_path("test_baremetal.json"),
+            jsonl,
+        )
+        self.assertNotEqual(out.exit_code, 0)
+        self.assertEqual(out.summary()["skipped"], 3)
+        self.assertEqual(len(out.outputs), 1)
+        first = out.outputs["invocations.jsonl:1"]
+        self.assertEqual(first.stderr, "")
+        with open(first.stderr_file) as fhandle:
+            self.assertIn("nonexistent", fhandle.read())
+        self.assertEqual(os.path.dirname(first.stdout_file), logs)
+
+    def test_batch_environment_variables(self):
+        descriptor = os.path.join(self.test_temp, "env.json")
+        with open(descriptor, "w") as fhandle:
+            json.dump(
+                {
+                    "name": "test_env",
+                    "tool-version": "1.0",
+                    "description": "Test environment variables",
+                    "command-line": "sleep 0.1; echo $BOSH_TEST_VAR",
+                    "schema-version": "0.5",
+                    "environment-variables": [
+                        {"name": "BOSH_TEST_VAR", "value": "[STR]"}
+                    ],
+                    "inputs": [
+                        {
+                            "id": "str_input",
+                            "name": "str_input",
+                            "type": "String",
+                            "value-key": "[STR]",
+                        }
+                    ],
+                },
+                fhandle,
+            )
+        jsonl = os.path.join(self.test_temp, "invocations.jsonl")
+        with open(jsonl, "w") as fhandle:
+            for i in range(4):
+                fhandle.write(json.dumps({"str_input": f"value{i}"}) + "\n")
+
+        out = bosh.execute(
+            "launch",
+            "--no-container",
+            "--skip-data-collection",
+            "--workers",
+            "4",
+            descriptor,
+            jsonl,
+        )
+        # Each invocation sees its own variables, which are not set in
+        # the environment of the process
+        for i in range(4):
+            output = out.outputs[f"invocations.jsonl:{i + 1}"]
+            self.assertEqual(output.stdout, f"value{i}\n")
+        self.assertNotIn("BOSH_TEST_VAR", os.environ)
+
+    def get_async_executor(self, command):
+        descriptor = {
+            "name": "test_async",
+            "tool-version": "1.0",
+            "description": "Test asynchronous execution",
+            "command-line": command,
+            "schema-version": "0.5",
+            "inputs": [
+                {
+                    "id": "str_input",
+                    "name": "str_input",
+                    "type": "String",
+                    "value-key": "[STR]",
+                }
+            ],
+        }
+        return LocalExecutor(
+            json.dumps(descriptor),
+            json.dumps({"str_input": "hello"}),
+            {
+                "skipDataCollect": True,
+                "sandbox": False,
+                "noContainer": True,
+                "forceDocker": False,
+                "forceSingularity": False,
+                "forceApptainer": False,
+                "stream": False,
+            },
+        )
+
+    def test_execute_async(self):
+        lines = []
+        executors = [
+            self.get_async_executor("echo [STR]; echo bye >&2") for _ in range(5)
+        ]
+
+        async def run():
+            return await asyncio.gather(
+                *[
+                    e.executeAsync([], onOutput=lambda n, line: lines.append((n, line)))
+                    for e in executors
+                ]
+            )
+
+        for output in asyncio.run(run()):
+            self.assertEqual(output.exit_code, 0)
+            self.assertEqual(output.stdout, "hello\n")
+            self.assertEqual(output.stderr, "bye\n")
+        self.assertEqual(lines.count(("stdout", "hello\n")), 5)
+        self.assertEqual(lines.count(("stderr", "bye\n")), 5)
+
+    def test_execute_async_timeout_and_cancel(self):
+        executor = self.get_async_executor("echo [STR]; sleep 30")
+        start = time.time()
+        with self.assertRaises(ExecutorError) as e:
+            asyncio.run(executor.executeAsync([], timeout=0.5))
+        self.assertIn("timed out", str(e.exception))
+
+        async def cancel():
+            task = asyncio.ensure_future(executor.executeAsync([]))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cancel())
+        self.assertLess(time.time() - start, 10)
+
+    def test_output_wait(self):
+        # Required outputs are found: no waiting
+        start = time.time()
+        ret = bosh.execute(
+            "launch",
+            self.get_file_path("no_container.json"),
+            self.get_file_path("no_container_invocation.json"),
+            "--skip-data-collection",
+            "--output-wait",
+            "5",
+        )
+        self.assertEqual(ret.exit_code, 0)
+        self.assertEqual(ret.missing_files, [])
+        self.assertLess(time.time() - start, 2)
+
+        # Required output is missing: waits at most for the ceiling
+        out = os.path.join(self.test_temp, "bare.txt")
+        start = time.time()
+        ret = bosh.execute(
+            "launch",
+            "--no-container",
+            "--skip-data-collection",
+            "--output-wait",
+            "0.3",
+            self.get_file_path("test_baremetal.json"),
+            json.dumps({"fileName": out}),
+        )
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(len(ret.missing_files), 1)
+
+    def test_container_engine_cache(self):
+        bindir = os.path.join(self.test_temp, "bin")
+        os.makedirs(bindir, exist_ok=True)
+        engine = os.path.join(bindir, "fakengine")
+        calls = os.path.join(self.test_temp, "calls.txt")
+        with open(engine, "w") as fhandle:
+            fhandle.write(f"#!/bin/sh\necho probed >> {calls}\necho fakengine 1.0\n")
+        os.chmod(engine, 0o755)
+        cache_file = os.path.join(self.test_temp, "engines.json")
+
+        with mock.patch.dict(os.environ, {"PATH": bindir}), mock.patch(
+            "boutiques.containerEngines.getEngineCacheFile", return_value=cache_file
+        ):
+            clearEngineCache()
+            self.assertIsNone(findContainerEngine("docker"))
+            found = findContainerEngine("fakengine")
+            self.assertEqual(found.path, os.path.realpath(engine))
+            self.assertIsNone(found.version)
+            self.assertFalse(os.path.exists(calls))
+
+            # The version probe runs once and is then read from disk
+            for _ in range(2):
+                found = findContainerEngine("fakengine", probeVersion=True)
+                self.assertEqual(found.version, "fakengine 1.0")
+                clearEngineCache()
+            with open(calls) as fhandle:
+                self.assertEqual(fhandle.read().count("probed"), 1)
+            self.assertIn(os.path.realpath(engine), loadJson(cache_file))
+
+            # Expired entries are probed again
+            findContainerEngine("fakengine", probeVersion=True, ttl=0)
+            with open(calls) as fhandle:
+                self.assertEqual(fhandle.read().count("probed"), 2)
+            clearEngineCache(onDisk=True)
+            self.assertFalse(os.path.exists(cache_file))
+
+    def test_container_session(self):
+        bindir = os.path.join(self.test_temp, "bin")
+        os.makedirs(bindir, exist_ok=True)
+        calls = os.path.join(self.test_temp, "calls.txt")
+        # Fake docker running "docker exec" commands on the host
+        with open(os.path.join(bindir, "docker"), "w") as fhandle:
+            fhandle.write(
+                "#!/bin/sh\n"
+                f"echo $1 >> {calls}\n"
+                'case "$1" in\n'
+                '  image) echo \'[{"Id": "sha256:1"}]\' ;;\n'
+                "  run) echo fakecontainer ;;\n"
+                "  exec) while [ $1 != fakecontainer ]; do shift; done\n"
+                '    shift; exec "$@" ;;\n'
+                "esac\n"
+            )
+        os.chmod(os.path.join(bindir, "docker"), 0o755)
+        jsonl = os.path.join(self.test_temp, "invocations.jsonl")
+        with open(jsonl, "w") as fhandle:
+            for i in range(3):
+                out = os.path.join(self.test_temp, f"session_{i}.txt")
+                fhandle.write(json.dumps({"fileName": out}) + "\n")
+        path = bindir + os.pathsep + os.environ["PATH"]
+
+        with mock.patch.dict(os.environ, {"PATH": path}), mock.patch(
+            "boutiques.containerImages.getImageCacheFile",
+            return_value=os.path.join(self.test_temp, "images.json"),
+        ):
+            clearEngineCache()
+            out = bosh.execute(
+                "launch",
+                "--skip-data-collection",
+                "--session",
+                "--workers",
+                "2",
+                self.get_file_path("test_baremetal.json"),
+                jsonl,
+            )
+            clearEngineCache()
+        self.assertEqual(out.exit_code, 0)
+        for output in out.outputs.values():
+            self.assertEqual(output.stdout, "Bare metal execution\n")
+            self.assertIn("docker exec", output.container_command)
+        with open(calls) as fhandle:
+            calls = fhandle.read().split()
+        self.assertEqual(calls.count("run"), 1)
+        self.assertEqual(calls.count("exec"), 3)
+        self.assertEqual(calls[-1], "rm")
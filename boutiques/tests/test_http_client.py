@@ -0,0 +1,89 @@
+import io
+from unittest import mock
+
+import pytest
+
+from boutiques import httpClient
+from boutiques.tests.BaseTest import BaseTest
+from boutiques.tests.boutiques_mocks import MockHttpServer
+
+requests = pytest.importorskip("requests")
+
+
+@mock.patch("boutiques.httpClient.HTTP_BACKOFF", 0.01)
+class TestHttpClient(BaseTest):
+    @pytest.fixture(autouse=True)
+    def set_test_dir(self):
+        httpClient.resetHttpStats()
+        yield
+        httpClient.configure()
+
+    def test_retry(self):
+        responses = [(503, {}, 0), (429, {"Retry-After": "0"}, 0), (201, {}, 0)]
+        with MockHttpServer(responses) as server:
+            r = httpClient.put(server.endpoint + "/file", data=io.BytesIO(b"data"))
+        self.assertEqual(r.status_code, 201)
+        # File bodies are sent again with each retry
+        self.assertEqual(server.requests, [("PUT", b"data")] * 3)
+        stats = httpClient.httpStats()
+        self.assertEqual((stats["requests"], stats["retries"]), (1, 2))
+
+        # The last response is returned once retries are exhausted
+        httpClient.configure(retries=2)
+        with MockHttpServer([(500, {}, 0)]) as server:
+            r = httpClient.get(server.endpoint)
+        self.assertEqual(r.status_code, 500)
+        self.assertEqual(len(server.requests), 3)
+
+        # Other errors are not retried
+        with MockHttpServer([(404, {}, 0), (200, {}, 0)]) as server:
+            r = httpClient.delete(server.endpoint)
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_retry_post(self):
+        # POST requests are only retried if requested
+        with MockHttpServer([(503, {}, 0), (201, {}, 0)]) as server:
+            r = httpClient.post(server.endpoint, data=b"data")
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(len(server.requests), 1)
+
+        # Multipart files are sent again with each retry
+        files = {"file": ("a.json", io.BytesIO(b'{"content": 1}'))}
+        with MockHttpServer([(503, {}, 0), (201, {}, 0)]) as server:
+            r = httpClient.post(server.endpoint, files=files, retry=True)
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(len(server.requests), 2)
+        for _, body in server.requests:
+            self.assertIn(b'{"content": 1}', body)
+
+    def test_retry_delay(self):
+        r = requests.Response()
+        self.assertEqual(httpClient._retryDelay(r, 0.5), 0.5)
+        r.headers["Retry-After"] = "3"
+        self.assertEqual(httpClient._retryDelay(r, 0.5), 3)
+        r.headers["Retry-After"] = "86400"
+        self.assertEqual(
+            httpClient._retryDelay(r, 0.5), httpClient.HTTP_MAX_RETRY_DELAY
+        )
+        r.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+        self.assertEqual(httpClient._retryDelay(r, 0.5), 0.5)
+
+    def test_timeout_and_stats(self):
+        httpClient.configure(timeout=0.2)
+        with MockHttpServer([(200, {}, 0), (200, {}, 1)]) as server:
+            httpClient.get(server.endpoint)
+            with self.assertRaises(requests.Timeout):
+                httpClient.post(server.endpoint)
+        stats = httpClient.httpStats()
+        self.assertEqual((stats["requests"], stats["errors"]), (2, 1))
+        host = stats["hosts"][server.endpoint.split("/")[-1]]
+        self.assertEqual(host["requests"], 2)
+        self.assertGreaterEqual(host["max-latency"], 0.2)
+        self.assertLess(host["mean-latency"], host["max-latency"])
+
+        with mock.patch.dict("os.environ", {httpClient.HTTP_TIMEOUT_VARIABLE: "5"}):
+            self.assertEqual(httpClient.getTimeout(), 0.2)
+            httpClient.configure()
+            self.assertEqual(httpClient.getTimeout(), 5)
+        self.assertEqual(httpClient.getTimeout(), httpClient.HTTP_TIMEOUT)
@@ -4,6 +4,7 @@ import os
 import subprocess
 
 import pytest
+import simplejson as json
 
 from boutiques import __file__ as bfile
 from boutiques.bosh import bosh
@@ -36,3 +37,38 @@ class TestInvocation(BaseTest):
         )
         process.communicate()
         self.assertTrue(process.returncode)
+
+    def test_invocation_batch(self):
+        descriptor = self.get_file_path("good.json")
+        with open(self.get_file_path("good_invocation.json")) as fhandle:
+            good = json.load(fhandle)
+        bad = dict(good, dti_file=3)
+        del bad["outdir"]
+        batch_dir = os.path.join(self.test_temp, "batch")
+        os.makedirs(batch_dir)
+        jsonl = os.path.join(self.test_temp, "invocations.jsonl")
+        with open(jsonl, "w") as jsonl_handle:
+            for name, inv in [("a.json", good), ("b.json", bad), ("c.json", good)]:
+                with open(os.path.join(batch_dir, name), "w") as fhandle:
+                    json.dump(inv, fhandle)
+                jsonl_handle.write(json.dumps(inv) + "\n")
+
+        for batch, workers in [
+            (batch_dir, []),
+            (os.path.join(batch_dir, "*.json"), []),
+            (jsonl, ["--workers", "2"]),
+        ]:
+            report = bosh(["invocation", descriptor, "-i", batch] + workers)
+            self.assertEqual([r["valid"] for r in report], [True, False, True])
+            self.assertEqual(len(report[1]["errors"]), 2)
+            self.assertIn("dti_file: 3 is not of type 'string'", report[1]["errors"])
+        self.assertEqual(report[1]["invocation"], "invocations.jsonl:2")
+
+        command = "bosh invocation " + descriptor + " -i " + batch_dir
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE)
+        stdout = process.communicate()[0].decode("utf-8")
+        self.assertEqual(process.returncode, 1)
+        lines = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(
+            [line["invocation"] for line in lines], ["a.json", "b.json", "c.json"]
+        )
@@ -50,7 +50,7 @@ class TestLogger(BaseTest):
             )
         self.assertIn("[ ERROR ]", str(e.getrepr(style="long")))
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
     def test_print_info(self, mock_get):
         bosh.search("-v")
         out, err = self.capfd.readouterr()
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
 import os
+import socket
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 import pytest
@@ -10,28 +13,15 @@ from boutiques_mocks import *
 
 import boutiques as bosh
 from boutiques import __file__ as bfile
+from boutiques.containerEngines import clearEngineCache
+from boutiques.containerImages import ImageLock
 from boutiques.localExec import ExecutorError
 from boutiques.tests.BaseTest import BaseTest
-
-
-def mock_mkdir():
-    return [OSError("cannot mkdir"), None]
-
-
-def mock_mkdir_timeout():
-    return OSError("cannot mkdir")
-
-
-def mock_sleep():
-    return None
-
-
-def mock_clean_up():
-    return None
+from boutiques.util.utils import loadJson
 
 
 def mock_exists():
-    return [False, True]
+    return [False, True, True]
 
 
 def mock_sing_pull():
@@ -107,25 +97,19 @@ class TestPrepare(BaseTest):
             )
         self.assertIn("Could not pull Singularity image", str(e.getrepr(style="long")))
 
-    @mock.patch("os.mkdir", side_effect=mock_mkdir())
+    @mock.patch("boutiques.containerImages.ImageLock._tryLock", return_value=False)
     @mock.patch(
         "boutiques.localExec.LocalExecutor._singConExists",
         side_effect=mock_exists(),
     )
-    @mock.patch(
-        "boutiques.localExec.LocalExecutor._cleanUpAfterSingPull",
-        side_effect=mock_clean_up(),
-    )
     @pytest.mark.skipif(
         subprocess.Popen("type singularity", shell=True).wait(),
         reason="Singularity not installed",
     )
-    def test_prepare_sing_multiple_processes(
-        self, mock_mkdir, mock_exists, mock_clean_up
-    ):
+    def test_prepare_sing_multiple_processes(self, mock_try_lock, mock_exists):
         # Specify path for image that does not exist.
-        # Mock that another process created the image at that path
-        # while this process was waiting.
+        # Mock that another process holds the lock and created the image
+        # at that path while this process was waiting.
         ret = bosh.execute(
             "prepare",
             self.get_file_path("example1_sing.json"),
@@ -134,15 +118,14 @@ class TestPrepare(BaseTest):
         )
         self.assertIn("Local (boutiques-example1-test.simg)", ret.stdout)
 
-    @mock.patch("os.mkdir", side_effect=mock_mkdir_timeout())
-    @mock.patch("time.sleep", side_effect=mock_sleep())
+    @mock.patch("boutiques.containerImages.ImageLock.acquire", return_value=False)
     @pytest.mark.skipif(
         subprocess.Popen("type singularity", shell=True).wait(),
         reason="Singularity not installed",
     )
-    def test_prepare_sing_timeout(self, mock_mkdir, mock_sleep):
+    def test_prepare_sing_timeout(self, mock_acquire):
         # Specify path for image that does not exist.
-        # Mock that another process has the lockdir and this one
+        # Mock that another process holds the lock and this one
         # times out while waiting.
         with pytest.raises(ExecutorError) as e:
             bosh.execute(
@@ -156,8 +139,7 @@ class TestPrepare(BaseTest):
             str(e.getrepr(style="long")),
         )
 
-    @mock.patch("os.mkdir", side_effect=mock_mkdir_timeout())
-    @mock.patch("time.sleep", side_effect=mock_sleep())
+    @mock.patch("boutiques.containerImages.ImageLock.acquire", return_value=False)
     @mock.patch(
         "boutiques.localExec.LocalExecutor._singConExists",
         side_effect=mock_exists(),
@@ -166,9 +148,9 @@ class TestPrepare(BaseTest):
         subprocess.Popen("type singularity", shell=True).wait(),
         reason="Singularity not installed",
     )
-    def test_prepare_sing_timeout_success(self, mock_mkdir, mock_sleep, mock_exists):
+    def test_prepare_sing_timeout_success(self, mock_acquire, mock_exists):
         # Specify path for image that does not exist.
-        # Mock that another process has the lockdir and this one
+        # Mock that another process holds the lock and this one
         # times out while waiting, but image was created by the
         # other process.
         ret = bosh.execute(
@@ -179,6 +161,48 @@ class TestPrepare(BaseTest):
         )
         self.assertIn("Local (boutiques-example1-test.simg)", ret.stdout)
 
+    def test_image_lock(self):
+        image = os.path.join(self.test_temp, "image.simg")
+        lock = ImageLock(image)
+        self.assertTrue(lock.acquire())
+        self.assertEqual(lock.owner(), f"{socket.gethostname()}:{os.getpid()}")
+        # Waiters return as soon as the image exists, or on timeout
+        self.assertFalse(ImageLock(image).acquire(lambda: True))
+        start = time.time()
+        self.assertFalse(ImageLock(image, timeout=0.2).acquire())
+        self.assertLess(time.time() - start, 2)
+        lock.release()
+        self.assertFalse(os.path.exists(lock.path))
+
+        # Lock files left by dead processes are broken
+        dead = subprocess.Popen(["true"])
+        dead.wait()
+        with open(lock.path, "w") as fhandle:
+            fhandle.write(f"{socket.gethostname()}:{dead.pid}")
+        lock._breakIfStale()
+        self.assertFalse(os.path.exists(lock.path))
+        with ImageLock(image) as lock:
+            self.assertTrue(lock.acquire())
+        self.assertFalse(os.path.exists(lock.path))
+
+    def test_image_lock_threads(self):
+        image = os.path.join(self.test_temp, "image.simg")
+        holders = []
+
+        # Threads of a process exclude each other like processes do
+        def pull(i):
+            for _ in range(20):
+                with ImageLock(image) as lock:
+                    self.assertTrue(lock.acquire())
+                    holders.append(i)
+                    time.sleep(0.001)
+                    self.assertEqual(holders, [i])
+                    holders.remove(i)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(pull, range(8)))
+        self.assertEqual(os.listdir(self.test_temp), [])
+
     @mock.patch(
         "boutiques.localExec.LocalExecutor._localExecute",
         side_effect=mock_sing_pull(),
@@ -202,6 +226,46 @@ class TestPrepare(BaseTest):
             ret.stdout,
         )
 
+    def test_prepare_docker_image_cache(self):
+        bindir = os.path.join(self.test_temp, "bin")
+        os.makedirs(bindir, exist_ok=True)
+        calls = os.path.join(self.test_temp, "calls.txt")
+        pulled = os.path.join(self.test_temp, "pulled")
+        with open(os.path.join(bindir, "docker"), "w") as fhandle:
+            fhandle.write(
+                "#!/bin/sh\n"
+                f"echo $1 >> {calls}\n"
+                'if [ "$1" = image ]; then\n'
+                f"  [ -f {pulled} ] || exit 1\n"
+                '  echo \'[{"Id": "sha256:1", "RepoDigests": ["i@sha256:2"]}]\'\n'
+                f"else touch {pulled}; fi\n"
+            )
+        os.chmod(os.path.join(bindir, "docker"), 0o755)
+        cache_file = os.path.join(self.test_temp, "docker-images.json")
+        path = bindir + os.pathsep + os.environ["PATH"]
+
+        with mock.patch.dict(os.environ, {"PATH": path}), mock.patch(
+            "boutiques.containerImages.getImageCacheFile", return_value=cache_file
+        ):
+            clearEngineCache()
+            ret = bosh.execute("prepare", self.example1_descriptor)
+            self.assertIn("Pulled from Docker", ret.stdout)
+            ret = bosh.execute("prepare", self.example1_descriptor)
+            self.assertIn("Local copy", ret.stdout)
+            with open(calls) as fhandle:
+                self.assertEqual(
+                    fhandle.read().split(), ["image", "pull", "image", "image"]
+                )
+            image = loadJson(self.example1_descriptor)["container-image"]["image"]
+            self.assertEqual(loadJson(cache_file)[image]["digest"], "sha256:2")
+
+            # Expired tags are pulled again
+            ret = bosh.execute(
+                "prepare", self.example1_descriptor, "--image-freshness", "0"
+            )
+            self.assertIn("Pulled from Docker", ret.stdout)
+            clearEngineCache()
+
     def test_prepare_no_container(self):
         self.setup("exec")
         ret = bosh.execute("prepare", self.get_file_path("no_container.json"))
@@ -74,10 +74,12 @@ class TestPublisher(BaseTest):
     def set_test_dir(self):
         self.setup("publisher")
 
-    @mock.patch("requests.get", side_effect=mock_get_publish_then_update())
-    @mock.patch("requests.post", side_effect=mock_post_publish_then_update())
-    @mock.patch("requests.put", return_value=mock_zenodo_test_api())
-    @mock.patch("requests.delete", return_value=mock_zenodo_delete_files())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_then_update())
+    @mock.patch(
+        "boutiques.httpClient.post", side_effect=mock_post_publish_then_update()
+    )
+    @mock.patch("boutiques.httpClient.put", return_value=mock_zenodo_test_api())
+    @mock.patch("boutiques.httpClient.delete", return_value=mock_zenodo_delete_files())
     def test_publication(self, mock_get, mock_post, mock_put, mock_delete):
         example1_desc = self.example1_descriptor
         temp_descriptor = tempfile.NamedTemporaryFile(suffix=".json")
@@ -147,7 +149,7 @@ class TestPublisher(BaseTest):
             self.assertNotEqual(new_doi, doi)
             self.assertEqual(descriptor_updated.get("doi"), new_doi)
 
-    @mock.patch("requests.get", return_value=mock_zenodo_test_api_fail())
+    @mock.patch("boutiques.httpClient.get", return_value=mock_zenodo_test_api_fail())
     def test_publisher_auth(self, mock_get):
         test_desc = self.example1_descriptor
         # Bad token should fail
@@ -184,10 +186,12 @@ class TestPublisher(BaseTest):
         process.communicate()
         self.assertTrue(process.returncode)
 
-    @mock.patch("requests.get", side_effect=mock_get_publish_bulk())
-    @mock.patch("requests.post", side_effect=mock_post_publish_update_only())
-    @mock.patch("requests.put", return_value=mock_zenodo_test_api())
-    @mock.patch("requests.delete", return_value=mock_zenodo_delete_files())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_bulk())
+    @mock.patch(
+        "boutiques.httpClient.post", side_effect=mock_post_publish_update_only()
+    )
+    @mock.patch("boutiques.httpClient.put", return_value=mock_zenodo_test_api())
+    @mock.patch("boutiques.httpClient.delete", return_value=mock_zenodo_delete_files())
     def test_publication_replace_with_id(
         self, mock_get, mock_post, mock_put, mock_delete
     ):
@@ -307,10 +311,12 @@ class TestPublisher(BaseTest):
             " contain a DOI" in str(e.exception)
         )
 
-    @mock.patch("requests.get", side_effect=mock_get_publish_bulk())
-    @mock.patch("requests.post", side_effect=mock_post_publish_update_only())
-    @mock.patch("requests.put", return_value=mock_zenodo_test_api())
-    @mock.patch("requests.delete", return_value=mock_zenodo_delete_files())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_bulk())
+    @mock.patch(
+        "boutiques.httpClient.post", side_effect=mock_post_publish_update_only()
+    )
+    @mock.patch("boutiques.httpClient.put", return_value=mock_zenodo_test_api())
+    @mock.patch("boutiques.httpClient.delete", return_value=mock_zenodo_delete_files())
     def test_publication_replace_no_id(
         self, mock_get, mock_post, mock_put, mock_delete
     ):
@@ -347,8 +353,8 @@ class TestPublisher(BaseTest):
             self.assertNotEqual(doi, old_doi)
             self.assertEqual(descriptor.get("doi"), doi)
 
-    @mock.patch("requests.get", side_effect=mock_get_publish_bulk())
-    @mock.patch("requests.post", return_value=mock_zenodo_no_permission())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_bulk())
+    @mock.patch("boutiques.httpClient.post", return_value=mock_zenodo_no_permission())
     def test_publisher_auth_no_permission(self, mock_get, mock_post):
         # Trying to update a tool published by a different
         # user should inform the user that they do not
@@ -372,10 +378,12 @@ class TestPublisher(BaseTest):
             str(e.exception),
         )
 
-    @mock.patch("requests.get", side_effect=mock_get_publish_then_update())
-    @mock.patch("requests.post", side_effect=mock_post_publish_then_update())
-    @mock.patch("requests.put", return_value=mock_zenodo_test_api())
-    @mock.patch("requests.delete", return_value=mock_zenodo_delete_files())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_publish_then_update())
+    @mock.patch(
+        "boutiques.httpClient.post", side_effect=mock_post_publish_then_update()
+    )
+    @mock.patch("boutiques.httpClient.put", return_value=mock_zenodo_test_api())
+    @mock.patch("boutiques.httpClient.delete", return_value=mock_zenodo_delete_files())
     def test_publication_toolname_forwardslash(
         self, mock_get, mock_post, mock_put, mock_delete
     ):
@@ -1,41 +1,32 @@
-import json
 import os
-import tempfile
+import stat
 from unittest import mock
-from urllib.request import urlopen, urlretrieve
 
-from boutiques_mocks import MockZenodoRecord, example_boutiques_tool, mock_zenodo_search
+from boutiques_mocks import MockZenodoRecord, example_boutiques_tool, mock_get_records
 
 from boutiques.bosh import bosh
-from boutiques.puller import ZenodoError
+from boutiques.puller import Puller, ZenodoError
 from boutiques.tests.BaseTest import BaseTest
+from boutiques.util.utils import loadJson
 
-
-def mock_urlretrieve(*args, **kwargs):
-    mock_record1 = example_boutiques_tool
-    mock_record2 = MockZenodoRecord(
-        2587160,
-        "makeblastdb_foo",
-        "",
-        "https://zenodo.org/api/files/"
-        "d861b2cd-ec68-4613-9847-1911904a1218/"
-        "makeblastdb.json",
-    )
-    temp = tempfile.NamedTemporaryFile(delete=False, mode="w+t")
-    if str(example_boutiques_tool.id) in args[0]:
-        json.dump(mock_zenodo_search([mock_record1]).mock_json, temp)
-        temp.close()
-        return urlretrieve(f"file://{temp.name}", args[1])
-    if "makeblastdb.json" in args[0]:
-        json.dump(mock_zenodo_search([mock_record2]).mock_json, temp)
-        temp.close()
-        return urlretrieve(f"file://{temp.name}", args[1])
-    return urlretrieve(args[0], args[1])
+mock_get = mock_get_records(
+    [
+        example_boutiques_tool,
+        MockZenodoRecord(
+            2587160,
+            "makeblastdb_foo",
+            "",
+            "https://zenodo.org/api/files/"
+            "d861b2cd-ec68-4613-9847-1911904a1218/"
+            "makeblastdb.json",
+        ),
+    ]
+)
 
 
 class TestPull(BaseTest):
-    @mock.patch("boutiques.puller.urlretrieve", side_effect=mock_urlretrieve)
-    def test_pull(self, mock_urlretrieve):
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull(self, mock_get):
         bosh(["pull", "zenodo." + str(example_boutiques_tool.id)])
         cache_dir = os.path.join(
             os.path.expanduser("~"), ".cache", "boutiques", "production"
@@ -49,8 +40,8 @@ class TestPull(BaseTest):
             )
         )
 
-    @mock.patch("boutiques.puller.urlretrieve", side_effect=mock_urlretrieve)
-    def test_pull_multi(self, mock_urlretrieve):
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull_multi(self, mock_get):
         results = bosh(
             [
                 "pull",
@@ -72,8 +63,8 @@ class TestPull(BaseTest):
         self.assertTrue(os.path.exists(os.path.join(cache_dir, "zenodo-2587160.json")))
         self.assertEqual(len(results), 2, results)
 
-    @mock.patch("boutiques.puller.urlretrieve", side_effect=mock_urlretrieve)
-    def test_pull_duplicate_collapses(self, mock_urlretrieve):
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull_duplicate_collapses(self, mock_get):
         results = bosh(
             [
                 "pull",
@@ -84,8 +75,8 @@ class TestPull(BaseTest):
         )
         self.assertEqual(len(results), 2, results)
 
-    @mock.patch("boutiques.puller.urlretrieve", side_effect=mock_urlretrieve)
-    def test_pull_missing_raises_exception(self, mock_urlretrieve):
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull_missing_raises_exception(self, mock_get):
         good1 = "zenodo." + str(example_boutiques_tool.id)
         good2 = "zenodo.2587160"
         bad1 = "zenodo.9999990"
@@ -96,14 +87,43 @@ class TestPull(BaseTest):
             str(e.exception),
         )
 
-    @mock.patch("boutiques.puller.urlretrieve", side_effect=mock_urlretrieve)
-    def test_pull_missing_prefix(self, mock_urlretrieve):
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull_missing_prefix(self, mock_get):
         with self.assertRaises(ZenodoError) as e:
             bosh(["pull", str(example_boutiques_tool.id)])
         self.assertIn("Zenodo ID must be prefixed by 'zenodo'", str(e.exception))
 
-    @mock.patch("boutiques.puller.urlretrieve", side_effect=mock_urlretrieve)
-    def test_pull_not_found(self, mock_urlretrieve):
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull_not_found(self, mock_get):
         with self.assertRaises(ZenodoError) as e:
             bosh(["pull", "zenodo.99999"])
         self.assertIn('Descriptor "99999" not found', str(e.exception))
+
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get)
+    def test_pull_empty_cache(self, mock_get):
+        zids = [str(example_boutiques_tool.id), "2587160"]
+        home = os.path.join(self.test_temp, "home")
+        umask = os.umask(0o022)
+        try:
+            with mock.patch.dict(os.environ, {"HOME": home}):
+                puller = Puller([f"zenodo.{zid}" for zid in zids], workers=2)
+                results = puller.pull()
+        finally:
+            os.umask(umask)
+        # Descriptors are readable by the users sharing the cache
+        for result in results:
+            self.assertEqual(stat.S_IMODE(os.stat(result).st_mode), 0o644)
+        self.assertEqual(os.path.commonpath([home, puller.cache_dir]), home)
+        self.assertEqual(results, [e["fname"] for e in puller.zenodo_entries])
+        self.assertEqual(sorted(puller.timings), sorted(zids))
+        self.assertEqual(loadJson(results[1]), loadJson(self.example1_descriptor))
+        # Descriptors are written through temporary files
+        self.assertEqual(
+            [f for f in os.listdir(puller.cache_dir) if f.endswith(".tmp")], []
+        )
+
+        # Cached descriptors are not downloaded again
+        mock_get.reset_mock()
+        with mock.patch.dict(os.environ, {"HOME": home}):
+            self.assertEqual(Puller([f"zenodo.{zids[1]}"]).pull(), results[1:])
+        mock_get.assert_not_called()
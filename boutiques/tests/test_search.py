@@ -43,7 +43,7 @@ def mock_get(query, exact, *args, include_version=True, **kwargs):
 
 class TestSearch(BaseTest):
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get("", False, *args, **kwargs),
     )
     def test_search_all(self, mymockget):
@@ -55,7 +55,7 @@ class TestSearch(BaseTest):
         )
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "Example Tool 5", False, *args, **kwargs
         ),
@@ -68,7 +68,7 @@ class TestSearch(BaseTest):
         self.assertIn("Example Tool 5-bar", [d["TITLE"] for d in results])
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "Example Tool 5", True, *args, **kwargs
         ),
@@ -81,7 +81,7 @@ class TestSearch(BaseTest):
         self.assertNotIn("Example Tool 5-bar", [d["TITLE"] for d in results])
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get("", False, *args, **kwargs),
     )
     def test_search_verbose(self, mymockget):
@@ -106,7 +106,7 @@ class TestSearch(BaseTest):
         )
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "boutiques", False, *args, **kwargs
         ),
@@ -137,7 +137,7 @@ class TestSearch(BaseTest):
         self.assertEqual(results[0]["VERSION"], "unknown")
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "boutiques", False, *args, **kwargs
         ),
@@ -147,7 +147,7 @@ class TestSearch(BaseTest):
         self.assertEqual(len(results), 20)
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "boutiques", False, *args, **kwargs
         ),
@@ -160,7 +160,7 @@ class TestSearch(BaseTest):
         self.assertEqual(sorted(downloads, reverse=True), downloads)
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "boutiques", False, *args, **kwargs
         ),
@@ -172,7 +172,7 @@ class TestSearch(BaseTest):
                 self.assertLessEqual(len(str(v)), 43)
 
     @mock.patch(
-        "requests.get",
+        "boutiques.httpClient.get",
         side_effect=lambda *args, **kwargs: mock_get(
             "boutiques", False, *args, **kwargs
         ),
@@ -10,7 +10,7 @@ import simplejson as json
 from boutiques_mocks import (
     MockZenodoRecord,
     example_boutiques_tool,
-    mock_get,
+    mock_get_records,
     mock_zenodo_search,
 )
 
@@ -40,7 +40,7 @@ class TestSimulate(BaseTest):
         desc_json = open(self.example1_descriptor).read()
         self.assertFalse(bosh.execute("simulate", desc_json).exit_code)
 
-    @mock.patch("requests.get", return_value=mock_get())
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_success_desc_from_zenodo(self, mock_get):
         self.assertFalse(
             bosh.execute(
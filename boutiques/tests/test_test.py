@@ -4,7 +4,7 @@ import subprocess
 from unittest import mock
 
 import pytest
-from boutiques_mocks import example_boutiques_tool, mock_zenodo_search
+from boutiques_mocks import example_boutiques_tool, mock_get_records
 from jsonschema.exceptions import ValidationError
 
 from boutiques import bosh
@@ -36,10 +36,7 @@ class TestTest(BaseTest):
         subprocess.Popen("type docker", shell=True).wait(),
         reason="Docker not installed",
     )
-    @mock.patch(
-        "requests.get",
-        return_value=mock_zenodo_search([example_boutiques_tool]),
-    )
+    @mock.patch("boutiques.httpClient.get", side_effect=mock_get_records())
     def test_test_good_from_zenodo(self, mock_get):
         self.assertFalse(bosh(["test", "zenodo." + str(example_boutiques_tool.id)]))
 
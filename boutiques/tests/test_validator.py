@@ -1,12 +1,30 @@
 #!/usr/bin/env python
 
+import os
+import shutil
 import subprocess
+import time
+from unittest import mock
 
 import pytest
 
+import boutiques as bosh_module
 from boutiques.bosh import bosh
+from boutiques.invocationSchemaHandler import (
+    InvocationValidationError,
+    generateInvocationSchema,
+    getInvocationValidator,
+    validateSchema,
+)
 from boutiques.tests.BaseTest import BaseTest
-from boutiques.validator import DescriptorValidationError
+from boutiques.util.utils import loadJson
+from boutiques.validator import (
+    DescriptorValidationError,
+    clearValidationCache,
+    getDescriptorSchemaValidator,
+    getValidatedDescriptor,
+    validate_descriptor,
+)
 
 
 class TestValidator(BaseTest):
@@ -19,6 +37,26 @@ class TestValidator(BaseTest):
         fil = self.get_file_path("good.json")
         self.assertIsNone(bosh(["validate", "--format", fil]))
 
+    def test_format_list_tags(self):
+        fil = os.path.join(self.test_temp, "fsl_bet.json")
+        shutil.copy(
+            os.path.join(
+                os.path.dirname(bosh_module.__file__),
+                "schema",
+                "examples",
+                "fsl_bet",
+                "fsl_bet.json",
+            ),
+            fil,
+        )
+        descriptor = loadJson(fil)
+        self.assertIsNone(bosh(["validate", "--format", fil]))
+        formatted = loadJson(fil)
+        self.assertEqual(formatted["tags"], descriptor["tags"])
+        self.assertEqual(formatted["name"], descriptor["name"])
+        # Keys are sorted in the order of the template
+        self.assertEqual(list(formatted)[:3], ["name", "author", "description"])
+
     def test_success_cli(self):
         self.setup("invocation")
         fil = self.get_file_path("good.json")
@@ -80,3 +118,128 @@ class TestValidator(BaseTest):
                 ' "shub://"'
             ),
         )
+
+    def test_validation_cache(self):
+        clearValidationCache()
+        desc = loadJson(self.example1_descriptor)
+        with mock.patch(
+            "boutiques.validator.validate_descriptor", wraps=validate_descriptor
+        ) as validate:
+            validated = getValidatedDescriptor(desc)
+            same = loadJson(self.example1_descriptor)
+            self.assertIs(getValidatedDescriptor(same), validated)
+            bosh_module.invocation(self.example1_descriptor)
+            bosh_module.example(self.example1_descriptor)
+            self.assertEqual(validate.call_count, 1)
+
+            # Modified descriptors are validated again
+            desc["description"] = "Modified"
+            self.assertIsNot(getValidatedDescriptor(desc), validated)
+            self.assertEqual(validate.call_count, 2)
+
+        self.assertNotEqual(validated.descriptor["description"], "Modified")
+        self.assertIs(validated.invocationValidator, validated.invocationValidator)
+        with self.assertRaises(InvocationValidationError):
+            validated.validateInvocation({"str_input_list": "not a list"})
+        clearValidationCache()
+
+    def test_compiled_validators(self):
+        self.assertIs(getDescriptorSchemaValidator(), getDescriptorSchemaValidator())
+        desc = loadJson(self.example1_descriptor)
+        schema = generateInvocationSchema(desc)
+        validator = getInvocationValidator(schema)
+        self.assertIs(getInvocationValidator(generateInvocationSchema(desc)), validator)
+
+        # The schema is only checked when its validator is compiled
+        invocation = loadJson(
+            os.path.join(os.path.dirname(self.example1_descriptor), "invocation.json")
+        )
+        with mock.patch("jsonschema.Draft4Validator.check_schema") as check_schema:
+            for i in range(100):
+                validateSchema(schema, invocation)
+            self.assertFalse(check_schema.called)
+        invocation["str_input"] = 3
+        with self.assertRaises(InvocationValidationError):
+            validateSchema(schema, invocation)
+
+    def test_invocation_schema_disk_cache(self):
+        cache_dir = os.path.join(self.test_temp, "invocation-schemas")
+        desc = loadJson(self.example1_descriptor)
+        with mock.patch(
+            "boutiques.invocationSchemaHandler.getSchemaCacheDir",
+            return_value=cache_dir,
+        ):
+            clearValidationCache()
+            schema = getValidatedDescriptor(desc).invocationSchema
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # Cold calls read the schema instead of generating it
+            clearValidationCache()
+            with mock.patch(
+                "boutiques.validator.generateInvocationSchema"
+            ) as generate, mock.patch(
+                "jsonschema.Draft4Validator.check_schema"
+            ) as check_schema:
+                validated = getValidatedDescriptor(desc)
+                self.assertEqual(validated.invocationSchema, schema)
+                validated.invocationValidator
+                self.assertFalse(generate.called)
+                self.assertFalse(check_schema.called)
+
+            # Least recently used schemas are evicted
+            with mock.patch("boutiques.invocationSchemaHandler.SCHEMA_CACHE_SIZE", 2):
+                for i in range(3):
+                    desc["description"] = str(i)
+                    getValidatedDescriptor(desc).invocationSchema
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            clearValidationCache()
+
+    def get_large_descriptor(self, size):
+        inputs = [
+            {
+                "id": f"in_{i}",
+                "name": f"in {i}",
+                "type": "String",
+                "value-key": f"[IN_{i}]",
+            }
+            for i in range(size)
+        ]
+        outputs = [
+            {"id": f"out_{i}", "name": f"out {i}", "path-template": f"[IN_{i}].txt"}
+            for i in range(size)
+        ]
+        return {
+            "name": "large",
+            "tool-version": "1.0",
+            "description": "Tool with many inputs",
+            "schema-version": "0.5",
+            "command-line": "tool " + " ".join(i["value-key"] for i in inputs),
+            "inputs": inputs,
+            "output-files": outputs,
+        }
+
+    def test_validation_scaling(self):
+        # Benchmark: run with -s to see the timings
+        for size in [10, 100, 1000, 5000]:
+            desc = self.get_large_descriptor(size)
+            start = time.time()
+            validate_descriptor(desc)
+            duration = time.time() - start
+            print(f"Validated {size} inputs in {duration:.3f}s")
+            self.assertLess(duration, 30)
+
+            desc["inputs"][-1]["value-key"] = "[IN_0]X"
+            desc["command-line"] += " [IN_0]X"
+            desc["inputs"][-1]["id"] = "in_0"
+            desc["output-files"][1]["path-template"] = "[IN_0].txt"
+            with self.assertRaises(DescriptorValidationError) as e:
+                validate_descriptor(desc)
+            self.assertEqual(
+                str(e.exception).split("\n"),
+                [
+                    '   KeyError: "[IN_0]X" contains "[IN_0]"',
+                    '    IdError: "in_0" is non-unique',
+                    'OutputError: "out_0" and "out_1" have the same path-template',
+                    'OutputError: "out_1" and "out_0" have the same path-template',
+                ],
+            )
@@ -1,9 +1,13 @@
+import hashlib
 import os
+import pickle
+import threading
 from collections import OrderedDict
 
 import simplejson as json
 
-from boutiques import __file__ as bfile
+from boutiques import __file__ as bfile, jsonBackend
+from boutiques.fileHashing import computeDigest
 from boutiques.logger import print_warning, raise_error
 
 
@@ -40,8 +44,22 @@ class LoadError(Exception):
     pass
 
 
+# Maximum number of parsed JSON documents memoized by loadJson
+LOAD_JSON_CACHE_SIZE = 64
+
+# Parsed documents are stored pickled, so that callers cannot modify them
+# through the objects returned by loadJson. Unpickling a document is
+# also faster than parsing it again.
+_loadedJson = OrderedDict()
+_loadedJsonLock = threading.Lock()
+_loadJsonStats = {"hits": 0, "misses": 0}
+
+
 # Helper function that loads the JSON object coming from either a string,
-# a local file or a file pulled from Zenodo
+# a local file or a file pulled from Zenodo, with the JSON backend of
+# jsonBackend (dicts keep the order of the keys). Parsed objects are memoized
+# by path, modification time and size for files, and by content hash for
+# strings. Each call returns a new object that callers may modify.
 def loadJson(userInput, verbose=False, sandbox=False):
     # Check for JSON file (local or from Zenodo)
     json_file = None
@@ -53,8 +71,15 @@ def loadJson(userInput, verbose=False, sandbox=False):
         puller = Puller([userInput], verbose, sandbox)
         json_file = puller.pull()[0]
     if json_file is not None:
+        stat = os.stat(json_file)
+        key = (os.path.realpath(json_file), stat.st_mtime_ns, stat.st_size)
+        cached = _getLoadedJson(key)
+        if cached is not None:
+            return cached
         with open(json_file) as f:
-            return OrderedDict(json.loads(f.read(), object_pairs_hook=OrderedDict))
+            loaded = dict(jsonBackend.loads(f.read()))
+        _setLoadedJson(key, loaded)
+        return loaded
     # JSON file not found, so try to parse JSON object
     e = (
         "Cannot parse input {}: file not found, "
@@ -62,10 +87,55 @@ def loadJson(userInput, verbose=False, sandbox=False):
     ).format(userInput)
     if userInput.isdigit():
         raise_error(LoadError, e)
+    key = hashlib.sha256(userInput.encode("utf-8", "surrogatepass")).hexdigest()
+    cached = _getLoadedJson(key)
+    if cached is not None:
+        return cached
     try:
-        return OrderedDict(json.loads(userInput, object_pairs_hook=OrderedDict))
+        loaded = dict(jsonBackend.loads(userInput))
     except ValueError:
         raise_error(LoadError, e)
+    _setLoadedJson(key, loaded)
+    return loaded
+
+
+# Returns the numbers of loadJson calls that reused a memoized object
+# (hits) and that parsed their input (misses)
+def loadJsonStats():
+    with _loadedJsonLock:
+        return dict(_loadJsonStats)
+
+
+# Forgets the objects memoized by loadJson and resets its statistics
+def clearLoadJsonCache():
+    with _loadedJsonLock:
+        _loadedJson.clear()
+        _loadJsonStats.update(hits=0, misses=0)
+
+
+def _getLoadedJson(key):
+    with _loadedJsonLock:
+        pickled = _loadedJson.get(key)
+        if pickled is None:
+            _loadJsonStats["misses"] += 1
+            return None
+        _loadedJson.move_to_end(key)
+        _loadJsonStats["hits"] += 1
+    return pickle.loads(pickled)
+
+
+def _setLoadedJson(key, loaded):
+    pickled = pickle.dumps(loaded, protocol=pickle.HIGHEST_PROTOCOL)
+    with _loadedJsonLock:
+        _loadedJson[key] = pickled
+        while len(_loadedJson) > LOAD_JSON_CACHE_SIZE:
+            _loadedJson.popitem(last=False)
+
+
+# Hashes files with MD5,
+# capable of handling large data files
+def computeMD5(filepath):
+    return computeDigest(filepath, "md5")
 
 
 # Helper function that takes a conditional path template key as input,
@@ -101,6 +171,9 @@ def customSortDescriptorByKey(
     def sortListedObjects(objList, template):
         sortedObjList = []
         for obj in objList:
+            if not isinstance(obj, dict):
+                sortedObjList.append(obj)
+                continue
             sortedObj = OrderedDict()
             for key in template:
                 if key in obj:
@@ -122,17 +195,25 @@ def customSortDescriptorByKey(
     template = loadJson(template)
     sortedDesc = OrderedDict()
 
-    # Add k:v to sortedDesc according to their order in template
+    # Add k:v to sortedDesc according to their order in template.
+    # Values are only sorted where the template describes their objects,
+    # e.g. not the lists of tags, which the template lists as strings.
     for key in template:
         if key in descriptor:
-            if type(descriptor[key]) is list:
-                sortedDesc[key] = sortListedObjects(descriptor[key], template[key][0])
-            elif type(descriptor[key]) is dict:
+            value, templateValue = descriptor[key], template[key]
+            if (
+                isinstance(value, list)
+                and isinstance(templateValue, list)
+                and templateValue
+                and isinstance(templateValue[0], dict)
+            ):
+                sortedDesc[key] = sortListedObjects(value, templateValue[0])
+            elif isinstance(value, dict) and isinstance(templateValue, dict):
                 sortedDesc[key] = customSortDescriptorByKey(
-                    descriptor[key], template=json.dumps(template[key])
+                    value, template=json.dumps(templateValue)
                 )
             else:
-                sortedDesc[key] = descriptor[key]
+                sortedDesc[key] = value
 
     # Add remaining k:v that are missing from template
     for key in descriptor:
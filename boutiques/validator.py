@@ -1,14 +1,30 @@
 #!/usr/bin/env python
 
+import copy
+import hashlib
 import keyword
 import os.path as op
 import re
+import threading
 from argparse import ArgumentParser
+from collections import Counter, OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
+import jsonschema
 import simplejson as json
-from jsonschema import ValidationError, validate
+from jsonschema import ValidationError
 
 from boutiques import __file__ as bfile
+from boutiques.invocationSchemaHandler import (
+    InvocationValidationError,
+    cacheInvocationSchema,
+    generateInvocationSchema,
+    getCachedInvocationSchema,
+    getInvocationValidator,
+    validateSchema,
+)
 from boutiques.logger import print_info, raise_error
 from boutiques.util.utils import (
     conditionalExpFormat,
@@ -22,17 +38,89 @@ class DescriptorValidationError(ValidationError):
     pass
 
 
+# Returns the validator of the descriptor schema, which is loaded and
+# checked once per process
+@lru_cache(maxsize=None)
+def getDescriptorSchemaValidator():
+    path, fil = op.split(bfile)
+    schema_file = op.join(path, "schema", "descriptor.schema.json")
+    with open(schema_file) as fhandle:
+        schema = json.load(fhandle)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    # jsonschema compares all pairs of items, e.g. of inputs
+    uniqueItems = validator_class.VALIDATORS["uniqueItems"]
+
+    def linearUniqueItems(validator, uI, instance, schema):
+        if uI and validator.is_type(instance, "array"):
+            try:
+                if len({_uniqueKey(item) for item in instance}) == len(instance):
+                    return
+            except TypeError:
+                pass
+        # Possible duplicates are reported by jsonschema
+        yield from uniqueItems(validator, uI, instance, schema)
+
+    validator_class = jsonschema.validators.extend(
+        validator_class, {"uniqueItems": linearUniqueItems}
+    )
+    return validator_class(schema)
+
+
+# Hashable key of a JSON value, equal for values that jsonschema
+# considers equal (e.g. 1 and 1.0, but not 1 and true)
+def _uniqueKey(item):
+    if isinstance(item, str):
+        return ("s", item)
+    if isinstance(item, bool):
+        return ("b", item)
+    if isinstance(item, Mapping):
+        return ("m", frozenset((k, _uniqueKey(v)) for k, v in item.items()))
+    if isinstance(item, Sequence):
+        return ("l", tuple(_uniqueKey(v) for v in item))
+    return ("v", item)
+
+
+# For each key, returns the sorted indices of the other keys it contains.
+# The substrings of each key are looked up in a hash table of all the
+# keys, for the key lengths only, instead of comparing all pairs of keys.
+def _containedKeys(keys):
+    positions = {}
+    for idx, key in enumerate(keys):
+        positions.setdefault(key, []).append(idx)
+    lengths = sorted({len(key) for key in positions})
+    containedByKey = {}
+    for key in positions:
+        substrings = set()
+        for length in lengths:
+            if length >= len(key):
+                break
+            for start in range(len(key) - length + 1):
+                end = start + length
+                substrings.add(key[start:end])
+        containedByKey[key] = sorted(
+            idx for sub in substrings if sub in positions for idx in positions[sub]
+        )
+    return [containedByKey[key] for key in keys]
+
+
+# Yields each value with the number of times it appears after this
+# occurrence
+def _laterDuplicates(values):
+    remaining = Counter(values)
+    for value in values:
+        remaining[value] -= 1
+        yield value, remaining[value]
+
+
 # Main validation module
 def validate_descriptor(descriptor, **kwargs):
     """
     Validates the Boutiques descriptor against the schema.
     """
-    path, fil = op.split(bfile)
-    schema_file = op.join(path, "schema", "descriptor.schema.json")
-
     # Load schema
-    with open(schema_file) as fhandle:
-        schema = json.load(fhandle)
+    schema_validator = getDescriptorSchemaValidator()
+    schema = schema_validator.schema
 
     # Load input types according to the schema
     schema_types = schema["properties"]["inputs"]["items"]["properties"]["type"]["enum"]
@@ -41,10 +129,9 @@ def validate_descriptor(descriptor, **kwargs):
 
     # Validate basic JSON schema compliance for descriptor
     # Note: if it fails basic schema compliance we don"t do more checks
-    try:
-        validate(descriptor, schema)
-    except ValidationError as e:
-        raise_error(DescriptorValidationError, (str(e)))
+    error = jsonschema.exceptions.best_match(schema_validator.iter_errors(descriptor))
+    if error is not None:
+        raise_error(DescriptorValidationError, (str(error)))
 
     # Helper get functions
     def safeGet(desc, sec, targ):
@@ -63,10 +150,13 @@ def validate_descriptor(descriptor, **kwargs):
     def groupGet(s):
         return safeGet(descriptor, "groups", s)
 
+    # Inputs indexed by id, keeping the first one for duplicated ids
+    inputsById = {}
+    for inp in descriptor["inputs"]:
+        inputsById.setdefault(inp.get("id"), inp)
+
     def inById(i):
-        if i in inputGet("id"):
-            return descriptor["inputs"][inputGet("id").index(i)]
-        return {}
+        return inputsById.get(i, {})
 
     def isValidConditionalExp(exp):
         # Return the type of a conditional expression's substring
@@ -146,56 +236,47 @@ def validate_descriptor(descriptor, **kwargs):
     if descriptor.get("environment-variables"):
         for env in descriptor.get("environment-variables"):
             envValues += "||" + env["value"]
-    errors += [
-        msg_template.format(k)
-        for k in clkeys
-        if ((cmdline + ".".join(configFileTemplates) + envValues).count(k)) < 1
-    ]
+    keyLocations = cmdline + ".".join(configFileTemplates) + envValues
+    errors += [msg_template.format(k) for k in clkeys if k not in keyLocations]
 
     # Verify that no key contains another key
     msg_template = '   KeyError: "{0}" contains "{1}"'
-    errors += [
-        msg_template.format(key, clkeys[jdx])
-        for idx, key in enumerate(clkeys)
-        for jdx in range(0, len(clkeys))
-        if clkeys[jdx] in key and key != clkeys[jdx]
-    ]
+    for key, contained in zip(clkeys, _containedKeys(clkeys)):
+        errors += [msg_template.format(key, clkeys[jdx]) for jdx in contained]
 
     # Verify that all Ids are unique
     inIds, outIds = inputGet("id"), outputGet("id")
     grpIds = groupGet("id") if "groups" in descriptor.keys() else []
     allIds = inIds + outIds + grpIds
+    inIdSet = set(inIds)
     msg_template = '    IdError: "{0}" is non-unique'
-    for idx, s1 in enumerate(allIds):
-        for jdx, s2 in enumerate(allIds):
-            if s1 == s2 and idx < jdx:
-                errors += [msg_template.format(s1)]
-            else:
-                errors += []
+    for s1, duplicates in _laterDuplicates(allIds):
+        errors += [msg_template.format(s1)] * duplicates
 
     # Verify that identical keys only exist if they are both in mutex groups
     msg_template = ' MutExError: "{0}" belongs to 2+ non exclusive IDs'
-    for idx, key in enumerate(clkeys):
-        for jdx in range(idx + 1, len(clkeys)):
-            if clkeys[jdx] == key:
-                mids = [
-                    inById(mid)["id"]
-                    for mid in inIds
-                    if inById(mid)["value-key"] == key
-                ]
-                for idx, grp in enumerate(descriptor.get("groups")):
-                    mutex = grp.get("mutually-exclusive")
-                    if set(grp["members"]) == set(mids) and not mutex:
-                        errors += [msg_template.format(key)]
+    idsByKey = {}
+    for mid in inIds:
+        idsByKey.setdefault(inById(mid).get("value-key"), []).append(mid)
+    nonExclusiveGroups = {}
+    for grp in descriptor.get("groups") or []:
+        if not grp.get("mutually-exclusive"):
+            members = frozenset(grp["members"])
+            nonExclusiveGroups[members] = nonExclusiveGroups.get(members, 0) + 1
+    for key, duplicates in _laterDuplicates(clkeys):
+        if duplicates:
+            mids = frozenset(idsByKey.get(key, []))
+            count = nonExclusiveGroups.get(mids, 0)
+            errors += [msg_template.format(key)] * (count * duplicates)
 
     # Verify that output files have unique path-templates
     msg_template = 'OutputError: "{0}" and "{1}" have the same ' "path-template"
-    for ix, o1 in zip(outputGet("id"), outputGet("path-template")):
-        for jx, o2 in zip(outputGet("id"), outputGet("path-template")):
-            if o1 == o2 and jx != ix:
-                errors += [msg_template.format(ix, jx)]
-            else:
-                errors += []
+    outputTemplates = list(zip(outputGet("id"), outputGet("path-template")))
+    idsByTemplate = {}
+    for ix, o1 in outputTemplates:
+        idsByTemplate.setdefault(o1, []).append(ix)
+    for ix, o1 in outputTemplates:
+        errors += [msg_template.format(ix, jx) for jx in idsByTemplate[o1] if jx != ix]
 
     if "output-files" in descriptor:
         # Verify output file with non-optional conditional file template
@@ -360,7 +441,7 @@ def validate_descriptor(descriptor, **kwargs):
             errors += [
                 msg_template.format(inp["id"], ids)
                 for ids in inp["requires-inputs"]
-                if ids not in inIds + grpIds
+                if ids not in inIdSet and ids not in grpIds
             ]
 
         # Verify disables-inputs (present ids, non-overlapping)
@@ -369,7 +450,7 @@ def validate_descriptor(descriptor, **kwargs):
             errors += [
                 msg_template.format(inp["id"], ids)
                 for ids in inp["disables-inputs"]
-                if ids not in inIds
+                if ids not in inIdSet
             ]
 
         if "requires-inputs" in inp.keys() and "disables-inputs" in inp.keys():
@@ -387,7 +468,7 @@ def validate_descriptor(descriptor, **kwargs):
             errors += [
                 msg_template.format(inp["id"], ids)
                 for ids in inp["disables-inputs"]
-                if ids in inIds and not inById(ids).get("optional")
+                if ids in inIdSet and not inById(ids).get("optional")
             ]
 
         # Verify required inputs cannot require or disable other parameters
@@ -437,7 +518,7 @@ def validate_descriptor(descriptor, **kwargs):
                         msg_template.format(inp["id"], param, ids)
                         for ids in inp[param].values()
                         for item in ids
-                        if item not in inIds
+                        if item not in inIdSet
                     ]
 
                     # Verify not requiring or disabling required inputs
@@ -461,7 +542,7 @@ def validate_descriptor(descriptor, **kwargs):
         errors += [
             msg_template.format(grp["id"], member)
             for member in grp["members"]
-            if member not in inIds
+            if member not in inIdSet
         ]
 
         msg_template = ' GroupError: "{0}" member "{1}" appears twice'
@@ -527,7 +608,7 @@ def validate_descriptor(descriptor, **kwargs):
             errors += [
                 msg_template.format(grp["id"], member)
                 for member in set(grp["members"])
-                if member in inIds and not inById(member)["optional"]
+                if member in inIdSet and not inById(member)["optional"]
             ]
 
             for jdx, grp2 in enumerate(descriptor["groups"]):
@@ -560,7 +641,7 @@ def validate_descriptor(descriptor, **kwargs):
             errors += [
                 msg_template.format(grp["id"], member)
                 for member in set(grp["members"])
-                if member in inIds and not inById(member)["optional"]
+                if member in inIdSet and not inById(member)["optional"]
             ]
 
     # Verify tests
@@ -627,10 +708,148 @@ def validate_descriptor(descriptor, **kwargs):
     errors = None if errors == [] else errors
     if errors is None:
         if kwargs.get("format_output") and kwargs.get("descriptor_path"):
+            # The descriptor is formatted before its file is truncated
+            formatted = json.dumps(customSortDescriptorByKey(descriptor), indent=4)
             with open(kwargs.get("descriptor_path"), "w") as fhandle:
-                fhandle.write(
-                    json.dumps(customSortDescriptorByKey(descriptor), indent=4)
-                )
+                fhandle.write(formatted)
         return descriptor
     else:
         raise DescriptorValidationError("\n".join(errors))
+
+
+# Number of validated descriptors kept by getValidatedDescriptor
+VALIDATION_CACHE_SIZE = 128
+
+_validatedDescriptors = OrderedDict()
+_validatedDescriptorsLock = threading.Lock()
+
+
+class ValidatedDescriptor:
+    """
+    A descriptor that passed validate_descriptor, with its invocation
+    schema and a validator for its invocations. Both are computed the
+    first time they are needed and then reused for all invocations.
+    """
+
+    def __init__(self, descriptor, digest):
+        self.descriptor = descriptor
+        self.hash = digest
+        self._invocationSchema = None
+        self._invocationValidator = None
+        self._lock = threading.Lock()
+
+    # The invocation schema embedded in the descriptor, or generated
+    # from it. Generated schemas are cached on disk, see
+    # getCachedInvocationSchema.
+    @property
+    def invocationSchema(self):
+        with self._lock:
+            if self._invocationSchema is None:
+                schema = self.descriptor.get("invocation-schema")
+                if schema:
+                    validateSchema(schema)
+                else:
+                    schema = getCachedInvocationSchema(self.hash)
+                if not schema:
+                    schema = generateInvocationSchema(self.descriptor)
+                    cacheInvocationSchema(self.hash, schema)
+                self._invocationSchema = schema
+            return self._invocationSchema
+
+    @property
+    def invocationValidator(self):
+        schema = self.invocationSchema
+        with self._lock:
+            if self._invocationValidator is None:
+                # The schema was checked when it was generated or loaded
+                self._invocationValidator = getInvocationValidator(schema, checked=True)
+            return self._invocationValidator
+
+    # Raises an InvocationValidationError if the invocation (with default
+    # values already added) does not comply with the invocation schema
+    def validateInvocation(self, invocation):
+        error = jsonschema.exceptions.best_match(
+            self.invocationValidator.iter_errors(invocation)
+        )
+        if error is not None:
+            raise_error(InvocationValidationError, error)
+
+    # Validates a list of (name, invocation) tuples, with default values
+    # already added, without stopping at invalid invocations. With more
+    # than one worker, invocations are validated in a pool of processes
+    # that compile the invocation schema once each.
+    # Returns one report entry per invocation, in order, e.g.
+    # {"invocation": name, "valid": False, "errors": [messages]}
+    def validateInvocations(self, invocations, workers=None):
+        names = [name for (name, invocation) in invocations]
+        data = [invocation for (name, invocation) in invocations]
+        if workers is not None and workers > 1 and len(data) > 1:
+            with ProcessPoolExecutor(
+                workers,
+                initializer=_initInvocationWorker,
+                initargs=(self.invocationSchema,),
+            ) as pool:
+                chunksize = max(1, len(data) // (workers * 4))
+                errors = list(pool.map(_workerErrors, data, chunksize=chunksize))
+        else:
+            validator = self.invocationValidator
+            errors = [invocationErrors(validator, invocation) for invocation in data]
+        return [
+            {"invocation": name, "valid": not errs, "errors": errs}
+            for (name, errs) in zip(names, errors)
+        ]
+
+
+# Returns the messages of all the errors of an invocation, prefixed by
+# the location of the invalid value if any (e.g. "list_input/0: ...")
+def invocationErrors(validator, invocation):
+    messages = []
+    for error in validator.iter_errors(invocation):
+        path = "/".join(str(p) for p in error.absolute_path)
+        messages.append(f"{path}: {error.message}" if path else error.message)
+    return messages
+
+
+# Invocation validator of the worker processes of validateInvocations
+_workerValidator = None
+
+
+def _initInvocationWorker(schema):
+    global _workerValidator
+    _workerValidator = getInvocationValidator(schema, checked=True)
+
+
+def _workerErrors(invocation):
+    return invocationErrors(_workerValidator, invocation)
+
+
+# Returns the hash identifying the content of a descriptor
+def descriptorHash(descriptor):
+    content = json.dumps(descriptor, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Validates a descriptor like validate_descriptor, unless a descriptor
+# with the same content was already validated by this process.
+# Returns a ValidatedDescriptor.
+def getValidatedDescriptor(descriptor, **kwargs):
+    digest = descriptorHash(descriptor)
+    with _validatedDescriptorsLock:
+        if digest in _validatedDescriptors:
+            _validatedDescriptors.move_to_end(digest)
+            return _validatedDescriptors[digest]
+    # Validation adds default values to the descriptor: the caller's copy
+    # is left untouched so that its hash does not change
+    validated = ValidatedDescriptor(copy.deepcopy(descriptor), digest)
+    validate_descriptor(copy.deepcopy(descriptor), **kwargs)
+    with _validatedDescriptorsLock:
+        validated = _validatedDescriptors.setdefault(digest, validated)
+        while len(_validatedDescriptors) > VALIDATION_CACHE_SIZE:
+            _validatedDescriptors.popitem(last=False)
+    return validated
+
+
+# Forgets the descriptors validated by this process
+def clearValidationCache():
+    with _validatedDescriptorsLock:
+        _validatedDescriptors.clear()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
 
 import simplejson as json
 
-from boutiques.__version__ import VERSION as BOSH_VERSION
+from boutiques import httpClient
 from boutiques.logger import print_info, raise_error
 from boutiques.util.utils import importCatcher
 
@@ -12,6 +14,9 @@ from boutiques.util.utils import importCatcher
 # and 100 for authenticated requests
 MAX_ZENODO_RESULTS = 25
 
+# Number of threads uploading the files of a deposition
+UPLOAD_WORKERS = 4
+
 
 class ZenodoError(Exception):
     pass
@@ -25,6 +30,9 @@ class ZenodoHelper:
         self.verbose = verbose
         self.config_file = os.path.join(os.path.expanduser("~"), ".boutiques")
         self.zenodo_endpoint = self.get_zenodo_endpoint()
+        # Bucket links of the depositions created, files are streamed to
+        # them by zenodo_upload_files
+        self.buckets = {}
 
     def verify_zenodo_access_token(self, user_input):
         access_token = user_input
@@ -67,9 +75,7 @@ class ZenodoHelper:
 
     @importCatcher()
     def record_exists(self, record_id):
-        import requests
-
-        r = requests.get(self.zenodo_endpoint + f"/api/records/{record_id}")
+        r = httpClient.get(self.zenodo_endpoint + f"/api/records/{record_id}")
         if r.status_code == 200:
             return True
         if r.status_code == 404:
@@ -78,9 +84,7 @@ class ZenodoHelper:
 
     @importCatcher()
     def zenodo_get_record(self, zenodo_id):
-        import requests
-
-        r = requests.get(self.zenodo_endpoint + f"/api/records/{zenodo_id}")
+        r = httpClient.get(self.zenodo_endpoint + f"/api/records/{zenodo_id}")
         if r.status_code != 200:
             raise_error(ZenodoError, f'Descriptor "{zenodo_id}" not found', r)
         return r.json()
@@ -131,9 +135,7 @@ class ZenodoHelper:
 
     @importCatcher()
     def zenodo_test_api(self, access_token):
-        import requests
-
-        r = requests.get(
+        r = httpClient.get(
             self.zenodo_endpoint + "/api/deposit/depositions",
         )
         if r.status_code != 403:
@@ -143,7 +145,7 @@ class ZenodoHelper:
         if self.verbose:
             print_info("Zenodo is accessible", r)
 
-        r = requests.get(
+        r = httpClient.get(
             self.zenodo_endpoint + "/api/deposit/depositions",
             params={"access_token": access_token},
         )
@@ -155,14 +157,12 @@ class ZenodoHelper:
 
     @importCatcher()
     def zenodo_deposit(self, metadata, access_token):
-        import requests
-
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {access_token}",
         }
         data = metadata
-        r = requests.post(
+        r = httpClient.post(
             self.zenodo_endpoint + "/api/deposit/depositions",
             json={},
             data=json.dumps(data),
@@ -171,15 +171,14 @@ class ZenodoHelper:
         if r.status_code != 201:
             raise_error(ZenodoError, "Deposition failed", r)
         zid = r.json()["id"]
+        self.buckets[zid] = r.json().get("links", {}).get("bucket")
         if self.verbose:
             print_info(f"Deposition succeeded, id is {zid}", r)
         return zid
 
     @importCatcher()
     def zenodo_deposit_updated_version(self, metadata, access_token, deposition_id):
-        import requests
-
-        r = requests.post(
+        r = httpClient.post(
             self.zenodo_endpoint
             + f"/api/deposit/depositions/{deposition_id}/actions/newversion",
             headers={"Authorization": f"Bearer {access_token}"},
@@ -211,15 +210,13 @@ class ZenodoHelper:
 
     @importCatcher()
     def zenodo_update_metadata(self, new_deposition_id, metadata, access_token):
-        import requests
-
         data = metadata
 
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {access_token}",
         }
-        r = requests.put(
+        r = httpClient.put(
             self.zenodo_endpoint + "/api/deposit/depositions/%s" % new_deposition_id,
             data=json.dumps(data),
             headers=headers,
@@ -233,11 +230,9 @@ class ZenodoHelper:
     # automatically copied over. This method removes them.
     @importCatcher()
     def zenodo_delete_files(self, new_deposition_id, files, access_token):
-        import requests
-
         for file in files:
             file_id = file["id"]
-            r = requests.delete(
+            r = httpClient.delete(
                 self.zenodo_endpoint
                 + f"/api/deposit/depositions/{new_deposition_id}/files/{file_id}",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -249,9 +244,7 @@ class ZenodoHelper:
 
     @importCatcher()
     def zenodo_publish(self, access_token, deposition_id, msg_obj):
-        import requests
-
-        r = requests.post(
+        r = httpClient.post(
             self.zenodo_endpoint
             + f"/api/deposit/depositions/{deposition_id}/actions/publish",
             headers={"Authorization": f"Bearer {access_token}"},
@@ -267,8 +260,6 @@ class ZenodoHelper:
 
     @importCatcher()
     def zenodo_search(self, query, query_line):
-        import requests
-
         # Get all results
         get_request = self.zenodo_endpoint + (
             "/api/records/?q="
@@ -278,7 +269,7 @@ class ZenodoHelper:
             "&file_type=json&type=software&"
             f"page=1&size={MAX_ZENODO_RESULTS}"
         )
-        r = requests.get(get_request, headers={"User-Agent": f"bosh-{BOSH_VERSION}"})
+        r = httpClient.get(get_request)
         if r.status_code != 200:
             raise_error(ZenodoError, f"Error searching Zenodo: {r.json()}", r)
         if self.verbose:
@@ -295,21 +286,92 @@ class ZenodoHelper:
         error_msg="Cannot Upload to Zenodo",
         verbose_msg="Uploaded to Zenodo",
     ):
-        import requests
-
         zenodo_access_token = (
             self.get_zenodo_access_token
             if zenodo_access_token is None
             else zenodo_access_token
         )
-        r = requests.post(
-            self.zenodo_endpoint + f"/api/deposit/depositions/{deposition_id}/files",
-            headers={"Authorization": f"Bearer {zenodo_access_token}"},
-            data={"filename": os.path.basename(file_path)},
-            files={"file": open(file_path, "rb")},
-        )
+        with open(file_path, "rb") as fhandle:
+            r = httpClient.post(
+                self.zenodo_endpoint
+                + f"/api/deposit/depositions/{deposition_id}/files",
+                headers={"Authorization": f"Bearer {zenodo_access_token}"},
+                data={"filename": os.path.basename(file_path)},
+                files={"file": fhandle},
+            )
 
         if r.status_code != 201:
             raise_error(ZenodoError, error_msg, r)
         if self.verbose:
             print_info(verbose_msg, r)
+
+    # Uploads files to a deposition created by zenodo_deposit. Files are
+    # streamed to the bucket of the deposition by a pool of threads
+    # sharing the connections of the HTTP client, which retries uploads
+    # failing with a transient error. on_upload is called with the path of each uploaded
+    # file, e.g. to record progress. Files of depositions without a bucket
+    # link are uploaded one at a time with zenodo_upload_file.
+    @importCatcher()
+    def zenodo_upload_files(
+        self,
+        deposition_id,
+        file_paths,
+        zenodo_access_token,
+        on_upload=None,
+        workers=UPLOAD_WORKERS,
+        error_msg="Cannot Upload to Zenodo",
+        verbose_msg="Uploaded to Zenodo",
+    ):
+        bucket = self.buckets.get(deposition_id)
+        if bucket is None:
+            for file_path in file_paths:
+                self.zenodo_upload_file(
+                    deposition_id,
+                    file_path,
+                    zenodo_access_token,
+                    error_msg,
+                    verbose_msg,
+                )
+                if on_upload is not None:
+                    on_upload(file_path)
+            return
+
+        def upload(file_path):
+            url = f"{bucket}/{quote(os.path.basename(file_path))}"
+            with open(file_path, "rb") as fhandle:
+                r = httpClient.put(
+                    url,
+                    data=fhandle,
+                    headers={"Authorization": f"Bearer {zenodo_access_token}"},
+                )
+            if r.status_code not in (200, 201):
+                raise_error(ZenodoError, error_msg, r)
+            return file_path, r
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(upload, path) for path in file_paths]
+            error = None
+            try:
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    try:
+                        file_path, r = future.result()
+                    except Exception as e:
+                        # Pending uploads are dropped, uploads in progress
+                        # complete and are reported
+                        if error is None:
+                            error = e
+                            for pending in futures:
+                                pending.cancel()
+                        continue
+                    if on_upload is not None:
+                        on_upload(file_path)
+                    if self.verbose:
+                        print_info(f"{verbose_msg}: {file_path}", r)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            if error is not None:
+                raise error